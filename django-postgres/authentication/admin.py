@@ -1,7 +1,4 @@
 from django.contrib import admin
-from base.models import Event, Participant, Registration
-#Category
-# Submission
 from .models import User
 
 # Register your models here.
@@ -11,7 +8,4 @@ class UserAdmin(admin.ModelAdmin):
 
 
 admin.site.register(User, UserAdmin)
-admin.site.register(Event)
-admin.site.register(Participant)
-admin.site.register(Registration)
-# admin.site.register(Submission)
\ No newline at end of file
+# Event, Participant, Registration and Booking are registered in base/admin.py
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, get_hashers, get_hashers_by_algorithm
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with the iteration count taken from PASSWORD_HASHING_ITERATIONS.
+
+    It keeps the `pbkdf2_sha256` algorithm name, so existing hashes still verify and are
+    upgraded (or downgraded) to the configured cost the next time the user logs in.
+    """
+
+    def __init__(self):
+        # An instance attribute, so a pickled hasher carries its cost into worker processes
+        self.iterations = getattr(settings, 'PASSWORD_HASHING_ITERATIONS', PBKDF2PasswordHasher.iterations)
+
+
+@receiver(setting_changed)
+def reset_tuned_hashers(setting, **kwargs):
+    if setting == 'PASSWORD_HASHING_ITERATIONS':
+        get_hashers.cache_clear()
+        get_hashers_by_algorithm.cache_clear()
+
+
+# The functions below run in the hashing process pool (see authentication.hashing). They
+# only use what they are given, so the worker processes never need Django set up.
+
+def encode_password(hasher, password, salt):
+    return hasher.encode(password, salt)
+
+
+def verify_password(hasher, password, encoded, harden):
+    is_correct = hasher.verify(password, encoded)
+    if not is_correct and harden:
+        # Close the timing gap between the stored work factor and the preferred one
+        hasher.harden_runtime(password, encoded)
+    return is_correct
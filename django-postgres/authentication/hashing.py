@@ -0,0 +1,124 @@
+import asyncio
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    UNUSABLE_PASSWORD_SUFFIX_LENGTH, get_hasher, identify_hasher, is_password_usable,
+)
+from django.utils.crypto import get_random_string
+from rest_framework.exceptions import APIException
+
+from .hashers import encode_password, verify_password
+from .models import User
+
+MODE_INLINE = 'inline'  # Hash in a thread of this process, off the event loop
+MODE_PROCESS = 'process'  # Hash in a bounded pool of worker processes
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = 0
+
+
+class HashingBusy(APIException):
+    status_code = 503
+    default_detail = 'Too many logins in progress, please retry shortly.'
+    default_code = 'hashing_busy'
+    wait = 1  # Sent as Retry-After
+
+
+def hashing_mode():
+    return getattr(settings, 'PASSWORD_HASHING_MODE', MODE_INLINE)
+
+
+def get_pool():
+    """The per-process hashing pool, started on first use (after gunicorn has forked)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Imported here so workers that never hash (or hash inline) do not load multiprocessing
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _pool = ProcessPoolExecutor(max_workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', 2), mp_context=context)
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+async def run_hashing(func, *args):
+    """Run a hashing function according to PASSWORD_HASHING_MODE, never on the event loop.
+
+    In process mode at most PASSWORD_HASHING_MAX_PENDING calls may be queued or running
+    per web process; past that HashingBusy (503) is raised instead of letting a login
+    storm queue up without bound.
+    """
+    global _pending
+    if hashing_mode() != MODE_PROCESS:
+        # Not on the event loop: it would stall every other request and stream of the worker
+        return await sync_to_async(func, thread_sensitive=False)(*args)
+    with _pool_lock:
+        if _pending >= getattr(settings, 'PASSWORD_HASHING_MAX_PENDING', 32):
+            raise HashingBusy()
+        _pending += 1
+    try:
+        return await asyncio.wrap_future(get_pool().submit(func, *args))
+    finally:
+        with _pool_lock:
+            _pending -= 1
+
+
+async def amake_password(password):
+    hasher = get_hasher('default')
+    return await run_hashing(encode_password, hasher, password, hasher.salt())
+
+
+async def averify_password(password, encoded):
+    """Async counterpart of django.contrib.auth.hashers.verify_password: (is_correct, must_update)."""
+    hasher = None
+    if password is not None and is_password_usable(encoded):
+        try:
+            hasher = identify_hasher(encoded)
+        except ValueError:
+            pass
+    if hasher is None:
+        # Spend the same time as a real check so unknown accounts cannot be told apart
+        await amake_password(get_random_string(UNUSABLE_PASSWORD_SUFFIX_LENGTH))
+        return False, False
+
+    preferred = get_hasher('default')
+    hasher_changed = hasher.algorithm != preferred.algorithm
+    must_update = hasher_changed or preferred.must_update(encoded)
+    harden = not hasher_changed and must_update
+    is_correct = await run_hashing(verify_password, hasher, password, encoded, harden)
+    return is_correct, must_update
+
+
+async def aauthenticate(email, password):
+    """Check an email and password the way ModelBackend does, without hashing on the event loop.
+
+    A correct password stored with an outdated hasher or cost is rehashed with the
+    preferred one and saved.
+    """
+    user = await User.objects.filter(email=email).afirst()
+    is_correct, must_update = await averify_password(password, user.password if user else None)
+    if user is None or not is_correct or not user.is_active:
+        return None
+    if must_update:
+        user.password = await amake_password(password)
+        await User.objects.filter(pk=user.pk).aupdate(password=user.password)
+    return user
+
+
+async def aset_password(user, password):
+    user.password = await amake_password(password)
+    await sync_to_async(user.save)(update_fields=['password'])
+    return user
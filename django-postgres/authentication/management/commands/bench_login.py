@@ -0,0 +1,98 @@
+import json
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import uvicorn
+from django.contrib.auth.hashers import make_password
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import reverse
+
+from authentication import hashing
+from authentication.models import User
+from base.benchmarking import benchmark_database, format_summary
+from base.models import Event
+
+
+class Command(BaseCommand):
+    help = ('Measure login and event-list latency under a mixed load, for each password hashing mode '
+            '(runs the ASGI application in one uvicorn worker, as deployed, on the test database).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default='inline,process', help='Comma separated PASSWORD_HASHING_MODE values to compare')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of load per mode')
+        parser.add_argument('--login-clients', type=int, default=8, help='Concurrent clients logging in')
+        parser.add_argument('--read-clients', type=int, default=4, help='Concurrent clients listing events')
+        parser.add_argument('--workers', type=int, default=2, help='PASSWORD_HASHING_WORKERS for process mode')
+        parser.add_argument('--iterations', type=int, default=None, help='PBKDF2 iterations (default PASSWORD_HASHING_ITERATIONS)')
+
+    def handle(self, *args, **options):
+        overrides = {'PASSWORD_HASHING_WORKERS': options['workers']}
+        if options['iterations']:
+            overrides['PASSWORD_HASHING_ITERATIONS'] = options['iterations']
+
+        with benchmark_database(verbosity=0), override_settings(**overrides):
+            password_hash = make_password('bench-password')
+            User.objects.bulk_create(
+                User(username=f'user{i}', email=f'user{i}@example.com', password=password_hash, is_verified=True)
+                for i in range(options['login_clients'])
+            )
+            Event.objects.bulk_create(Event(title=f'Event {i}', description='-') for i in range(200))
+
+            for mode in options['modes'].split(','):
+                with override_settings(PASSWORD_HASHING_MODE=mode):
+                    self.run_mode(mode, options)
+                hashing.shutdown_pool()
+
+    def run_mode(self, mode, options):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        server = uvicorn.Server(uvicorn.Config(get_asgi_application(), lifespan='off', log_level='warning'))
+        serving = threading.Thread(target=server.run, kwargs={'sockets': [listener]}, daemon=True)
+        serving.start()
+        while not server.started:
+            time.sleep(0.01)
+        base_url = f'http://127.0.0.1:{listener.getsockname()[1]}'
+
+        login_url = base_url + reverse('login')
+        events_url = base_url + reverse('event-list')
+        logins, reads, errors = [], [], []
+        deadline = time.perf_counter() + options['duration']
+
+        def login(index):
+            body = json.dumps({'email': f'user{index}@example.com', 'password': 'bench-password'}).encode()
+            while time.perf_counter() < deadline:
+                request = urllib.request.Request(login_url, body, {'Content-Type': 'application/json'})
+                self.timed(lambda: urllib.request.urlopen(request).read(), logins, errors)
+
+        def read():
+            while time.perf_counter() < deadline:
+                self.timed(lambda: urllib.request.urlopen(events_url).read(), reads, errors)
+
+        clients = [threading.Thread(target=login, args=(i,)) for i in range(options['login_clients'])]
+        clients += [threading.Thread(target=read) for _ in range(options['read_clients'])]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        server.should_exit = True
+        serving.join()
+        listener.close()
+
+        seconds = options['duration']
+        self.stdout.write(f'mode={mode}: {len(logins) / seconds:.1f} logins/s, {len(reads) / seconds:.1f} reads/s, {len(errors)} errors')
+        self.stdout.write(format_summary('  login', logins))
+        self.stdout.write(format_summary('  event list', reads))
+
+    def timed(self, call, samples, errors):
+        start = time.perf_counter()
+        try:
+            call()
+        except (urllib.error.URLError, ConnectionError) as exc:
+            errors.append(exc)
+            return
+        samples.append((time.perf_counter() - start) * 1000)
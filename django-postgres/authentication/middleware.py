@@ -1,4 +1,5 @@
 # authentication/middleware.py
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.http import JsonResponse
 from django.utils import timezone
 from rest_framework_simplejwt.authentication import JWTAuthentication
@@ -6,36 +7,61 @@ from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 from rest_framework_simplejwt.tokens import RefreshToken
 
 class TokenValidationMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        # Extract token from the Authorization header
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        try:
+            access_token = self.validate(request)
+        except (TokenError, InvalidToken):
+            return JsonResponse({'detail': 'Token is invalid or expired.'}, status=401)
+        response = self.get_response(request)
+        if access_token:
+            response['Authorization'] = f'Bearer {access_token}'
+        return response
+
+    async def __acall__(self, request):
         auth = request.headers.get('Authorization', None)
+        access_token = None
         if auth and auth.startswith("Bearer "):
+            # The user is read from the database: not on the event loop
             try:
-                # Extract and validate the token
-                token = auth.split(' ')[1]
-                jwt_auth = JWTAuthentication()
-                validated_token = jwt_auth.get_validated_token(token)
-                
-                # Set the user on the request
-                request.user = jwt_auth.get_user(validated_token)
-                
-                # Check remaining time on the token; refresh if it's close to expiring
-                expiration_timestamp = validated_token['exp']
-                time_remaining = expiration_timestamp - timezone.now().timestamp()
-
-                if time_remaining < 300:  # If less than 5 minutes left
-                    refresh = RefreshToken.for_user(request.user)
-                    # Refresh token and set a new access token in the response
-                    response = self.get_response(request)
-                    response['Authorization'] = f'Bearer {refresh.access_token}'
-                    return response
-
+                access_token = await sync_to_async(self.validate)(request)
             except (TokenError, InvalidToken):
                 return JsonResponse({'detail': 'Token is invalid or expired.'}, status=401)
+        response = await self.get_response(request)
+        if access_token:
+            response['Authorization'] = f'Bearer {access_token}'
+        return response
+
+    def validate(self, request):
+        """Set the user of a bearer token on the request; returns a new access token when it is about to expire."""
+        # Extract token from the Authorization header
+        auth = request.headers.get('Authorization', None)
+        if auth and auth.startswith("Bearer "):
+            # Extract and validate the token
+            token = auth.split(' ')[1]
+            jwt_auth = JWTAuthentication()
+            validated_token = jwt_auth.get_validated_token(token)
+
+            # Set the user on the request
+            request.user = jwt_auth.get_user(validated_token)
+
+            # Check remaining time on the token; refresh if it's close to expiring
+            expiration_timestamp = validated_token['exp']
+            time_remaining = expiration_timestamp - timezone.now().timestamp()
+
+            if time_remaining < 300:  # If less than 5 minutes left
+                refresh = RefreshToken.for_user(request.user)
+                # Refresh token and set a new access token in the response
+                return refresh.access_token
 
         # Allow request to proceed if no token is present; DRF will enforce permissions
-        response = self.get_response(request)
-        return response
+        return None
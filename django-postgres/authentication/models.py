@@ -4,8 +4,8 @@ from rest_framework_simplejwt.tokens import RefreshToken
 
 # Create your models here.
 class UserManager(BaseUserManager):
-    def create_user(self, username, email, password=None, first_name='', last_name=''):
-        """Create and return a regular user with an email and password."""
+    def create_user(self, username, email, password=None, first_name='', last_name='', password_hash=None):
+        """Create and return a regular user with an email and password (or an already hashed one)."""
         if username is None:
             raise TypeError('Users should have a username')
         if email is None:
@@ -17,7 +17,10 @@ class UserManager(BaseUserManager):
             first_name=first_name,
             last_name=last_name
         )
-        user.set_password(password)
+        if password_hash is not None:
+            user.password = password_hash
+        else:
+            user.set_password(password)
         user.save(using=self._db)  # Use the database specified in the settings
         return user
 
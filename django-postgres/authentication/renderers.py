@@ -1,14 +1,27 @@
-from rest_framework import renderers
-import json
+from rest_framework.exceptions import ErrorDetail
 
+from base.renderers import FastJSONRenderer
 
-class UserRenderer(renderers.JSONRenderer):
+
+def contains_error(data):
+    """Whether validation or API errors (ErrorDetail strings) appear anywhere in `data`."""
+    if isinstance(data, ErrorDetail):
+        return True
+    if isinstance(data, dict):
+        return any(contains_error(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(contains_error(item) for item in data)
+    return False
+
+
+class UserRenderer(FastJSONRenderer):
+    """Wraps the payload as {"data": ...}, or {"errors": ...} when it holds errors."""
     charset = 'utf-8'
 
     def render(self, data, accepted_media_type=None, renderer_context=None):
-        response = ''
-        if 'ErrorDetail' in str(data):
-            response = json.dumps({'errors': data})
-        else:
-            response = json.dumps({'data': data})
-        return response
\ No newline at end of file
+        # Checked on the structure, and only for error responses: formatting the whole
+        # payload with str() to search for 'ErrorDetail' cost more than encoding it
+        response = (renderer_context or {}).get('response')
+        failed = response is None or response.status_code >= 400
+        key = 'errors' if failed and contains_error(data) else 'data'
+        return super().render({key: data}, accepted_media_type, renderer_context)
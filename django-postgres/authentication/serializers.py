@@ -25,6 +25,11 @@ class RegisterSerializer(serializers.ModelSerializer):
         return attrs
 
     def create(self, validated_data):
+        # The view may pass the password already hashed (see authentication.hashing)
+        password_hash = validated_data.pop('password_hash', None)
+        if password_hash is not None:
+            validated_data.pop('password')
+            return User.objects.create_user(**validated_data, password_hash=password_hash)
         return User.objects.create_user(**validated_data)
 
 
@@ -57,7 +62,10 @@ class LoginSerializer(serializers.ModelSerializer):
         email = attrs.get('email', '')
         password = attrs.get('password', '')
         user = auth.authenticate(email=email, password=password)
+        return self.login_data(user)
 
+    def login_data(self, user):
+        """Check an authenticated user (None when the credentials were wrong) may log in."""
         if user is None:
             raise AuthenticationFailed('Invalid credentials, try again')
         if not user.is_active:
@@ -1,3 +1,202 @@
-from django.test import TestCase
+import json
+import threading
 
-# Create your tests here.
+from django.contrib.auth.hashers import PBKDF2SHA1PasswordHasher, check_password
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.test import override_settings
+from django.urls import reverse
+from django.utils.encoding import smart_bytes
+from django.utils.http import urlsafe_base64_encode
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import hashing
+from .models import User
+from .renderers import contains_error
+
+
+@override_settings(PASSWORD_HASHING_MODE='inline', PASSWORD_HASHING_ITERATIONS=1000)
+class PasswordHashingTests(APITestCase):
+    def create_user(self, password='s3cret-pass', **kwargs):
+        user = User.objects.create_user('alice', 'alice@example.com', password, **kwargs)
+        User.objects.filter(pk=user.pk).update(is_verified=True)
+        return user
+
+    def login(self, password='s3cret-pass'):
+        return self.client.post(reverse('login'), {'email': 'alice@example.com', 'password': password}, format='json')
+
+    def test_register_hashes_with_the_tuned_hasher(self):
+        response = self.client.post(reverse('register'), {
+            'first_name': 'Alice', 'last_name': 'A', 'username': 'alice',
+            'email': 'alice@example.com', 'password': 's3cret-pass',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        user = User.objects.get(email='alice@example.com')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(check_password('s3cret-pass', user.password))
+
+    def test_login_returns_tokens(self):
+        self.create_user()
+        response = self.login()
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(set(response.data), {'email', 'username', 'tokens'})
+        self.assertEqual(set(response.data['tokens']), {'refresh', 'access'})
+        self.assertEqual(self.login('wrong-pass').data, {'error': 'Invalid credentials, try again'})
+
+    def test_register_wraps_data_and_errors(self):
+        details = {
+            'first_name': 'Alice', 'last_name': 'A', 'username': 'alice',
+            'email': 'alice@example.com', 'password': 's3cret-pass',
+        }
+        response = self.client.post(reverse('register'), details, format='json')
+        self.assertEqual(response['Content-Type'], 'application/json; charset=utf-8')
+        self.assertEqual(json.loads(response.content), {'data': {
+            'first_name': 'Alice', 'last_name': 'A', 'username': 'alice', 'email': 'alice@example.com',
+        }})
+
+        response = self.client.post(reverse('register'), {**details, 'password': 'x'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(json.loads(response.content)), ['errors'])
+
+        # Errors are found in the structure, not in the text of the values
+        self.assertFalse(contains_error({'note': 'ErrorDetail'}))
+        self.assertTrue(contains_error({'field': [ErrorDetail('Required.', code='required')]}))
+        self.assertEqual(self.client.post(reverse('login'), {'email': 'bob@example.com', 'password': 'whatever'},
+                                          format='json').status_code, 400)
+
+    def test_login_rehashes_to_the_configured_cost(self):
+        user = self.create_user()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        with self.settings(PASSWORD_HASHING_ITERATIONS=1500):
+            self.assertEqual(self.login().status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1500$'))
+        self.assertTrue(check_password('s3cret-pass', user.password))
+
+    def test_login_upgrades_other_hashers(self):
+        user = self.create_user()
+        legacy = PBKDF2SHA1PasswordHasher().encode('s3cret-pass', 'legacysalt', 1000)
+        User.objects.filter(pk=user.pk).update(password=legacy)
+        self.assertEqual(self.login().status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
+    def test_set_new_password(self):
+        user = self.create_user()
+        response = self.client.patch(reverse('password-reset-complete'), {
+            'password': 'n3w-secret',
+            'token': PasswordResetTokenGenerator().make_token(user),
+            'uidb64': urlsafe_base64_encode(smart_bytes(user.id)),
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.login('n3w-secret').status_code, 200)
+
+    async def test_inline_mode_hashes_off_the_event_loop(self):
+        self.assertNotEqual(await hashing.run_hashing(threading.get_ident), threading.get_ident())
+
+
+@override_settings(PASSWORD_HASHING_MODE='process',PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_ITERATIONS=1000)
+class ProcessPoolHashingTests(APITestCase):
+    def setUp(self):
+        self.addCleanup(hashing.shutdown_pool)
+        user = User.objects.create_user('alice', 'alice@example.com', 's3cret-pass')
+        User.objects.filter(pk=user.pk).update(is_verified=True)
+
+    def test_login_through_the_pool(self):
+        response = self.client.post(reverse('login'), {'email': 'alice@example.com', 'password': 's3cret-pass'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIsNotNone(hashing._pool)
+
+    def test_full_pool_answers_503(self):
+        with self.settings(PASSWORD_HASHING_MAX_PENDING=0):
+            response = self.client.post(reverse('login'), {'email': 'alice@example.com', 'password': 's3cret-pass'}, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+
+@override_settings(PASSWORD_HASHING_MODE='inline', PASSWORD_HASHING_ITERATIONS=1000)
+class QueryCountTests(APITestCase):
+    """Pins the number of SQL queries of every route in authentication/urls.py.
+
+    Each check runs with few and with more users (and their outstanding tokens), so a
+    query per row fails it. If a count changes on purpose, update it here.
+    """
+    sizes = (3, 12)
+
+    def setUp(self):
+        self.users = []
+
+    def grow(self, size):
+        while len(self.users) < size:
+            index = len(self.users)
+            user = User.objects.create_user(f'user{index}', f'user{index}@example.com', 's3cret-pass')
+            User.objects.filter(pk=user.pk).update(is_verified=True)
+            RefreshToken.for_user(user)  # An outstanding token each
+            self.users.append(user)
+
+    def assertQueriesPinned(self, count, request, prepare=lambda: None, status_code=200):
+        """`prepare()` sets up what one request needs (not counted); `request(prepared)` sends it."""
+        for size in self.sizes:
+            self.grow(size)
+            prepared = prepare()
+            with self.subTest(size=size):
+                with self.assertNumQueries(count):
+                    response = request(prepared)
+                self.assertEqual(response.status_code, status_code, getattr(response, 'data', None))
+
+    def new_user(self):
+        index = User.objects.count()
+        return User.objects.create_user(f'new{index}', f'new{index}@example.com', 's3cret-pass')
+
+    def test_register(self):
+        self.assertQueriesPinned(4, lambda index: self.client.post(reverse('register'), {
+            'first_name': 'New', 'last_name': 'User', 'username': f'new{index}',
+            'email': f'new{index}@example.com', 'password': 's3cret-pass',
+        }, format='json'), prepare=User.objects.count, status_code=201)
+
+    def test_login(self):
+        self.assertQueriesPinned(2, lambda _: self.client.post(
+            reverse('login'), {'email': 'user0@example.com', 'password': 's3cret-pass'}, format='json'))
+
+    def test_logout(self):
+        def tokens():
+            refresh = RefreshToken.for_user(self.users[0])
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+            return str(refresh)
+
+        self.assertQueriesPinned(8, lambda refresh: self.client.post(
+            reverse('logout'), {'refresh': refresh}, format='json'), prepare=tokens, status_code=204)
+
+    def test_email_verify(self):
+        self.assertQueriesPinned(3, lambda user: self.client.get(
+            reverse('email-verify'), {'token': str(RefreshToken.for_user(user).access_token)}), prepare=self.new_user)
+
+    def test_token_refresh(self):
+        self.assertQueriesPinned(6, lambda refresh: self.client.post(
+            reverse('token_refresh'), {'refresh': refresh}, format='json'),
+            prepare=lambda: str(RefreshToken.for_user(self.users[0])))
+
+    def test_password_reset_flow(self):
+        self.assertQueriesPinned(2, lambda _: self.client.post(
+            reverse('request-reset-email'), {'email': 'user0@example.com'}, format='json'))
+        user = self.users[0]
+
+        def reset_link():
+            user.refresh_from_db()  # The previous run changed the password, which invalidates older links
+            return {'uidb64': urlsafe_base64_encode(smart_bytes(user.id)), 'token': PasswordResetTokenGenerator().make_token(user)}
+
+        self.assertQueriesPinned(1, lambda kwargs: self.client.get(reverse('password-reset-confirm', kwargs=kwargs)),
+                                 prepare=reset_link)
+        self.assertQueriesPinned(2, lambda kwargs: self.client.patch(
+            reverse('password-reset-complete'), {'password': 'n3w-secret', **kwargs}, format='json'), prepare=reset_link)
+
+    def test_every_route_is_covered(self):
+        from .urls import urlpatterns
+        covered = {
+            'register': 'register', 'login': 'login', 'logout': 'logout', 'email-verify': 'email_verify',
+            'token_refresh': 'token_refresh', 'request-reset-email': 'password_reset_flow',
+            'password-reset-confirm': 'password_reset_flow', 'password-reset-complete': 'password_reset_flow',
+        }
+        self.assertEqual(sorted(pattern.name for pattern in urlpatterns), sorted(covered))
+        self.assertLessEqual({f'test_{name}' for name in covered.values()}, set(dir(self)))
@@ -9,9 +9,12 @@ from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.utils.encoding import smart_str, smart_bytes, DjangoUnicodeDecodeError
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 from django.http import HttpResponsePermanentRedirect
+import asyncio
 import jwt
 import os
 
+from asgiref.sync import sync_to_async
+
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
@@ -21,6 +24,7 @@ from .serializers import (
 )
 from .models import User
 from .utils import Util
+from . import hashing
 from .renderers import UserRenderer
 
 from rest_framework.permissions import AllowAny
@@ -30,15 +34,55 @@ class CustomRedirect(HttpResponsePermanentRedirect):
     allowed_schemes = ['ratiba', 'http', 'https']
 
 
-class RegisterView(generics.GenericAPIView):
+class AsyncGenericAPIView(generics.GenericAPIView):
+    """GenericAPIView whose handlers are coroutines.
+
+    Used by the views that hash passwords, so they can await the hashing pool (see
+    authentication.hashing) rather than run PBKDF2 themselves. Authentication,
+    permission and throttle checks may hit the database and run in a thread.
+    Logins only wait without holding a thread when every middleware is async-capable
+    too (see AsgiTests.test_every_middleware_runs_async).
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def options(self, request, *args, **kwargs):
+        return super().options(request, *args, **kwargs)
+
+
+class RegisterView(AsyncGenericAPIView):
     serializer_class = RegisterSerializer
     renderer_classes = (UserRenderer,)
 
-    def post(self, request):
+    async def post(self, request):
         serializer = self.serializer_class(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        user = serializer.save()
-        
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        password_hash = await hashing.amake_password(serializer.validated_data['password'])
+        user = await sync_to_async(serializer.save)(password_hash=password_hash)
+        await sync_to_async(self.send_verification_email)(request, user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def send_verification_email(self, request, user):
         token = RefreshToken.for_user(user).access_token
         current_site = get_current_site(request).domain
         relative_link = reverse('email-verify')
@@ -52,8 +96,6 @@ class RegisterView(generics.GenericAPIView):
         }
         Util.send_email(data)
 
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-
 
 class VerifyEmail(views.APIView):
     serializer_class = EmailVerificationSerializer
@@ -84,14 +126,18 @@ class VerifyEmail(views.APIView):
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
-class LoginAPIView(generics.GenericAPIView):
+class LoginAPIView(AsyncGenericAPIView):
     serializer_class = LoginSerializer
 
-    def post(self, request):
+    async def post(self, request):
         serializer = self.serializer_class(data=request.data)
         try:
-            serializer.is_valid(raise_exception=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            credentials = serializer.to_internal_value(request.data)  # Field checks only, no database
+            user = await hashing.aauthenticate(credentials['email'], credentials['password'])
+            data = await sync_to_async(serializer.login_data)(user)
+            return Response(data, status=status.HTTP_200_OK)
+        except hashing.HashingBusy:
+            raise
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -143,13 +189,13 @@ class PasswordTokenCheckAPI(generics.GenericAPIView):
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
-class SetNewPasswordAPIView(generics.GenericAPIView):
+class SetNewPasswordAPIView(AsyncGenericAPIView):
     serializer_class = SetNewPasswordSerializer
 
-    def patch(self, request):
+    async def patch(self, request):
         serializer = self.serializer_class(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        await hashing.aset_password(serializer.validated_data['user'], serializer.validated_data['password'])
         return Response({'success': True, 'message': 'Password reset success'}, status=status.HTTP_200_OK)
 
 
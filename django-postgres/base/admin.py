@@ -1,3 +1,42 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Event, Participant, Registration, Booking
+from .pagination import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist defaults for tables too big to count exactly on every page view."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False  # Avoids a second COUNT(*) over the unfiltered table
+    list_per_page = 50
+
+
+@admin.register(Event)
+class EventAdmin(LargeTableAdmin):
+    list_display = ['id', 'title', 'date', 'time', 'venue', 'charge']
+    list_filter = ['charge', 'date']  # Covered by the (charge, date, time) and (date, time) indexes
+    search_fields = ['title', 'venue']  # Also used by the autocomplete widgets
+
+
+@admin.register(Participant)
+class ParticipantAdmin(LargeTableAdmin):
+    list_display = ['id', 'name', 'email']
+    search_fields = ['email', 'name']
+
+
+@admin.register(Registration)
+class RegistrationAdmin(LargeTableAdmin):
+    list_display = ['id', 'participant', 'event', 'status', 'timestamp']
+    list_select_related = ['participant', 'event']  # __str__ and the columns need both
+    list_filter = ['status']  # Covered by the (status, timestamp) index
+    autocomplete_fields = ['event', 'participant']
+    search_fields = ['participant__email', 'event__title']
+
+
+@admin.register(Booking)
+class BookingAdmin(LargeTableAdmin):
+    list_display = ['id', 'participant', 'event', 'booked', 'timestamp']
+    list_select_related = ['participant', 'event']
+    list_filter = ['booked']  # Covered by the (booked, -id) index
+    autocomplete_fields = ['event', 'participant']
+    search_fields = ['participant__email', 'event__title']
@@ -0,0 +1,70 @@
+# base/benchmarking.py
+import statistics
+import time
+from contextlib import contextmanager
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.db import connection
+
+
+@contextmanager
+def benchmark_database(keepdb=False, verbosity=1):
+    """Run the block against the throwaway test database instead of the real one.
+
+    With `keepdb` the database (and whatever was seeded into it) survives between runs,
+    which saves re-seeding millions of rows every time.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity, keepdb)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def time_calls(func, repeat):
+    """Call `func` `repeat` times and return the latency of each call in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples):
+    """Return the usual latency summary (in the unit of the samples) as a dict."""
+    return {
+        'count': len(samples),
+        'mean': statistics.fmean(samples) if samples else 0.0,
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'p99': percentile(samples, 99),
+    }
+
+
+def format_summary(label, samples, unit='ms'):
+    stats = summarize(samples)
+    return (f"{label}: n={stats['count']} mean={stats['mean']:.3f}{unit} "
+            f"p50={stats['p50']:.3f}{unit} p95={stats['p95']:.3f}{unit} p99={stats['p99']:.3f}{unit}")
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    """A thread per connection, like a gthread worker with a thread for every client."""
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,89 @@
+# base/blobs.py
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, F
+
+from .media import blob_digest
+from .models import Event, MediaBlob
+
+
+def lock(name):
+    """Lock a blob's row until the end of the transaction; returns it, or None if it has none."""
+    return MediaBlob.objects.select_for_update().filter(name=name).first()
+
+
+def acquire(name):
+    """Count one more reference to a blob, registering it on first use."""
+    if not blob_digest(name):
+        return
+    with transaction.atomic():
+        blob = lock(name)
+        if blob is None:
+            blob, created = MediaBlob.objects.get_or_create(
+                name=name, defaults={'size': default_storage.size(name), 'ref_count': 1},
+            )
+            if created:
+                return
+            lock(name)  # Registered by a concurrent first reference
+        # Also revives a blob pending deletion, which delete_unreferenced then leaves alone
+        MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+
+
+def release(name):
+    """Drop one reference to a blob; the file is deleted with the last one, once committed."""
+    if not blob_digest(name):
+        return
+    with transaction.atomic():
+        blob = lock(name)
+        if blob is None:
+            return
+        if blob.ref_count > 0:
+            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+        if blob.ref_count > 1:
+            return
+    # The row stays at 0 references until then, so the deletion is decided under its lock
+    transaction.on_commit(lambda: delete_unreferenced(name))
+
+
+def delete_unreferenced(name):
+    """Delete a blob and its file if it still has no references.
+
+    Runs under the blob's lock, which ContentAddressedStorage.save also takes before it
+    relies on an existing file: an upload of the same content either comes first and is
+    referenced before the lock is released, or comes after and writes the file again.
+    """
+    with transaction.atomic():
+        blob = lock(name)
+        if blob is None or blob.ref_count > 0:
+            return  # Referenced again, or already deleted
+        blob.delete()
+        default_storage.delete(name)
+
+
+def rebuild_ref_counts():
+    """Recount blob references from the events table and delete the blobs nothing points at.
+
+    Returns (blobs in use, blobs deleted).
+    """
+    counts = {
+        name: refs
+        for name, refs in Event.objects.filter(image__startswith='blobs/').values('image')
+        .annotate(refs=Count('id')).values_list('image', 'refs').order_by()
+        if blob_digest(name)
+    }
+    with transaction.atomic():
+        existing = {blob.name: blob for blob in MediaBlob.objects.select_for_update()}
+        unused = [name for name in existing if name not in counts]
+        MediaBlob.objects.filter(name__in=unused).update(ref_count=0)  # Deleted by delete_unreferenced
+        updated = []
+        for name, refs in counts.items():
+            blob = existing.get(name)
+            if blob is None:
+                MediaBlob.objects.create(name=name, size=default_storage.size(name), ref_count=refs)
+            elif blob.ref_count != refs:
+                blob.ref_count = refs
+                updated.append(blob)
+        MediaBlob.objects.bulk_update(updated, ['ref_count'])
+    for name in unused:
+        transaction.on_commit(lambda name=name: delete_unreferenced(name))
+    return len(counts), len(unused)
@@ -0,0 +1,134 @@
+# base/geo.py
+import math
+
+from django.db.models import FloatField, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32  # Length of one degree of latitude (and of longitude at the equator)
+GEOHASH_PRECISION = 9  # Stored precision, roughly a 5m x 5m cell
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Encode a coordinate as a geohash string."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # Geohash interleaves bits starting with longitude
+
+    while len(chars) < precision:
+        rng, value = (lng_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits = bits << 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Return the (latitude, longitude) size in degrees of a cell at the given precision."""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def decode(geohash):
+    """Return the centre (latitude, longitude) of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lng_range[0] + lng_range[1]) / 2
+
+
+def neighbours(geohash):
+    """Return the cell itself plus its (up to) eight surrounding cells."""
+    precision = len(geohash)
+    lat, lng = decode(geohash)
+    lat_size, lng_size = cell_size(precision)
+    cells = []
+    for d_lat in (-1, 0, 1):
+        cell_lat = lat + d_lat * lat_size
+        if cell_lat < -90 or cell_lat > 90:
+            continue  # No cells beyond the poles
+        for d_lng in (-1, 0, 1):
+            cell_lng = (lng + d_lng * lng_size + 180) % 360 - 180  # Wrap around the antimeridian
+            cell = encode(cell_lat, cell_lng, precision)
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def search_precision(latitude, radius_km):
+    """Pick the finest precision whose cells are at least `radius_km` wide at this latitude.
+
+    With cells that large, a circle of that radius around any point fits inside the
+    3x3 block of cells around it, so the search only has to look at those nine prefixes.
+    """
+    widest_lat = min(abs(latitude) + radius_km / KM_PER_DEGREE, 89.0)  # Cells narrow towards the poles
+    lng_scale = max(math.cos(math.radians(widest_lat)), 0.01)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_size, lng_size = cell_size(precision)
+        if lat_size * KM_PER_DEGREE >= radius_km and lng_size * KM_PER_DEGREE * lng_scale >= radius_km:
+            return precision
+    return 1
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """Return the geohash prefixes that together cover a circle around a point."""
+    precision = search_precision(latitude, radius_km)
+    return neighbours(encode(latitude, longitude, precision))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Return (min_lat, max_lat, min_lng, max_lng) around a circle, or None for the longitude
+    bounds when the circle crosses the antimeridian or a pole."""
+    d_lat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = latitude - d_lat, latitude + d_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), None, None
+    d_lng = radius_km / (KM_PER_DEGREE * math.cos(math.radians(max(abs(min_lat), abs(max_lat)))))
+    min_lng, max_lng = longitude - d_lng, longitude + d_lng
+    if min_lng < -180 or max_lng > 180:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, min_lng, max_lng
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_expression(latitude, longitude, lat_field='latitude', lng_field='longitude'):
+    """haversine_km from a point to each row's coordinates, as a database expression."""
+    phi1, phi2 = Value(math.radians(latitude)), Radians(lat_field)
+    d_lambda = Radians(lng_field) - Value(math.radians(longitude))
+    a = Power(Sin((phi2 - phi1) / 2), 2) + Cos(phi1) * Cos(phi2) * Power(Sin(d_lambda / 2), 2)
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Least(Value(1.0), Sqrt(a)), output_field=FloatField())
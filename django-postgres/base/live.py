@@ -0,0 +1,158 @@
+# base/live.py
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import ACTIVE_REGISTRATION_STATUSES, Booking, Registration
+from .notify import get_bus
+
+LIVE_CHANNEL = 'ratiba_live_counts'
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def seat_counts(event_id):
+    """Current registration, RSVP and booking counts of an event (two index-backed queries)."""
+    counts = Registration.objects.filter(event_id=event_id).aggregate(
+        registrations=Count('id', filter=Q(status__in=ACTIVE_REGISTRATION_STATUSES)),
+        rsvps=Count('id', filter=Q(status='rsvp')),
+    )
+    counts['bookings'] = Booking.objects.filter(event_id=event_id, booked=True).count()
+    return {'event': event_id, **counts}
+
+
+def seat_counts_many(event_ids):
+    """seat_counts() of several events, with the same two queries grouped by event."""
+    counts = {event_id: {'event': event_id, 'registrations': 0, 'rsvps': 0, 'bookings': 0} for event_id in event_ids}
+    registrations = Registration.objects.filter(event_id__in=event_ids).values('event_id').annotate(
+        registrations=Count('id', filter=Q(status__in=ACTIVE_REGISTRATION_STATUSES)),
+        rsvps=Count('id', filter=Q(status='rsvp')),
+    ).order_by()
+    for row in registrations:
+        counts[row['event_id']].update(registrations=row['registrations'], rsvps=row['rsvps'])
+    bookings = Booking.objects.filter(event_id__in=event_ids, booked=True).values('event_id').annotate(
+        bookings=Count('id'),
+    ).order_by()
+    for row in bookings:
+        counts[row['event_id']]['bookings'] = row['bookings']
+    return [counts[event_id] for event_id in event_ids]
+
+
+def publish_counts(event_id):
+    """Count once and tell every worker; called after a registration or booking change commits."""
+    get_bus().publish(LIVE_CHANNEL, seat_counts(event_id))
+
+
+def publish_counts_many(event_ids):
+    if event_ids:
+        get_bus().publish_many(LIVE_CHANNEL, seat_counts_many(event_ids))
+
+
+class PendingCounts:
+    """Events whose counts changed on a connection; each run publishes and forgets them."""
+
+    def __init__(self):
+        self.event_ids = set()
+
+    def __call__(self):
+        event_ids, self.event_ids = self.event_ids, set()
+        publish_counts_many(sorted(event_ids))
+
+
+def announce_counts(event_id, using=None):
+    """Publish an event's counts once the current transaction commits.
+
+    A transaction that changes many registrations or bookings (deleting an event or a
+    participant cascades to all of theirs) counts and announces each event once, with
+    the same number of queries however many rows changed.
+    """
+    connection = transaction.get_connection(using)
+    pending = getattr(connection, 'pending_seat_counts', None)
+    if pending is None:
+        pending = connection.pending_seat_counts = PendingCounts()
+    pending.event_ids.add(event_id)
+    # A call per change: Django drops those of a rolled back transaction or savepoint, and the
+    # first to run on commit takes every event, leaving the rest nothing to do. Events of a
+    # rollback go out with the next commit, which only recounts them. Runs at once outside
+    # a transaction.
+    transaction.on_commit(pending, using)
+
+
+def format_sse(payload, event='counts'):
+    return f'event: {event}\ndata: {json.dumps(payload, separators=(",", ":"))}\n\n'
+
+
+class Subscription:
+    """One watcher's mailbox. Only the latest counts matter, so it holds a single message."""
+
+    def __init__(self, event_id):
+        self.event_id = event_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=1)
+
+    def offer(self, payload):
+        # Runs on the watcher's event loop; a newer count replaces one not yet sent
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(payload)
+
+
+class Broadcaster:
+    """Per-process fan-out from the notify bus to the SSE connections of that process.
+
+    The bus delivers each change once per process; the broadcaster copies it to the
+    watchers of that event, so 10k watchers cost one notification, not 10k queries.
+    """
+
+    def __init__(self, bus=None):
+        self.subscriptions = defaultdict(set)
+        self.lock = threading.Lock()
+        (bus or get_bus()).subscribe(LIVE_CHANNEL, self.dispatch)
+
+    def subscribe(self, event_id):
+        subscription = Subscription(event_id)
+        with self.lock:
+            self.subscriptions[event_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            watchers = self.subscriptions.get(subscription.event_id)
+            if watchers is not None:
+                watchers.discard(subscription)
+                if not watchers:
+                    del self.subscriptions[subscription.event_id]
+
+    def watcher_count(self, event_id=None):
+        with self.lock:
+            if event_id is not None:
+                return len(self.subscriptions.get(event_id, ()))
+            return sum(len(watchers) for watchers in self.subscriptions.values())
+
+    def dispatch(self, payload):
+        with self.lock:
+            watchers = list(self.subscriptions.get(payload.get('event'), ()))
+        for subscription in watchers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, payload)
+            except RuntimeError:
+                self.unsubscribe(subscription)  # Its event loop is gone
+
+
+def get_broadcaster():
+    global _broadcaster
+    with _broadcaster_lock:
+        if _broadcaster is None:
+            _broadcaster = Broadcaster()
+        return _broadcaster
+
+
+def reset_broadcaster():
+    global _broadcaster
+    with _broadcaster_lock:
+        _broadcaster = None
@@ -0,0 +1,146 @@
+# base/log.py
+"""Logging plumbing referenced from settings.LOGGING (only the standard library is imported,
+as this is loaded while Django configures logging).
+
+Request threads hand records to `NonBlockingQueueHandler`, which only merges the message
+arguments and puts the record on a bounded queue; a listener thread turns them into
+JSON lines (`JsonFormatter`) and does the blocking write. `SamplingFilter` keeps a share
+of the info logs of hot code paths.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, plus any `extra` fields."""
+
+    def format(self, record):
+        payload = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload['exception'] = record.exc_text
+        if record.stack_info:
+            payload['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(payload, default=str, separators=(',', ':'))
+
+
+class SamplingFilter(logging.Filter):
+    """Lets through only a share of the INFO and DEBUG records of some loggers.
+
+    `rates` maps logger names to the share kept (0-1); the most specific name wins and
+    children inherit it. Warnings and errors always pass. Kept records carry
+    `sample_rate` so counts can be scaled back up downstream.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = {name: float(rate) for name, rate in (rates or {}).items()}
+        self.resolved = {}
+
+    def rate_for(self, name):
+        rate = self.resolved.get(name)
+        if rate is None:
+            parts = name.split('.')
+            rate = next(
+                (self.rates['.'.join(parts[:size])] for size in range(len(parts), 0, -1)
+                 if '.'.join(parts[:size]) in self.rates),
+                1.0,
+            )
+            self.resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1:
+            return True
+        if random.random() >= rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class QueueListener(logging.handlers.QueueListener):
+    """A QueueListener that can stop on a full bounded queue: it waits for room for its
+    end marker (the stock one raises queue.Full), so everything queued is written."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queues records for a listener thread instead of writing them in the calling thread.
+
+    Configured through dictConfig like any QueueHandler (`handlers`, `queue`, and
+    `listener`: base.log.QueueListener for a bounded queue), but the listener is
+    started on first use in every process, so it also works in forked gunicorn workers.
+    When the queue is full records are dropped rather than blocking the request; the
+    next record written says how many went missing (`dropped`).
+    """
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.listener = None  # Set by dictConfig
+        self.pid = None
+        self.dropped = 0
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            if self.pid is not None:
+                # A forked child: the parent's listener thread did not come along, and its
+                # queue may hold records the parent is writing. Start afresh.
+                self.queue = queue.Queue(self.queue.maxsize)
+                self.listener = type(self.listener)(
+                    self.queue, *self.listener.handlers, respect_handler_level=self.listener.respect_handler_level,
+                )
+            self.listener.start()
+            atexit.register(self.listener.stop)  # Flush what is still queued
+            self.pid = os.getpid()
+
+    def enqueue(self, record):
+        if self.pid != os.getpid():
+            self.start()
+        dropped = self.dropped
+        if dropped:
+            record.dropped = dropped  # Only counted as reported once this record is queued
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1  # Approximate under contention, which is fine for a loss counter
+        else:
+            self.dropped -= dropped
+
+    def prepare(self, record):
+        # Only the cheap part happens here: merging msg % args now means later changes to
+        # the arguments cannot alter the message. JSON encoding and tracebacks are left
+        # to the listener thread.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        return record
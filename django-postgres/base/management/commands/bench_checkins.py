@@ -0,0 +1,76 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from base import checkin
+from base.benchmarking import benchmark_database, format_summary
+from base.models import CheckIn, Event, Registration
+
+
+class Command(BaseCommand):
+    help = 'Measure ingesting door scans through the batch check-in endpoint (runs on the test database).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scans', type=int, default=50_000, help='Tickets scanned')
+        parser.add_argument('--batch', type=int, default=1000, help='Scans per upload')
+        parser.add_argument('--repeats', type=float, default=5.0, help='Percentage of scans uploaded twice (retries, second gates)')
+        parser.add_argument('--baseline', type=int, default=500, help='Scans uploaded one per request for comparison')
+
+    def handle(self, *args, **options):
+        with benchmark_database(verbosity=0):
+            event = Event.objects.create(title='Stadium show', description='-')
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO base_participant (name, email) "
+                    "SELECT 'Fan ' || n, 'fan' || n || '@example.com' FROM generate_series(1, %s) AS n",
+                    [options['scans']],
+                )
+                cursor.execute(
+                    "INSERT INTO base_registration (event_id, participant_id, timestamp, status) "
+                    "SELECT %s, id, now(), 'confirmed' FROM base_participant",
+                    [event.id],
+                )
+                cursor.execute('ANALYZE base_participant, base_registration')
+            staff = get_user_model().objects.create_user('gate', 'gate@example.com', password_hash='!')
+            staff.is_staff = True
+            staff.save()
+            client = APIClient()
+            client.force_authenticate(staff)
+            url = reverse('checkin-batch')
+
+            rng = random.Random(5)
+            start = time.perf_counter()
+            tokens = [checkin.registration_token(r) for r in Registration.objects.only('id', 'event_id', 'participant_id')]
+            self.stdout.write(f'Issued {len(tokens)} tokens in {time.perf_counter() - start:.2f}s')
+            now = timezone.now().isoformat()
+            scans = [{'token': token, 'scanned_at': now} for token in tokens]
+            scans += rng.sample(scans, int(len(scans) * options['repeats'] / 100))
+            rng.shuffle(scans)
+
+            baseline = scans[:options['baseline']]
+            samples = []
+            for scan in baseline:
+                started = time.perf_counter()
+                client.post(url, {'scanner': 'gate-0', 'scans': [scan]}, format='json')
+                samples.append((time.perf_counter() - started) * 1000)
+            per_scan = sum(samples) / 1000 / len(baseline)
+            self.stdout.write(format_summary('one scan per request', samples))
+            self.stdout.write(f'  -> {1 / per_scan:.0f} scans/s, {per_scan * len(scans):.1f}s projected for {len(scans)} scans')
+            CheckIn.objects.all().delete()
+
+            samples = []
+            for offset in range(0, len(scans), options['batch']):
+                started = time.perf_counter()
+                response = client.post(url, {'scanner': 'gate-1', 'scans': scans[offset:offset + options['batch']]}, format='json')
+                samples.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 201, response.content
+            total = sum(samples) / 1000
+            self.stdout.write(format_summary(f"batches of {options['batch']}", samples))
+            self.stdout.write(f'  -> {len(scans) / total:.0f} scans/s, {total:.1f}s for {len(scans)} scans '
+                              f'({CheckIn.objects.count()} check-ins recorded)')
@@ -0,0 +1,43 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from base.benchmarking import benchmark_database, format_summary, time_calls
+from base.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Compare payload size and latency of event lists with full rows, the default deferred description and ?fields= (runs on the test database).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=2000, help='Number of synthetic events to seed')
+        parser.add_argument('--description-bytes', type=int, default=4000, help='Average description length')
+        parser.add_argument('--repeat', type=int, default=30, help='Timed requests per variant')
+
+    def handle(self, *args, **options):
+        with benchmark_database(verbosity=0):
+            rng = random.Random(7)
+            date = timezone.localdate() + timezone.timedelta(days=1)
+            size = options['description_bytes']
+            Event.objects.bulk_create(
+                (Event(title=f'Event {i}', description='lorem ipsum ' * (rng.randint(size // 2, size * 3 // 2) // 12),
+                       date=date, venue=f'Venue {i % 50}') for i in range(options['events'])),
+                batch_size=1000,
+            )
+
+            client = Client()
+            variants = [
+                ('event-list', 'all fields', {'fields': ','.join(['id', 'title', 'description', 'image', 'date', 'time', 'venue', 'charge', 'latitude', 'longitude', 'image_url'])}),
+                ('event-list', 'default (description deferred)', {}),
+                ('event-list', 'fields=id,title,date', {'fields': 'id,title,date'}),
+                ('future-event-list', 'all fields, page_size=50', {'page_size': 50, 'fields': 'id,title,description,date,time,venue,charge'}),
+                ('future-event-list', 'default, page_size=50', {'page_size': 50}),
+            ]
+            for url_name, label, params in variants:
+                url = reverse(url_name)
+                payload = len(client.get(url, params).content)
+                samples = time_calls(lambda: client.get(url, params), options['repeat'])
+                self.stdout.write(format_summary(f'{url_name} {label}: {payload / 1024:.1f} KiB', samples))
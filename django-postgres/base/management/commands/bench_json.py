@@ -0,0 +1,64 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from authentication.renderers import UserRenderer
+from base import seeding
+from base.benchmarking import format_summary, time_calls
+from base.models import Event
+from base.renderers import FastJSONRenderer, orjson
+from base.serializers import EventSerializer
+
+
+class PreviousUserRenderer(JSONRenderer):
+    """authentication.renderers.UserRenderer before it checked for errors structurally."""
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if 'ErrorDetail' in str(data):
+            return json.dumps({'errors': data})
+        return json.dumps({'data': data})
+
+
+class Command(BaseCommand):
+    help = 'Compare JSON rendering throughput of event lists: DRF JSONRenderer, FastJSONRenderer with and without orjson (no database).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=2000, help='Events in the rendered list')
+        parser.add_argument('--repeat', type=int, default=30, help='Timed renders per renderer')
+
+    def handle(self, *args, **options):
+        # Serialized once from unsaved events: only the rendering is timed
+        seeder = seeding.Seeder(seed=1, today=timezone.localdate())
+        columns = seeding.EVENT_COLUMNS
+        events = [Event(id=index + 1, updated_at=timezone.now() - timedelta(minutes=index), **dict(zip(columns, row)))
+                  for index, row in enumerate(seeder.events(options['events']))]
+        request = RequestFactory().get('/events/')
+        data = EventSerializer(events, many=True, context={'request': request}).data
+        size = len(JSONRenderer().render(data))
+        self.stdout.write(f'{len(events)} events, {size / 1024:.0f} KiB of JSON')
+
+        without_orjson = FastJSONRenderer()
+        without_orjson.use_orjson = False
+        renderers = [
+            ('JSONRenderer', JSONRenderer()),
+            ('FastJSONRenderer, stdlib json', without_orjson),
+        ]
+        if orjson is not None:
+            renderers.append(('FastJSONRenderer, orjson', FastJSONRenderer()))
+        else:
+            self.stdout.write('orjson is not installed: only the stdlib encoder is measured')
+        renderers += [
+            ('UserRenderer, previous', PreviousUserRenderer()),
+            ('UserRenderer', UserRenderer()),
+        ]
+        context = {'response': Response(status=200)}  # What a view passes with a successful response
+        for label, renderer in renderers:
+            samples = time_calls(lambda: renderer.render(data, 'application/json', context), options['repeat'])
+            best = min(samples) / 1000
+            self.stdout.write(format_summary(label, samples) + f' ({size / best / 1024 / 1024:.0f} MiB/s at best)')
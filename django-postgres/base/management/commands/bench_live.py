@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from base import live
+from base.benchmarking import benchmark_database, format_summary
+from base.models import Event, Participant, Registration
+from base.notify import PostgresNotifyBus
+
+
+class Command(BaseCommand):
+    help = 'Measure how long a seat count change takes to reach many live watchers through LISTEN/NOTIFY (runs on the test database).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watchers', type=int, default=10_000, help='Subscribed watchers of one event')
+        parser.add_argument('--changes', type=int, default=50, help='Registration changes to publish')
+
+    def handle(self, *args, **options):
+        with benchmark_database(verbosity=0):
+            event = Event.objects.create(title='Ticket drop', description='-')
+            participants = Participant.objects.bulk_create(
+                Participant(name=f'Fan {i}', email=f'fan{i}@example.com') for i in range(options['changes'])
+            )
+            bus = PostgresNotifyBus()
+            broadcaster = live.Broadcaster(bus)
+            bus.wait_until_listening(live.LIVE_CHANNEL)
+
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, daemon=True).start()
+
+            async def subscribe():
+                return [broadcaster.subscribe(event.id) for _ in range(options['watchers'])]
+
+            async def receive_all(subscriptions):
+                await asyncio.gather(*(subscription.queue.get() for subscription in subscriptions))
+
+            subscriptions = asyncio.run_coroutine_threadsafe(subscribe(), loop).result()
+            samples, queries = [], 0
+            for participant in participants:
+                waiting = asyncio.run_coroutine_threadsafe(receive_all(subscriptions), loop)
+                start = time.perf_counter()
+                with CaptureQueriesContext(connection) as captured:
+                    # What the post_save signal does once the change has committed
+                    Registration.objects.create(event=event, participant=participant, status='confirmed')
+                waiting.result(timeout=30)
+                samples.append((time.perf_counter() - start) * 1000)
+                queries += len(captured)
+
+            self.stdout.write(format_summary(f"change -> {options['watchers']} watchers", samples))
+            self.stdout.write(f'{queries / len(participants):.1f} queries per change (insert, counts, NOTIFY), '
+                              f'versus {options["watchers"]} polls of the event per polling interval')
+            loop.call_soon_threadsafe(loop.stop)
+            bus.close()
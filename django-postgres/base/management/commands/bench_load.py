@@ -0,0 +1,290 @@
+import copy
+import json
+import logging.config
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.urls import NoReverseMatch, reverse
+from django.utils import timezone
+from wsgiref.simple_server import make_server
+
+from authentication import hashing
+from authentication.models import User
+from base import notify, objectcache, seeding
+from base.benchmarking import QuietHandler, ThreadingWSGIServer, benchmark_database, summarize
+from base.models import Event, Participant
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'load_baseline.json'
+PASSWORD = 'load-test-password'
+
+
+class Command(BaseCommand):
+    help = ('Drive a mixed workload (browse, detail, register, RSVP, book, login) through the whole app, '
+            'served in-process over HTTP on a seeded test database; prints RPS, latency percentiles and '
+            'errors per endpoint as JSON and compares them with a stored baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mix', default='browse=20,detail=50,register=10,rsvp=10,book=5,login=5',
+                            help='Scenario weights, as scenario=weight pairs')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds of measured load')
+        parser.add_argument('--warmup', type=float, default=3, help='Seconds of unmeasured load first')
+        parser.add_argument('--clients', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--events', type=int, default=1000, help='Seeded events (browse returns all of them)')
+        parser.add_argument('--participants', type=int, default=50_000)
+        parser.add_argument('--registrations', type=int, default=250_000)
+        parser.add_argument('--users', type=int, default=50, help='Verified accounts the login scenario uses')
+        parser.add_argument('--seed', type=int, default=0, help='Seeds the data and the clients')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the seeded test database between runs')
+        parser.add_argument('--output', default='-', help='Where to write the JSON report (- for stdout)')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Report to compare against, if it exists')
+        parser.add_argument('--save-baseline', action='store_true', help='Write this report as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative drop in RPS or rise in p95 before an endpoint counts as regressed')
+
+    def handle(self, *args, **options):
+        try:
+            mix = {name: weight for name, weight in seeding.parse_weights(options['mix']).items() if weight > 0}
+        except ValueError:
+            raise CommandError('--mix takes scenario=weight pairs, e.g. browse=3,login=1')
+        unknown = set(mix) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))} (known: {", ".join(SCENARIOS)})')
+
+        with benchmark_database(keepdb=options['keepdb'], verbosity=0):
+            self.seed(options)
+            fixtures = Fixtures.load(options['seed'])
+            skipped = {name: reason for name in mix if (reason := SCENARIOS[name].unavailable(fixtures))}
+            for name, reason in skipped.items():
+                self.stderr.write(f'Skipping {name}: {reason}')
+                del mix[name]
+            if not mix:
+                raise CommandError('No scenario left to run.')
+
+            application = get_wsgi_application()  # Before the logging change below: django.setup() applies LOGGING
+            config = copy.deepcopy(settings.LOGGING)
+            config['handlers']['stdout']['stream'] = 'ext://sys.stderr'  # Keep stdout for the report
+            logging.config.dictConfig(config)
+            try:
+                results, elapsed = self.run_load(application, fixtures, mix, options)
+            finally:
+                hashing.shutdown_pool()
+                objectcache.reset()
+                notify.reset_bus()  # Its listener connection would keep the test database open
+                logging.config.dictConfig(settings.LOGGING)
+
+        report = build_report(results, elapsed, options, mix, skipped)
+        baseline_path = Path(options['baseline'])
+        if baseline_path.exists() and not options['save_baseline']:
+            baseline = json.loads(baseline_path.read_text())
+            if baseline.get('config') != report['config']:
+                self.stderr.write(f'{baseline_path} was measured with other options; the comparison is only a guide.')
+            report['comparison'] = compare(baseline, report, options['tolerance'])
+        text = json.dumps(report, indent=2) + '\n'
+        if options['output'] == '-':
+            self.stdout.write(text, ending='')
+        else:
+            Path(options['output']).write_text(text)
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(text)
+            self.stderr.write(f'Baseline saved to {baseline_path}')
+
+        regressed = sorted(name for name, change in report.get('comparison', {}).items() if change['regressed'])
+        if regressed:
+            raise CommandError(f'Regressed against {baseline_path}: {", ".join(regressed)}')
+
+    def seed(self, options):
+        if Event.objects.count() < options['events']:
+            self.stderr.write('Seeding...')
+            seeder = seeding.Seeder(seed=options['seed'])
+            seeding.load(seeder, options['events'], options['participants'], options['registrations'])
+        missing = options['users'] - User.objects.filter(email__endswith='@load.example.com').count()
+        if missing > 0:
+            password = make_password(PASSWORD)  # Hashed once: every account gets the same hash
+            start = User.objects.filter(email__endswith='@load.example.com').count()
+            User.objects.bulk_create(
+                User(username=f'load{index}', email=f'load{index}@load.example.com', password=password, is_verified=True)
+                for index in range(start, start + missing)
+            )
+
+    def run_load(self, application, fixtures, mix, options):
+        server = make_server('127.0.0.1', 0, application, server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+        names, weights = list(mix), list(mix.values())
+        results = {name: Result() for name in names}
+        start = time.perf_counter()
+        measure_from = start + options['warmup']
+        deadline = measure_from + options['duration']
+
+        def client(index):
+            rng = random.Random(f'{options["seed"]}:client:{index}')
+            sent = 0
+            while time.perf_counter() < deadline:
+                name = rng.choices(names, weights)[0]
+                method, path, body = SCENARIOS[name].request(fixtures, rng, f'{index}-{sent}')
+                data = json.dumps(body).encode() if body is not None else None
+                request = urllib.request.Request(base_url + path, data, {'Content-Type': 'application/json'}, method=method)
+                began = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(request) as response:
+                        response.read()
+                    status = response.status
+                except urllib.error.HTTPError as exc:
+                    status = exc.code
+                except (urllib.error.URLError, ConnectionError) as exc:
+                    status = type(exc).__name__
+                if began >= measure_from:
+                    results[name].add((time.perf_counter() - began) * 1000, status)
+                sent += 1
+
+        clients = [threading.Thread(target=client, args=(index,)) for index in range(options['clients'])]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        server.shutdown()
+        server.server_close()
+        return results, time.perf_counter() - measure_from
+
+
+class Result:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = []
+        self.errors = {}
+
+    def add(self, milliseconds, status):
+        with self.lock:
+            if isinstance(status, int) and status < 400:
+                self.samples.append(milliseconds)
+            else:
+                self.errors[str(status)] = self.errors.get(str(status), 0) + 1
+
+
+class Fixtures:
+    """Ids the scenarios pick from, read once before the load starts."""
+
+    @classmethod
+    def load(cls, seed):
+        fixtures = cls()
+        now = timezone.localtime()
+        tomorrow = now.date() + timedelta(days=1)
+        events = Event.objects.order_by('id')
+        fixtures.event_ids = list(events.values_list('id', flat=True))
+        # From tomorrow on, so none closes for registration while the test runs
+        fixtures.future_event_ids = list(events.filter(date__gte=tomorrow).values_list('id', flat=True))
+        fixtures.participant_ids = list(Participant.objects.order_by('id').values_list('id', flat=True)[:100_000])
+        fixtures.user_emails = list(User.objects.filter(email__endswith='@load.example.com').values_list('email', flat=True))
+        fixtures.run = f'{seed}-{int(time.time())}'  # Keeps new participants apart from earlier --keepdb runs
+        return fixtures
+
+
+class Scenario:
+    def __init__(self, request, unavailable=None):
+        self.request = request  # (fixtures, rng, unique key) -> (method, path, JSON body or None)
+        self.unavailable = unavailable or (lambda fixtures: None)  # -> why it cannot run, or None
+
+
+def newcomer(fixtures, key):
+    return {'name': f'Load {key}', 'email': f'load-{fixtures.run}-{key}@example.com'}
+
+
+def book_route(fixtures):
+    try:
+        reverse('book-event')
+    except NoReverseMatch:
+        return 'no booking endpoint is routed (base.urls has no book-event)'
+    return None
+
+
+def needs_future_events(fixtures):
+    return None if fixtures.future_event_ids else 'no events from tomorrow on'
+
+
+SCENARIOS = {
+    'browse': Scenario(lambda fixtures, rng, key: ('GET', reverse('event-list'), None)),  # Not paged: the whole list
+    'detail': Scenario(lambda fixtures, rng, key: (
+        'GET', reverse('event-detail', args=[rng.choice(fixtures.event_ids)]), None)),
+    'register': Scenario(lambda fixtures, rng, key: (
+        'POST', reverse('register-event'),
+        {'event_id': rng.choice(fixtures.future_event_ids), 'participant': newcomer(fixtures, key)},
+    ), needs_future_events),
+    'rsvp': Scenario(lambda fixtures, rng, key: (
+        'POST', reverse('rsvp-event'),
+        {'event_id': rng.choice(fixtures.future_event_ids), 'participant': newcomer(fixtures, key)},
+    ), needs_future_events),
+    'book': Scenario(lambda fixtures, rng, key: (
+        'POST', reverse('book-event'),
+        {'event': rng.choice(fixtures.future_event_ids), 'participant': rng.choice(fixtures.participant_ids), 'booked': True},
+    ), lambda fixtures: book_route(fixtures) or needs_future_events(fixtures)),
+    'login': Scenario(lambda fixtures, rng, key: (
+        'POST', reverse('login'), {'email': rng.choice(fixtures.user_emails), 'password': PASSWORD},
+    ), lambda fixtures: None if fixtures.user_emails else 'no load-test accounts'),
+}
+
+
+def build_report(results, elapsed, options, mix, skipped):
+    endpoints = {}
+    for name, result in results.items():
+        stats = summarize(result.samples)
+        endpoints[name] = {
+            'requests': stats['count'] + sum(result.errors.values()),
+            'rps': round(stats['count'] / elapsed, 2),
+            'mean_ms': round(stats['mean'], 3),
+            'p50_ms': round(stats['p50'], 3),
+            'p95_ms': round(stats['p95'], 3),
+            'p99_ms': round(stats['p99'], 3),
+            'errors': sum(result.errors.values()),
+            'errors_by_status': result.errors,
+        }
+    everything = [sample for result in results.values() for sample in result.samples]
+    stats = summarize(everything)
+    return {
+        'config': {key: options[key] for key in ('duration', 'warmup', 'clients', 'events', 'participants',
+                                                 'registrations', 'users', 'seed')} | {'mix': mix},
+        'python': sys.version.split()[0],
+        'skipped': skipped,
+        'total': {
+            'rps': round(stats['count'] / elapsed, 2),
+            'p50_ms': round(stats['p50'], 3),
+            'p95_ms': round(stats['p95'], 3),
+            'p99_ms': round(stats['p99'], 3),
+            'errors': sum(endpoint['errors'] for endpoint in endpoints.values()),
+        },
+        'endpoints': endpoints,
+    }
+
+
+def compare(baseline, report, tolerance):
+    """Relative change of each endpoint (and the total) from `baseline`; regressed past `tolerance`.
+
+    The p95 of the total is reported but not judged: it mixes millisecond reads with
+    logins that hash for seconds, so it moves with the share of logins in its tail.
+    """
+    changes = {}
+    pairs = [('total', baseline.get('total'), report['total'])]
+    pairs += [(name, baseline.get('endpoints', {}).get(name), current) for name, current in report['endpoints'].items()]
+    for name, before, after in pairs:
+        if not before:
+            continue
+        rps = (after['rps'] - before['rps']) / before['rps'] if before['rps'] else 0.0
+        p95 = (after['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0.0
+        new_errors = before['errors'] == 0 and after['errors'] > 0
+        changes[name] = {
+            'rps_change': round(rps, 3),
+            'p95_change': round(p95, 3),
+            'new_errors': new_errors,
+            'regressed': rps < -tolerance or (p95 > tolerance and name != 'total') or new_errors,
+        }
+    return changes
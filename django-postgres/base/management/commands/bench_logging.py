@@ -0,0 +1,136 @@
+import copy
+import fcntl
+import json
+import logging
+import logging.config
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.urls import reverse
+from django.utils import timezone
+from wsgiref.simple_server import make_server
+
+from base.benchmarking import QuietHandler, ThreadingWSGIServer, benchmark_database, format_summary
+from base.models import Event
+
+# A log shipper that can only take `rate` bytes per second; prints how many lines it got
+SLOW_SINK = '''
+import sys, time
+rate, lines = float(sys.argv[1]), 0
+while True:
+    chunk = sys.stdin.buffer.read1(4096)
+    if not chunk:
+        break
+    lines += chunk.count(b"\\n")
+    time.sleep(len(chunk) / rate)
+print(lines)
+'''
+
+
+class Command(BaseCommand):
+    help = ('Measure RSVP throughput with logging off, with the old synchronous DEBUG handler and with the '
+            'queued JSON pipeline, writing to a slow log consumer (runs a threaded server on the test database).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default='off,sync,queue,queue-unsampled', help='Comma separated modes to compare')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of load per mode')
+        parser.add_argument('--clients', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--sink-rate', type=float, default=2, help='KiB/s the log consumer reads')
+
+    def handle(self, *args, **options):
+        with benchmark_database(verbosity=0):
+            tomorrow = timezone.localdate() + timedelta(days=1)
+            self.events = Event.objects.bulk_create(
+                Event(title=f'Event {i}', description='-', date=tomorrow) for i in range(20)
+            )
+            self.application = get_wsgi_application()  # Before configuring: django.setup() applies LOGGING again
+            try:
+                for mode in options['modes'].split(','):
+                    self.run_mode(mode, options)
+            finally:
+                logging.disable(logging.NOTSET)
+                logging.config.dictConfig(settings.LOGGING)
+
+    def configure(self, mode, stream):
+        logging.disable(logging.CRITICAL if mode == 'off' else logging.NOTSET)
+        if mode == 'sync':
+            # The previous configuration: root at DEBUG, written by the calling thread
+            config = {
+                'version': 1,
+                'disable_existing_loggers': False,
+                'handlers': {'console': {'level': 'DEBUG', 'class': 'logging.StreamHandler', 'stream': stream}},
+                'root': {'handlers': ['console'], 'level': 'DEBUG'},
+            }
+        else:
+            config = copy.deepcopy(settings.LOGGING)
+            config['handlers']['stdout']['stream'] = stream
+            if mode == 'queue-unsampled':
+                config['filters']['sample']['rates'] = {}
+        logging.config.dictConfig(config)
+
+    def run_mode(self, mode, options):
+        sink = subprocess.Popen([sys.executable, '-c', SLOW_SINK, str(options['sink_rate'] * 1024)],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        if hasattr(fcntl, 'F_SETPIPE_SZ'):
+            # A 4KiB pipe instead of 64KiB, so a backed-up shipper is felt within seconds (Linux only)
+            fcntl.fcntl(sink.stdin.fileno(), fcntl.F_SETPIPE_SZ, 4096)
+        stream = open(sink.stdin.fileno(), 'w', closefd=False)
+        self.configure(mode, stream)
+
+        server = make_server('127.0.0.1', 0, self.application,
+                             server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}{reverse("rsvp-event")}'
+        samples, errors = [], []
+        deadline = time.perf_counter() + options['duration']
+
+        def client(index):
+            sent = 0
+            while time.perf_counter() < deadline:
+                body = json.dumps({
+                    'event_id': self.events[sent % len(self.events)].id,
+                    # A new guest each time: RSVPSerializer rejects emails it has already seen
+                    'participant': {'name': f'Guest {index}', 'email': f'{mode}-{index}-{sent}@example.com'},
+                }).encode()
+                request = urllib.request.Request(url, body, {'Content-Type': 'application/json'})
+                start = time.perf_counter()
+                try:
+                    urllib.request.urlopen(request).read()
+                except (urllib.error.URLError, ConnectionError) as exc:
+                    errors.append(exc)
+                else:
+                    samples.append((time.perf_counter() - start) * 1000)
+                sent += 1
+
+        clients = [threading.Thread(target=client, args=(i,)) for i in range(options['clients'])]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        server.shutdown()
+        server.server_close()
+
+        # Whatever is still queued is not part of the measurement: discard it and stop
+        for handler in logging.getLogger().handlers:
+            if getattr(handler, 'listener', None) is not None:
+                for target in handler.listener.handlers:
+                    target.setStream(open(os.devnull, 'w'))
+                handler.listener.stop()
+        logging.config.dictConfig({'version': 1, 'disable_existing_loggers': False})
+        stream.close()
+        sink.stdin.close()
+        lines = int(sink.stdout.read() or 0)
+        sink.wait()
+
+        self.stdout.write(f'{mode}: {len(samples) / options["duration"]:.1f} RSVPs/s, {lines} log lines shipped, '
+                          f'{len(errors)} errors')
+        self.stdout.write(format_summary('  rsvp', samples))
@@ -0,0 +1,75 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from base import geo
+from base.benchmarking import benchmark_database, format_summary, time_calls
+from base.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the nearby events endpoint against a large synthetic event table (runs on the test database).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=1_000_000, help='Number of synthetic events to seed')
+        parser.add_argument('--queries', type=int, default=200, help='Number of nearby requests to time')
+        parser.add_argument('--radius', type=float, default=10, help='Search radius in km')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keepdb', action='store_true', help='Keep the seeded test database between runs')
+
+    def handle(self, *args, **options):
+        with benchmark_database(keepdb=options['keepdb'], verbosity=0):
+            rng = random.Random(options['seed'])
+            self.seed_events(rng, options['events'])
+
+            # Query points spread over the same area as the events
+            points = [(rng.uniform(-4.7, 5.0), rng.uniform(33.9, 41.9)) for _ in range(options['queries'])]
+            client = Client()
+            url = reverse('nearby-event-list')
+            iterator = iter(points)
+
+            def query():
+                lat, lng = next(iterator)
+                response = client.get(url, {'lat': lat, 'lng': lng, 'radius': options['radius']})
+                assert response.status_code == 200, response.content
+
+            samples = time_calls(query, len(points))
+            self.stdout.write(format_summary(f"nearby radius={options['radius']}km over {Event.objects.count()} events", samples))
+            self.stdout.write(self.explain(*points[0], options['radius']))
+
+    def seed_events(self, rng, total):
+        existing = Event.objects.count()
+        if existing >= total:
+            return
+        self.stdout.write(f'Seeding {total - existing} events...')
+        batch = []
+        for index in range(existing, total):
+            # Roughly the bounding box of Kenya
+            lat = rng.uniform(-4.7, 5.0)
+            lng = rng.uniform(33.9, 41.9)
+            batch.append(Event(
+                title=f'Event {index}', description='Synthetic event', venue=f'Venue {index % 5000}',
+                latitude=lat, longitude=lng, geohash=geo.encode(lat, lng),
+            ))
+            if len(batch) == 10_000:
+                Event.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Event.objects.bulk_create(batch)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE base_event')
+
+    def explain(self, lat, lng, radius):
+        """Show the plan for the first page so the index scan can be checked by eye."""
+        from functools import reduce
+        import operator
+        from django.db.models import Q
+
+        cells = geo.covering_cells(lat, lng, radius)
+        queryset = (Event.objects.filter(reduce(operator.or_, (Q(geohash__startswith=cell) for cell in cells)))
+                    .annotate(distance_km=geo.haversine_expression(lat, lng))
+                    .filter(distance_km__lte=radius).order_by('distance_km', 'id')[:5])
+        return queryset.explain()
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from base.benchmarking import benchmark_database, format_summary, time_calls
+from base.models import Registration
+from base.pagination import CustomPageNumberPagination
+
+
+class Command(BaseCommand):
+    help = 'Benchmark exact, estimated and skipped counts when paginating a large Registration table (runs on the test database).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--registrations', type=int, default=10_000_000, help='Number of registrations to seed')
+        parser.add_argument('--events', type=int, default=1000, help='Events the registrations are spread over')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per mode')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the seeded test database between runs')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('This benchmark seeds with generate_series and needs PostgreSQL.')
+
+        with benchmark_database(keepdb=options['keepdb'], verbosity=0):
+            self.seed(options['registrations'], options['events'])
+            factory = RequestFactory()
+            # Ordered by pk so the timings show the cost of counting, not of sorting
+            querysets = {
+                'all registrations': lambda: Registration.objects.order_by('pk'),
+                'one status': lambda: Registration.objects.filter(status='pending').order_by('pk'),
+            }
+            for label, get_queryset in querysets.items():
+                for mode in ('exact', 'auto', 'none'):
+                    request = Request(factory.get('/registrations/', {'count': mode, 'page': 3}))
+
+                    def paginate():
+                        paginator = CustomPageNumberPagination()
+                        paginator.paginate_queryset(get_queryset(), request)
+                        return paginator.page.paginator.count
+
+                    count = paginate()
+                    samples = time_calls(paginate, options['repeat'])
+                    self.stdout.write(format_summary(f'{label} count={mode} (reported {count})', samples))
+
+    def seed(self, total, events):
+        existing = Registration.objects.count()
+        if existing >= total:
+            return
+        if existing:
+            raise CommandError('The kept test database holds a different amount of data; rerun without --keepdb.')
+
+        participants = -(-total // events)  # Every participant registers for every event
+        self.stdout.write(f'Seeding {total} registrations ({events} events x {participants} participants)...')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO base_event (title, description, date, time, venue, charge, geohash) "
+                "SELECT 'Event ' || n, 'Synthetic event', CURRENT_DATE + n, '18:00', '', 'free', '' "
+                "FROM generate_series(1, %s) AS n",
+                [events],
+            )
+            cursor.execute(
+                "INSERT INTO base_participant (name, email) "
+                "SELECT 'Participant ' || n, 'participant' || n || '@example.com' FROM generate_series(1, %s) AS n",
+                [participants],
+            )
+            cursor.execute(
+                "INSERT INTO base_registration (event_id, participant_id, timestamp, status) "
+                "SELECT e.id, p.id, now() - (p.id || ' minutes')::interval, "
+                "(ARRAY['confirmed', 'pending', 'cancelled', 'rsvp'])[1 + (p.id + e.id) %% 4] "
+                "FROM base_event e CROSS JOIN base_participant p LIMIT %s",
+                [total],
+            )
+            cursor.execute('ANALYZE base_event, base_participant, base_registration')
@@ -0,0 +1,71 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: what a worker does before it can serve its first request
+WORKER_STARTUP = '''
+import json, sys, time
+start, cpu_start = time.perf_counter(), time.process_time()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+
+# First request through the whole middleware stack (no database: the query string is invalid)
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': '/events/nearby/', 'QUERY_STRING': 'lat=x', 'SERVER_NAME': 'localhost',
+    'SERVER_PORT': '80', 'wsgi.url_scheme': 'http', 'wsgi.input': __import__('io').BytesIO(), 'wsgi.errors': sys.stderr,
+}
+start = time.perf_counter()
+b''.join(application(environ, lambda status, headers, exc_info=None: None))
+first_request = time.perf_counter() - start
+rss = 0
+try:
+    with open('/proc/self/status') as status:
+        rss = next(int(line.split()[1]) for line in status if line.startswith('VmRSS:')) * 1024
+except (OSError, StopIteration):
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+print(json.dumps({'seconds': elapsed, 'cpu': cpu, 'first_request': first_request, 'rss': rss, 'modules': len(sys.modules)}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure worker start-up time and memory for each settings profile, in fresh processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='ratiba.settings,ratiba.settings_api',
+                            help='Comma-separated settings modules to compare')
+        parser.add_argument('--repeat', type=int, default=10, help='Fresh processes per profile')
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'].split(',')
+        results = {profile: [] for profile in profiles}
+        for _ in range(options['repeat']):
+            for profile in profiles:  # Interleaved, so background noise hits every profile alike
+                results[profile].append(self.start_worker(profile))
+        for profile, runs in results.items():
+            seconds = [run['seconds'] * 1000 for run in runs]
+            cpu = statistics.median(run['cpu'] * 1000 for run in runs)  # Steadier than wall time on a busy host
+            first_request = statistics.median(run['first_request'] * 1000 for run in runs)
+            rss = statistics.median(run['rss'] for run in runs) / 1024 / 1024
+            self.stdout.write(
+                f'{profile}: import+setup p50={statistics.median(seconds):.0f}ms min={min(seconds):.0f}ms cpu={cpu:.0f}ms '
+                f'first request={first_request:.1f}ms rss={rss:.1f}MiB modules={runs[0]["modules"]}'
+            )
+
+    def start_worker(self, profile):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': profile}
+        result = subprocess.run(
+            [sys.executable, '-c', WORKER_STARTUP], cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f'{profile} failed to start:\n{result.stderr[-2000:]}')
+        return json.loads(result.stdout.strip().splitlines()[-1])
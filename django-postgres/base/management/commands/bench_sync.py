@@ -0,0 +1,66 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from base.benchmarking import benchmark_database, format_summary, time_calls
+from base.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Compare a delta sync after a few edits with re-downloading the event list (runs on the test database).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=20_000, help='Number of synthetic events to seed')
+        parser.add_argument('--changed', type=float, default=1.0, help='Percentage of events edited since the last sync')
+        parser.add_argument('--deleted', type=float, default=0.1, help='Percentage of events deleted since the last sync')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed requests per variant')
+
+    def handle(self, *args, **options):
+        with benchmark_database(verbosity=0), override_settings(SYNC_SETTLE_SECONDS=0, SIMILAR_EVENTS_INCREMENTAL=False):
+            rng = random.Random(3)
+            Event.objects.bulk_create(
+                (Event(title=f'Event {i}', description='lorem ipsum ' * rng.randint(20, 120), venue=f'Venue {i % 50}')
+                 for i in range(options['events'])),
+                batch_size=5000,
+            )
+            client = Client()
+            sync_url = reverse('event-sync')
+
+            # What the app holds after its previous launch
+            cursor, pages = None, 0
+            while True:
+                data = client.get(sync_url, {'cursor': cursor or '', 'page_size': 500}).json()
+                cursor, pages = data['cursor'], pages + 1
+                if not data['has_more']:
+                    break
+            self.stdout.write(f'Initial sync: {pages} pages of up to 500 events')
+
+            ids = list(Event.objects.values_list('id', flat=True))
+            for event in Event.objects.filter(id__in=rng.sample(ids, int(len(ids) * options['changed'] / 100))):
+                event.title += ' (updated)'
+                event.save(update_fields=['title'])
+            Event.objects.filter(id__in=rng.sample(ids, int(len(ids) * options['deleted'] / 100))).delete()
+
+            def delta_sync():
+                next_cursor, size = cursor, 0
+                while True:
+                    response = client.get(sync_url, {'cursor': next_cursor, 'page_size': 500})
+                    size += len(response.content)
+                    data = response.json()
+                    next_cursor = data['cursor']
+                    if not data['has_more']:
+                        return size
+
+            variants = [
+                ('full refetch (event-list)', lambda: len(client.get(reverse('event-list')).content)),
+                ('full refetch (event-list, all fields)', lambda: len(client.get(reverse('event-list'), {
+                    'fields': 'id,title,description,image,date,time,venue,charge,latitude,longitude,image_url,updated_at',
+                }).content)),
+                ('delta sync', delta_sync),
+            ]
+            for label, call in variants:
+                payload = call()
+                samples = time_calls(call, options['repeat'])
+                self.stdout.write(format_summary(f'{label}: {payload / 1024:.1f} KiB', samples))
@@ -0,0 +1,85 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base import notify, seeding, typeahead
+from base.benchmarking import benchmark_database, format_summary, time_calls
+from base.models import Event
+from base.typeahead import TypeaheadIndex
+
+
+class Command(BaseCommand):
+    help = ('Measure typeahead prefix queries and incremental updates of the in-memory index, then (with --mixed) '
+            'suggest() over a mix of prefixes and typos, which fall back to the database (runs on the test database).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=100_000, help='Synthetic events indexed')
+        parser.add_argument('--queries', type=int, default=5000, help='Timed prefix queries')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--mixed', action='store_true', help='Also time suggest() with the fuzzy fallback')
+        parser.add_argument('--typo-share', type=float, default=0.1, help='Share of --mixed queries with a typo')
+
+    def handle(self, *args, **options):
+        seeder = seeding.Seeder(seed=options['seed'], today=timezone.localdate())
+        rows = [(index + 1, row[0], row[4]) for index, row in enumerate(seeder.events(options['events']))]
+        index = TypeaheadIndex()
+        start = time.perf_counter()
+        index.build(rows)
+        self.stdout.write(f'Built from {len(rows)} events in {time.perf_counter() - start:.2f}s: {len(index.keys)} keys')
+
+        rng = random.Random(options['seed'])
+        words = sorted({word for row in rows[:1000] for text in row[1:] for word in (text or '').split() if word.isalpha()})
+        for length in (1, 3, 6):
+            # What users type: the start of a word of a real title or venue
+            queries = iter([rng.choice(words)[:length] for _ in range(options['queries'])])
+            samples = time_calls(lambda: index.search(next(queries)), options['queries'])
+            self.stdout.write(format_summary(f'search, {length} characters', samples))
+
+        changes = iter(rng.sample(rows, min(len(rows), 1000)))
+
+        def change():
+            event_id, title, venue = next(changes)
+            index.remove(event_id)
+            index.add(event_id, f'{title} (moved)', venue)
+        self.stdout.write(format_summary('update one event', time_calls(change, min(len(rows), 1000))))
+
+        if options['mixed']:
+            self.mixed(words, rng, options)
+
+    def mixed(self, words, rng, options):
+        """suggest() as deployed: prefixes from memory, typos (no prefix match) from Postgres."""
+        words = [word for word in words if len(word) >= typeahead.MIN_FUZZY_LENGTH + 1]
+        with benchmark_database(verbosity=0):
+            try:
+                self.time_suggest(words, rng, options)
+            finally:
+                typeahead.reset_index()
+                notify.reset_bus()  # Its listener connection would keep the test database from being dropped
+
+    def time_suggest(self, words, rng, options):
+        seeder = seeding.Seeder(seed=options['seed'], today=timezone.localdate())
+        Event.objects.bulk_create((Event(title=row[0], description='-', venue=row[4])
+                                   for row in seeder.events(options['events'])), batch_size=5000)
+        typeahead.reset_index()
+        typeahead.get_index()
+        if not typeahead.fuzzy_available():
+            self.stdout.write('pg_trgm is not installed on this server: typos get no suggestions')
+
+        def typo(word):
+            position = rng.randrange(1, len(word))
+            return word[:position] + 'q' + word[position + 1:]  # No word here starts with the result
+
+        queries = [typo(word) if rng.random() < options['typo_share'] else word[:3]
+                   for word in rng.choices(words, k=options['queries'])]
+        typos = [query for query in queries if not typeahead.get_index().search(query)]
+        iterator = iter(queries)
+        samples = time_calls(lambda: typeahead.suggest(next(iterator)), len(queries))
+        self.stdout.write(format_summary(
+            f"suggest, {options['typo_share']:.0%} typos ({len(typos)} of {len(queries)} queries fall back)", samples,
+        ))
+        if typos:
+            iterator = iter(typos)
+            samples = time_calls(lambda: typeahead.suggest(next(iterator)), len(typos))
+            self.stdout.write(format_summary('suggest, fuzzy fallback only', samples))
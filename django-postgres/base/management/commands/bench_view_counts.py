@@ -0,0 +1,53 @@
+import os
+import random
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from base import viewcounts
+from base.benchmarking import benchmark_database
+from base.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Compare an UPDATE per event view with buffered counts written in one batch (runs on the test database).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10_000, help='Number of synthetic events to seed')
+        parser.add_argument('--views', type=int, default=20_000, help='Views in one flush interval, skewed to popular events')
+
+    def handle(self, *args, **options):
+        with benchmark_database(verbosity=0):
+            Event.objects.bulk_create((Event(title=f'Event {i}', description='-') for i in range(options['events'])),
+                                      batch_size=5000)
+            ids = list(Event.objects.values_list('id', flat=True))
+            rng = random.Random(5)
+            views = rng.choices(ids, weights=[1 / rank for rank in range(1, len(ids) + 1)], k=options['views'])
+
+            start = time.perf_counter()
+            for event_id in views:
+                Event.objects.filter(pk=event_id).update(view_count=F('view_count') + 1)
+            per_view = time.perf_counter() - start
+
+            counter = viewcounts.ViewCounter()
+            counter.pid = os.getpid()  # No flusher thread: flushed below
+            start = time.perf_counter()
+            for event_id in views:
+                counter.record(event_id)
+            recorded = time.perf_counter() - start
+            start = time.perf_counter()
+            events = counter.flush()
+            flushed = time.perf_counter() - start
+
+            # Both methods counted every view once
+            totals = dict(Event.objects.filter(view_count__gt=0).values_list('id', 'view_count'))
+            if totals != {event_id: 2 * count for event_id, count in Counter(views).items()}:
+                self.stderr.write('The two methods disagree on the counts')
+
+            self.stdout.write(f'{len(views)} views of {events} distinct events')
+            self.stdout.write(f'UPDATE per view: {len(views)} statements, {per_view * 1000:.0f}ms '
+                              f'({per_view / len(views) * 1e6:.0f}us per view)')
+            self.stdout.write(f'buffered: {recorded / len(views) * 1e6:.2f}us per view in memory, '
+                              f'then 1 statement in {flushed * 1000:.0f}ms')
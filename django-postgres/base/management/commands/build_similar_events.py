@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from base.recommendations import get_k, rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed "similar events" table from event titles and descriptions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=None, help='Neighbours to keep per event (default SIMILAR_EVENTS_K)')
+
+    def handle(self, *args, **options):
+        k = options['k'] or get_k()
+        start = time.perf_counter()
+        count = rebuild_all(k)
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored up to {k} similar events for {count} events in {time.perf_counter() - start:.1f}s'
+        ))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base import objectcache
+from base.blobs import rebuild_ref_counts
+from base.media import ContentAddressedStorage, blob_digest, file_digest
+from base.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Move existing event images into shared content-addressed blobs and rebuild their reference counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deduplicated without changing anything')
+        parser.add_argument('--keep-originals', action='store_true', help='Leave the old per-event files in place')
+
+    def handle(self, *args, **options):
+        storage = ContentAddressedStorage()  # Same MEDIA_ROOT as the default storage
+
+        events = Event.objects.exclude(image='').exclude(image__isnull=True).only('id', 'image').order_by('id')
+        migrated, missing, bytes_before = 0, 0, 0
+        originals = {}  # Old file name -> blob name
+        blob_names = set()
+        for event in events.iterator(chunk_size=500):
+            name = event.image.name
+            if blob_digest(name):
+                blob_names.add(name)
+                continue
+            if name not in originals:
+                if not storage.exists(name):
+                    missing += 1
+                    self.stderr.write(f'Event {event.pk}: {name} is missing, left as is')
+                    continue
+                bytes_before += storage.size(name)
+                with storage.open(name) as file:
+                    if options['dry_run']:
+                        originals[name] = storage.hashed_name(name, file_digest(file))
+                    else:
+                        originals[name] = storage.save(name, file)
+            blob_names.add(originals[name])
+            if not options['dry_run']:
+                # Straight UPDATE: the reference counts are rebuilt from scratch below
+                Event.objects.filter(pk=event.pk, image=name).update(image=originals[name], updated_at=timezone.now())
+                objectcache.invalidate(Event, [event.pk])  # No signal is sent for update()
+            migrated += 1
+
+        self.stdout.write(
+            f'{migrated} event images in {len(originals)} files map to {len(blob_names)} blobs '
+            f'({bytes_before / 1024 / 1024:.1f} MiB of originals), {missing} missing'
+        )
+        if options['dry_run']:
+            return
+
+        in_use, deleted = rebuild_ref_counts()
+        self.stdout.write(f'{in_use} blobs in use, {deleted} unreferenced blobs deleted')
+
+        if not options['keep_originals']:
+            still_used = set(Event.objects.filter(image__in=originals).values_list('image', flat=True))
+            unused = originals.keys() - still_used
+            for name in unused:
+                storage.delete(name)
+            self.stdout.write(f'Deleted {len(unused)} original files')
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from base.sync import prune_tombstones, tombstone_retention
+
+
+class Command(BaseCommand):
+    help = 'Delete event tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS (clients that old must resync from scratch).'
+
+    def handle(self, *args, **options):
+        count = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} tombstones older than {tombstone_retention().days} days'))
@@ -0,0 +1,30 @@
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.core.management.base import BaseCommand
+
+from base.uploads import LocalObjectStore, LocalObjectStoreApp
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class Command(BaseCommand):
+    help = 'Run the local object store that accepts signed direct uploads (a stand-in for S3 and friends).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=9000)
+
+    def handle(self, *args, **options):
+        store = LocalObjectStore()
+        server = make_server(options['host'], options['port'], LocalObjectStoreApp(store),
+                             server_class=ThreadingWSGIServer, handler_class=WSGIRequestHandler)
+        self.stdout.write(f"Object store on http://{options['host']}:{options['port']}/ storing under {store.root}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,64 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from base import seeding
+from base.benchmarking import benchmark_database
+
+
+class Command(BaseCommand):
+    help = ('Load deterministic synthetic events, participants, registrations and bookings '
+            '(COPY on PostgreSQL, bulk_create elsewhere). Appends to what is there.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=100_000)
+        parser.add_argument('--participants', type=int, default=1_000_000)
+        parser.add_argument('--registrations', type=int, default=5_000_000,
+                            help='Roughly; no participant registers twice for an event')
+        parser.add_argument('--booking-rate', type=float, default=0.3, help='Bookings per registration')
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Zipf exponent of event popularity: 0 spreads registrations evenly, higher is heavier-headed')
+        parser.add_argument('--statuses', default='confirmed=0.6,pending=0.15,rsvp=0.15,cancelled=0.1',
+                            help='Registration status mix, as status=weight pairs')
+        parser.add_argument('--days-past', type=int, default=365, help='Earliest event date, in days before --today')
+        parser.add_argument('--days-ahead', type=int, default=180, help='Latest event date, in days after --today')
+        parser.add_argument('--today', type=date.fromisoformat, help='Date the spread is centred on (default: today)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--method', choices=['auto', 'copy', 'orm'], default='auto',
+                            help='copy needs PostgreSQL; auto picks it there and bulk_create elsewhere')
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Rows per bulk_create')
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--test-database', action='store_true',
+                            help='Seed the kept test database the benchmarks use with --keepdb')
+
+    def handle(self, *args, **options):
+        try:
+            statuses = seeding.parse_weights(options['statuses'])
+        except ValueError:
+            raise CommandError('--statuses takes status=weight pairs, e.g. confirmed=0.7,cancelled=0.3')
+        unknown = set(statuses) - {value for value, _ in seeding.Registration.STATUS_CHOICES}
+        if unknown:
+            raise CommandError(f'Unknown statuses: {", ".join(sorted(unknown))}')
+        if options['method'] == 'copy' and connections[options['database']].vendor != 'postgresql':
+            raise CommandError('COPY needs PostgreSQL; use --method orm.')
+
+        seeder = seeding.Seeder(
+            seed=options['seed'], days_past=options['days_past'], days_ahead=options['days_ahead'],
+            statuses=statuses, skew=options['skew'], booking_rate=options['booking_rate'], today=options['today'],
+        )
+        if options['test_database']:
+            with benchmark_database(keepdb=True, verbosity=0):
+                self.load(seeder, options)
+        else:
+            self.load(seeder, options)
+
+    def load(self, seeder, options):
+        def report(table, rows, seconds):
+            self.stdout.write(f'{table}: {rows} rows in {seconds:.1f}s ({rows / max(seconds, 1e-9):,.0f} rows/s)')
+
+        seeding.load(
+            seeder, options['events'], options['participants'], options['registrations'],
+            using=options['database'], method=options['method'], batch_size=options['batch_size'], report=report,
+        )
+        self.stdout.write('Similar events are not computed for seeded rows; run build_similar_events if needed.')
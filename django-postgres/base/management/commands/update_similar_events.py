@@ -0,0 +1,34 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from base.recommendations import process_queue
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Refresh the "similar events" of the events queued by their saves (runs until stopped).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the queue once and exit')
+
+    def handle(self, *args, **options):
+        interval = getattr(settings, 'SIMILAR_EVENTS_POLL_SECONDS', 5)
+        while True:
+            try:
+                processed = process_queue()
+            except Exception:
+                if options['once']:
+                    raise
+                logger.exception('Refreshing similar events failed; retrying')
+                connection.close()  # A fresh connection, should this one be broken
+                processed = 0
+            if options['once']:
+                self.stdout.write(f'Refreshed the similar events of {processed} events')
+                return
+            if not processed:
+                time.sleep(interval)
@@ -0,0 +1,267 @@
+# base/media.py
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+import tempfile
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+BLOB_PREFIX = 'blobs'
+INCOMING_DIR = f'{BLOB_PREFIX}/incoming'  # Uploads being hashed; never served
+BLOB_NAME_RE = re.compile(r'^%s/[0-9a-f]{2}/([0-9a-f]{64})(\.[^./]+)?$' % BLOB_PREFIX)
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_digest(content):
+    """SHA-256 of an uploaded file, read in chunks; the file is rewound afterwards."""
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def blob_digest(name):
+    """Digest of a content-addressed blob name, or None for any other file."""
+    match = BLOB_NAME_RE.match(name or '')
+    return match.group(1) if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores every upload once, at `blobs/<2 hex>/<sha256>.<ext>`, whatever it was called.
+
+    The upload is hashed while it is copied to a temporary file next to the blobs, then
+    renamed into place, so each byte is read once. When the blob already exists the copy
+    is dropped and the existing name returned. A name then always refers to the same
+    bytes, so blobs can be cached forever by clients and CDNs. Blobs are shared between
+    events, so they are only deleted through base.blobs, which keeps their reference counts.
+    """
+
+    def hashed_name(self, name, digest):
+        ext = os.path.splitext(name)[1].lower()
+        return f'{BLOB_PREFIX}/{digest[:2]}/{digest}{ext}'
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        incoming = self.path(INCOMING_DIR)
+        os.makedirs(incoming, exist_ok=True)
+
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=incoming, delete=False) as temporary:
+            try:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temporary.write(chunk)
+            except BaseException:
+                os.unlink(temporary.name)
+                raise
+
+        name = self.hashed_name(name, digest.hexdigest())
+        path = self.path(name)
+        from .blobs import lock  # base.blobs imports this module
+        with transaction.atomic(savepoint=False):
+            # A blob without references is deleted under this lock: only checked once it is held.
+            # Referencing the blob in the same transaction keeps it from being deleted afterwards.
+            lock(name)
+            if os.path.exists(path):
+                os.unlink(temporary.name)  # Same name, same bytes
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temporary.name, self.file_permissions_mode)
+                os.replace(temporary.name, path)
+        return name
+
+
+class FileRange:
+    """File-like view of `length` bytes of an open file, starting at `start`.
+
+    Keeps `fileno()` so WSGI servers with wsgi.file_wrapper (gunicorn's sync and
+    gthread workers) can still use sendfile; they send Content-Length bytes from the
+    current offset.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.name = file.name
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+async def read_chunks(file, chunk_size=FileResponse.block_size):
+    """The rest of an open file, each chunk read in a thread (ASGI response bodies); closes it."""
+    try:
+        while chunk := await sync_to_async(file.read, thread_sensitive=False)(chunk_size):
+            yield chunk
+    finally:
+        file.close()
+
+
+def parse_range(header, size):
+    """Return (start, end) for a single satisfiable `bytes=` range, 'unsatisfiable', or None to ignore it."""
+    match = RANGE_RE.match(header.strip())
+    if not match or size == 0:
+        return None  # Multiple ranges or anything unusual: send the whole file
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size - 1  # Suffix range: the last N bytes
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start > end:
+            return 'unsatisfiable' if start >= size else None
+    return start, end
+
+
+class MediaMiddleware:
+    """Serves MEDIA_ROOT under MEDIA_URL in production, in the style of WhiteNoise.
+
+    Responses stream straight from disk, never loaded whole into memory: under WSGI as a
+    FileResponse (sent with sendfile where the server supports wsgi.file_wrapper), under
+    ASGI through read_chunks, since Django would read a synchronous FileResponse into a
+    list before sending the first byte. They carry ETag/Last-Modified for revalidation, support single `Range` requests, and
+    content-addressed blobs from ContentAddressedStorage are marked immutable. Uploads
+    still being hashed (INCOMING_DIR) are not served.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'MEDIA_SERVE', False)
+        self.prefix = settings.MEDIA_URL if settings.MEDIA_URL.startswith('/') else f'/{settings.MEDIA_URL}'
+        self.root = str(settings.MEDIA_ROOT)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self.serves(request):
+            return self.serve(request, request.path_info[len(self.prefix):])
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.serves(request):
+            # stat() and open() can block on a busy disk: not on the event loop either
+            return await sync_to_async(self.serve, thread_sensitive=False)(
+                request, request.path_info[len(self.prefix):], asynchronous=True,
+            )
+        return await self.get_response(request)
+
+    def serves(self, request):
+        return self.enabled and request.path_info.startswith(self.prefix) and request.method in ('GET', 'HEAD')
+
+    def serve(self, request, relative_path, asynchronous=False):
+        try:
+            path = safe_join(self.root, relative_path)
+            if self.is_incoming(path):
+                return HttpResponse(status=404)
+            stat_result = os.stat(path)
+        except (SuspiciousFileOperation, ValueError, OSError):
+            return HttpResponse(status=404)
+        if not stat.S_ISREG(stat_result.st_mode):
+            return HttpResponse(status=404)
+
+        size = stat_result.st_size
+        etag = f'"{size:x}-{stat_result.st_mtime_ns:x}"'
+        headers = {
+            'ETag': etag,
+            'Last-Modified': http_date(stat_result.st_mtime),
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL if blob_digest(relative_path) else DEFAULT_CACHE_CONTROL,
+            'Accept-Ranges': 'bytes',
+        }
+
+        if self.not_modified(request, etag, stat_result.st_mtime):
+            response = HttpResponseNotModified()
+            for header, value in headers.items():
+                response[header] = value
+            return response
+
+        content_type, encoding = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+
+        byte_range = None
+        range_header = request.headers.get('Range')
+        if range_header and request.headers.get('If-Range', etag) == etag:
+            byte_range = parse_range(range_header, size)
+        if byte_range == 'unsatisfiable':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        if request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type)
+            response['Content-Length'] = size
+        elif asynchronous:
+            start, end = byte_range or (0, size - 1)
+            response = StreamingHttpResponse(read_chunks(FileRange(open(path, 'rb'), start, end - start + 1)),
+                                             content_type=content_type, status=206 if byte_range else 200)
+            response['Content-Length'] = end - start + 1
+            if byte_range:
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        elif byte_range:
+            start, end = byte_range
+            response = FileResponse(FileRange(open(path, 'rb'), start, end - start + 1), content_type=content_type, status=206)
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    def is_incoming(self, path):
+        incoming = safe_join(self.root, INCOMING_DIR)
+        return path == incoming or path.startswith(incoming + os.sep)
+
+    def not_modified(self, request, etag, mtime):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        return if_modified_since is not None and int(mtime) <= if_modified_since
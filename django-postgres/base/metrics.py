@@ -0,0 +1,327 @@
+# base/metrics.py
+"""Per-route request metrics, served in the Prometheus text format at /metrics/.
+
+`MetricsMiddleware` times every request and counts its SQL queries and the time spent
+in them (through an execute wrapper on every connection, see `time_query`), then adds them and the response size
+to this process's `Registry`. Series are keyed by route pattern (`events/<int:pk>/`,
+so ids do not create new series), method and status. Other code counts its own events
+with `registry.increment` (see COUNTERS).
+
+Each gunicorn worker has its own registry. A flusher thread writes a snapshot of it to
+METRICS_DIR every METRICS_FLUSH_SECONDS and at exit: one file per process, replaced
+atomically, named after the server (parent) process. A scrape adds up the files of
+its own server, so whichever worker answers reports the totals of all of them, and
+counts of workers that were recycled are kept. Files left by servers that are no
+longer running are removed.
+"""
+import atexit
+import bisect
+import contextlib
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name -> (bucket bounds, help text); each is a histogram labelled by route, method and status
+HISTOGRAMS = {
+    'ratiba_http_request_duration_seconds': (DURATION_BUCKETS, 'Time to produce the response.'),
+    'ratiba_http_request_queries': (QUERY_BUCKETS, 'SQL queries run per request.'),
+    'ratiba_http_request_query_seconds': (DURATION_BUCKETS, 'Time spent in SQL queries per request.'),
+    'ratiba_http_response_size_bytes': (SIZE_BUCKETS, 'Response body size (streaming responses are not counted).'),
+}
+# name -> (label, help text); counters of things other than requests, added up like the histograms
+COUNTERS = {
+    'ratiba_object_cache_hits_total': ('cache', 'Lookups answered by a process-local object cache (base.objectcache).'),
+    'ratiba_object_cache_misses_total': ('cache', 'Lookups an object cache passed on to the database.'),
+    'ratiba_object_cache_evictions_total': ('cache', 'Entries dropped for room or age.'),
+    'ratiba_object_cache_invalidations_total': ('cache', 'Entries dropped because the row changed.'),
+}
+METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+UNMATCHED_ROUTE = '<unmatched>'  # Media, 404s and anything else no URL pattern resolved
+
+
+def new_histogram(name):
+    return [0] * (len(HISTOGRAMS[name][0]) + 2)  # A count per bucket, one for +Inf, then the sum
+
+
+def observe(histogram, bounds, value):
+    histogram[bisect.bisect_left(bounds, value)] += 1  # The first bucket whose bound is >= value
+    histogram[-1] += value
+
+
+def merge_counters(target, source):
+    for key, value in source.items():
+        target[key] = target.get(key, 0) + value
+
+
+def merge(target, source):
+    """Add the series of `source` to `target` ({labels: {histogram name: values}})."""
+    for labels, histograms in source.items():
+        existing = target.setdefault(labels, {})
+        for name, values in histograms.items():
+            if name not in existing:
+                existing[name] = list(values)
+            elif len(existing[name]) == len(values):  # Files written with other buckets are skipped
+                existing[name] = [a + b for a, b in zip(existing[name], values)]
+
+
+class Registry:
+    """The metrics of one process, written out for the other workers' scrapes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+        self.counters = {}  # (counter name, label value) -> count
+        self.pid = None
+        self.server_pid = None
+        self.filename = None
+        self.flusher = None
+
+    def start(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            # First use, or a forked child: the parent's counts and flusher thread are not ours
+            self.series = {}
+            self.counters = {}
+            self.pid, self.server_pid = os.getpid(), os.getppid()
+            self.filename = f'{self.server_pid}-{self.pid}-{uuid.uuid4().hex[:8]}.json'
+        self.flusher = threading.Thread(target=self.flush_periodically, name='metrics-flusher', daemon=True)
+        self.flusher.start()
+        atexit.register(self.flush)
+
+    def observe(self, labels, values):
+        """Record one request: `values` maps histogram names to the value observed."""
+        if self.pid != os.getpid():
+            self.start()
+        with self.lock:
+            histograms = self.series.get(labels)
+            if histograms is None:
+                histograms = self.series[labels] = {}
+            for name, value in values.items():
+                histogram = histograms.get(name)
+                if histogram is None:
+                    histogram = histograms[name] = new_histogram(name)
+                observe(histogram, HISTOGRAMS[name][0], value)
+
+    def increment(self, name, label, amount=1):
+        if self.pid != os.getpid():
+            self.start()
+        with self.lock:
+            self.counters[name, label] = self.counters.get((name, label), 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return {labels: {name: list(values) for name, values in histograms.items()}
+                    for labels, histograms in self.series.items()}
+
+    def counter_snapshot(self):
+        with self.lock:
+            return dict(self.counters)
+
+    def flush_periodically(self):
+        while True:
+            time.sleep(getattr(settings, 'METRICS_FLUSH_SECONDS', 5))
+            try:
+                self.flush()
+            except OSError:
+                pass  # A full or missing disk must not end the thread; the next flush retries
+
+    def flush(self):
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if not directory or self.pid != os.getpid():
+            return
+        os.makedirs(directory, exist_ok=True)
+        series = [[*labels, histograms] for labels, histograms in self.snapshot().items()]
+        counters = [[name, label, value] for (name, label), value in self.counter_snapshot().items()]
+        handle, temporary = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'w') as file:
+                json.dump({'series': series, 'counters': counters}, file, separators=(',', ':'))
+            os.replace(temporary, os.path.join(directory, self.filename))  # Readers see the old or the new file
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(temporary)
+            raise
+
+    def collect(self):
+        """The series and counters of every process of this server: the files of the others, our live counts."""
+        series, counters = {}, {}
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if directory and self.pid == os.getpid():
+            with contextlib.suppress(FileNotFoundError):
+                for filename in os.listdir(directory):
+                    if not filename.endswith('.json') or filename == self.filename:
+                        continue
+                    path = os.path.join(directory, filename)
+                    server_pid = filename.split('-', 1)[0]
+                    if server_pid != str(self.server_pid):
+                        remove_if_abandoned(path, server_pid)
+                        continue
+                    try:
+                        with open(path) as file:
+                            data = json.load(file)
+                    except (OSError, ValueError):
+                        continue
+                    if isinstance(data, list):
+                        data = {'series': data}  # Written before counters were added
+                    merge(series, {tuple(row[:-1]): row[-1] for row in data.get('series', [])})
+                    merge_counters(counters, {(name, label): value for name, label, value in data.get('counters', [])})
+        merge(series, self.snapshot())
+        merge_counters(counters, self.counter_snapshot())
+        return series, counters
+
+
+def remove_if_abandoned(path, server_pid):
+    # Left by a server that has exited (a restart or another deploy): its counts are history
+    try:
+        os.kill(int(server_pid), 0)
+    except ProcessLookupError:
+        with contextlib.suppress(OSError):
+            os.unlink(path)
+    except (ValueError, OSError):
+        pass  # Not ours to judge (a malformed name, or a process of another user)
+
+
+registry = Registry()
+
+
+class QueryTimer:
+    """Counts the queries of one request and adds up their duration."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+_query_timer = contextvars.ContextVar('query_timer', default=None)  # The timer of the request being handled
+
+
+def time_query(execute, sql, params, many, context):
+    """Execute wrapper of every connection: passes the query to the current request's timer.
+
+    A context variable, rather than a wrapper installed per request: under ASGI the
+    queries run on connections of other threads (sync_to_async), which carry the
+    request's context over but not the wrappers of the event loop's connection.
+    """
+    timer = _query_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    if time_query not in connection.execute_wrappers:  # Reconnections reuse the wrapper object
+        connection.execute_wrappers.append(time_query)
+
+
+class MetricsMiddleware:
+    """Records the latency, SQL queries and response size of every request in `registry`.
+
+    Put it first in MIDDLEWARE so the time of the other middleware is included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = QueryTimer()
+        token = _query_timer.set(timer)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _query_timer.reset(token)
+        self.record(request, response, time.perf_counter() - start, timer)
+        return response
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        token = _query_timer.set(timer)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_timer.reset(token)
+        self.record(request, response, time.perf_counter() - start, timer)
+        return response
+
+    def record(self, request, response, duration, timer):
+        match = getattr(request, 'resolver_match', None)
+        labels = (
+            match.route if match is not None else UNMATCHED_ROUTE,
+            request.method if request.method in METHODS else 'other',
+            str(response.status_code),
+        )
+        values = {
+            'ratiba_http_request_duration_seconds': duration,
+            'ratiba_http_request_queries': timer.count,
+            'ratiba_http_request_query_seconds': timer.seconds,
+        }
+        if not response.streaming:
+            values['ratiba_http_response_size_bytes'] = len(response.content)
+        registry.observe(labels, values)
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_number(value):
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def render(series, counters=None):
+    """The Prometheus text exposition (version 0.0.4) of merged series and counters."""
+    lines = []
+    for name, (bounds, help_text) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (route, method, status), histograms in sorted(series.items()):
+            values = histograms.get(name)
+            if values is None:
+                continue
+            labels = f'route="{escape(route)}",method="{method}",status="{status}"'
+            cumulative = 0
+            for bound, count in zip((*bounds, '+Inf'), values[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else format_number(float(bound))
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {format_number(values[-1])}')
+            lines.append(f'{name}_count{{{labels}}} {cumulative}')
+    for name, (label, help_text) in COUNTERS.items():
+        values = sorted((value, count) for (counter, value), count in (counters or {}).items() if counter == name)
+        if not values:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for value, count in values:
+            lines.append(f'{name}{{{label}="{escape(value)}"}} {format_number(count)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-19 12:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_event_geohash_event_latitude_event_longitude'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_events', to='base.event')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='base.event')),
+            ],
+            options={
+                'ordering': ['event', '-score'],
+                'indexes': [models.Index(fields=['event', '-score'], name='similar_event_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('event', 'similar'), name='unique_similar_event')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.3 on 2026-10-19 12:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0012_event_event_date_time_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['participant', 'timestamp'], name='booking_participant_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registration',
+            index=models.Index(fields=['participant', 'timestamp'], name='registration_participant_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.1.3 on 2026-10-19 12:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicate_bookings(apps, schema_editor):
+    """Keep one booking per participant and event (a confirmed one if there is one)."""
+    Booking = apps.get_model('base', 'Booking')
+    duplicates = (Booking.objects.values('event_id', 'participant_id')
+                  .annotate(total=Count('id')).filter(total__gt=1).order_by())
+    for duplicate in duplicates.iterator():
+        bookings = Booking.objects.filter(
+            event_id=duplicate['event_id'], participant_id=duplicate['participant_id']
+        ).order_by('-booked', 'id')
+        keep = bookings.first()
+        bookings.exclude(pk=keep.pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0013_booking_booking_participant_ts_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='booking',
+            name='event',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='base.event'),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='participant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='base.participant'),
+        ),
+        migrations.AlterField(
+            model_name='registration',
+            name='event',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='base.event'),
+        ),
+        migrations.AlterField(
+            model_name='registration',
+            name='participant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='base.participant'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['event', 'booked'], name='booking_event_booked_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registration',
+            index=models.Index(fields=['timestamp'], name='registration_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registration',
+            index=models.Index(fields=['event', 'status'], name='registration_event_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registration',
+            index=models.Index(condition=models.Q(('status__in', ['confirmed', 'pending', 'rsvp'])), fields=['event'], name='registration_active_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(fields=('event', 'participant'), name='unique_booking_per_participant'),
+        ),
+    ]
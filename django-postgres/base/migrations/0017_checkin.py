@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-19 13:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0016_eventtombstone_event_updated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckIn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('registration', 'Registration'), ('booking', 'Booking')], max_length=12)),
+                ('ticket_id', models.IntegerField()),
+                ('scanned_at', models.DateTimeField()),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('scanner', models.CharField(blank=True, max_length=64)),
+                ('event', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='base.event')),
+                ('participant', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='base.participant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['event', 'scanned_at'], name='checkin_event_scanned_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'ticket_id'), name='unique_checkin_per_ticket')],
+            },
+        ),
+    ]
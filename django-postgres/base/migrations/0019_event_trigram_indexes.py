@@ -0,0 +1,47 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:29
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+TRIGRAM_INDEXES = [
+    django.contrib.postgres.indexes.GinIndex(fields=['title'], name='event_title_trgm_idx', opclasses=['gin_trgm_ops']),
+    django.contrib.postgres.indexes.GinIndex(fields=['venue'], name='event_venue_trgm_idx', opclasses=['gin_trgm_ops']),
+]
+
+
+def add_trigram_indexes(apps, schema_editor):
+    """Install pg_trgm and index on it, where the server ships the extension.
+
+    Without it the indexes are skipped and the typeahead does prefix matching only.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    Event = apps.get_model('base', 'Event')
+    for index in TRIGRAM_INDEXES:
+        schema_editor.add_index(Event, index)
+
+
+def remove_trigram_indexes(apps, schema_editor):
+    for index in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(index.name)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0018_requestprofile'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_trigram_indexes, remove_trigram_indexes),
+            ],
+            state_operations=[
+                migrations.AddIndex(model_name='event', index=index) for index in TRIGRAM_INDEXES
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0021_similarity_vectors'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['booked', '-id'], name='booking_booked_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['charge', 'date', 'time'], name='event_charge_date_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0022_admin_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='checkin',
+            name='ticket_id',
+            field=models.BigIntegerField(),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0023_checkin_ticket_id_bigint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='similarityterm',
+            name='events',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
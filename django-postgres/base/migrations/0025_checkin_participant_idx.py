@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0024_similarityterm_events'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='checkin',
+            index=models.Index(fields=['participant', 'scanned_at'], name='checkin_participant_idx'),
+        ),
+    ]
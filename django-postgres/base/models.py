@@ -1,7 +1,13 @@
 # base/models.py
 
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models.functions import Now
 from django.utils import timezone
+from . import geo
 
 class Event(models.Model):
     CHARGE_CHOICES = [
@@ -17,12 +23,60 @@ class Event(models.Model):
     time = models.TimeField(default=timezone.now)  # Gets current time
     venue = models.CharField(max_length=255, blank=True)  # Replaces location
     charge = models.CharField(max_length=4, choices=CHARGE_CHOICES, default='free')  # Free or Pay option
+    latitude = models.FloatField(blank=True, null=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(blank=True, null=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)  # Grid cell used by the nearby search
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now())  # Delta sync cursor; set by save(), not by update()
+    view_count = models.PositiveBigIntegerField(default=0, db_default=0, editable=False)  # Written by base.viewcounts only
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # Keep the grid cell in step with the coordinates (bulk_create/update() bypass this)
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields) | {'updated_at'}  # Partial saves are changes too
+            if {'latitude', 'longitude'} & update_fields:
+                update_fields.add('geohash')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        # Never write view_count back: this instance's count may be older than the flushed one.
+        # Only the UPDATE leaves it out, so a save that finds no row still inserts one.
+        values = [value for value in values if value[0].name != 'view_count']
+        return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+
     class Meta:
         ordering = ['date', 'time']
+        indexes = [
+            models.Index(fields=['date', 'time'], name='event_date_time_idx'),  # Default ordering and date filters
+            models.Index(fields=['updated_at', 'id'], name='event_updated_idx'),  # Delta sync
+            models.Index(fields=['-view_count', 'id'], name='event_popular_idx'),  # ?ordering=popular
+            models.Index(fields=['charge', 'date', 'time'], name='event_charge_date_idx'),  # Admin charge filter
+            # Fuzzy typeahead (base.typeahead); only created where pg_trgm is available (see migration 0019)
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='event_title_trgm_idx'),
+            GinIndex(fields=['venue'], opclasses=['gin_trgm_ops'], name='event_venue_trgm_idx'),
+        ]
+
+
+class EventTombstone(models.Model):
+    """Marks a deleted event so delta sync can tell clients to drop it (written by base.signals)."""
+    event_id = models.IntegerField(unique=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'event_id'], name='event_tombstone_sync_idx'),
+        ]
+
+    def __str__(self):
+        return f"Event {self.event_id} deleted at {self.deleted_at}"
 
 
 class Participant(models.Model):
@@ -36,6 +90,20 @@ class Participant(models.Model):
         ordering = ['name']
 
 
+ACTIVE_REGISTRATION_STATUSES = ['confirmed', 'pending', 'rsvp']  # Everything that still holds a place
+
+
+def describe_related(instance, name):
+    """str() of a related object already loaded (select_related), else its model and id.
+
+    Used by __str__, so logging or listing rows never runs a query per row.
+    """
+    field = instance._meta.get_field(name)
+    if field.is_cached(instance):
+        return str(getattr(instance, name))
+    return f"{field.related_model.__name__} {getattr(instance, field.attname)}"
+
+
 class Registration(models.Model):
     STATUS_CHOICES = [
         ('confirmed', 'Confirmed'),
@@ -43,25 +111,172 @@ class Registration(models.Model):
         ('cancelled', 'Cancelled'),
         ('rsvp', 'RSVP'),
     ]
+    ACTIVE_STATUSES = ACTIVE_REGISTRATION_STATUSES
 
-    event = models.ForeignKey(Event, on_delete=models.CASCADE)
-    participant = models.ForeignKey(Participant, on_delete=models.CASCADE)
+    # The composite indexes below lead with these columns, so the FKs need no index of their own
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, db_index=False)
+    participant = models.ForeignKey(Participant, on_delete=models.CASCADE, db_index=False)
     timestamp = models.DateTimeField(default=timezone.now)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
 
     class Meta:
         unique_together = ('event', 'participant')
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['timestamp'], name='registration_timestamp_idx'),  # Default ordering
+            models.Index(fields=['event', 'status'], name='registration_event_status_idx'),  # Status checks per event
+            models.Index(
+                fields=['event'], name='registration_active_idx',
+                condition=models.Q(status__in=ACTIVE_REGISTRATION_STATUSES),
+            ),  # Counting the places taken at an event
+            models.Index(fields=['status', 'timestamp'], name='registration_status_ts_idx'),  # Admin status filter
+            models.Index(fields=['participant', 'timestamp'], name='registration_participant_idx'),  # A participant's registrations
+        ]
 
     def __str__(self):
-        return f"{self.participant} registered for {self.event}"
+        return f"{describe_related(self, 'participant')} registered for {describe_related(self, 'event')}"
     
 class Booking(models.Model):
-    event = models.ForeignKey(Event, on_delete=models.CASCADE)
-    participant = models.ForeignKey(Participant, on_delete=models.CASCADE)
+    # Covered by the unique (event, participant) and (participant, timestamp) indexes
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, db_index=False)
+    participant = models.ForeignKey(Participant, on_delete=models.CASCADE, db_index=False)
     timestamp = models.DateTimeField(default=timezone.now)
     booked = models.BooleanField(default=False)  # Whether the participant has booked their spot
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'participant'], name='unique_booking_per_participant'),
+        ]
+        indexes = [
+            models.Index(fields=['event', 'booked'], name='booking_event_booked_idx'),  # Confirmed bookings per event
+            models.Index(fields=['participant', 'timestamp'], name='booking_participant_ts_idx'),  # A participant's bookings
+            models.Index(fields=['booked', '-id'], name='booking_booked_idx'),  # Admin booked filter, newest first
+        ]
+
+    def __str__(self):
+        return f"{describe_related(self, 'participant')} booked for {describe_related(self, 'event')}"
+
+
+class CheckIn(models.Model):
+    """A ticket scanned at the door, uploaded in batches by scanners (see base.checkin)."""
+    REGISTRATION = 'registration'
+    BOOKING = 'booking'
+    KIND_CHOICES = [
+        (REGISTRATION, 'Registration'),
+        (BOOKING, 'Booking'),
+    ]
+
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES)
+    ticket_id = models.BigIntegerField()  # Registration or Booking id (both bigint), depending on kind
+    # Covered by the (event, scanned_at) and (participant, scanned_at) indexes
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, db_index=False)
+    participant = models.ForeignKey(Participant, on_delete=models.CASCADE, db_index=False)
+    scanned_at = models.DateTimeField()  # Scanner clock
+    received_at = models.DateTimeField(default=timezone.now)
+    scanner = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        constraints = [
+            # One check-in per ticket: repeated scans are dropped on insert
+            models.UniqueConstraint(fields=['kind', 'ticket_id'], name='unique_checkin_per_ticket'),
+        ]
+        indexes = [
+            models.Index(fields=['event', 'scanned_at'], name='checkin_event_scanned_idx'),  # Attendance per event
+            # A participant's check-ins, e.g. those deleted with the participant
+            models.Index(fields=['participant', 'scanned_at'], name='checkin_participant_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.ticket_id} checked in at {self.scanned_at}"
+
+
+class SimilarEvent(models.Model):
+    """Precomputed "similar events" for an event, filled by base.recommendations."""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='similar_events')
+    similar = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()  # Cosine similarity of the TF-IDF vectors
+
+    class Meta:
+        ordering = ['event', '-score']
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'similar'], name='unique_similar_event'),
+        ]
+        indexes = [
+            models.Index(fields=['event', '-score'], name='similar_event_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.similar_id} is similar to {self.event_id} ({self.score:.2f})"
+
+
+class SimilarityTerm(models.Model):
+    """A word of the TF-IDF vocabulary of base.recommendations, as of the last full rebuild."""
+    word = models.CharField(max_length=100, primary_key=True)
+    column = models.PositiveIntegerField(unique=True)  # Its index in the vectors
+    idf = models.FloatField()
+    events = models.PositiveIntegerField(default=0)  # Document frequency: events using the word
+
+    def __str__(self):
+        return f"{self.word} ({self.idf:.2f})"
+
+
+class EventVector(models.Model):
+    """The sparse, L2-normalised TF-IDF vector of an event's title and description."""
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    columns = ArrayField(models.PositiveIntegerField())  # SimilarityTerm columns, ascending
+    weights = ArrayField(models.FloatField())
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['columns'], name='event_vector_columns_idx'),  # Events sharing a word with another
+        ]
+
     def __str__(self):
-        return f"{self.participant} booked for {self.event}"
+        return f"Vector of event {self.event_id} ({len(self.columns)} words)"
+
+
+class SimilarityUpdate(models.Model):
+    """An event whose "similar events" wait to be refreshed by `manage.py update_similar_events`."""
+    event_id = models.BigIntegerField(primary_key=True)  # No foreign key: deleted events are queued too
+    queued_at = models.DateTimeField(default=timezone.now)
 
+    def __str__(self):
+        return f"Refresh similar events of {self.event_id}"
+
+
+class MediaBlob(models.Model):
+    """A content-addressed upload (see base.media.ContentAddressedStorage) and how many events use it."""
+    name = models.CharField(max_length=500, unique=True)  # Storage name, blobs/<2 hex>/<sha256>.<ext>
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
+
+
+class RequestProfile(models.Model):
+    """A profile of one request taken on a staff user's demand (see base.profiling)."""
+    CPROFILE = 'cprofile'
+    SAMPLE = 'sample'
+    PROFILER_CHOICES = [
+        (CPROFILE, 'Deterministic (cProfile)'),
+        (SAMPLE, 'Sampling'),
+    ]
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)  # Rate limits count recent profiles
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='+')
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)  # With the query string
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    profiler = models.CharField(max_length=8, choices=PROFILER_CHOICES)
+    query_count = models.PositiveIntegerField()
+    queries = models.JSONField(default=list)  # SQL timeline: start_ms, duration_ms, sql, many, database
+    data = models.BinaryField()  # pstats data (cprofile) or collapsed stacks (sample)
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms, {self.profiler})"
@@ -0,0 +1,156 @@
+# base/notify.py
+import json
+import logging
+import os
+import select
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_bus():
+    """The process-wide notification bus configured by NOTIFY_BUS_BACKEND."""
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            _bus = import_string(getattr(settings, 'NOTIFY_BUS_BACKEND', 'base.notify.PostgresNotifyBus'))()
+        return _bus
+
+
+def reset_bus():
+    global _bus
+    with _bus_lock:
+        if _bus is not None:
+            _bus.close()
+        _bus = None
+
+
+class InProcessBus:
+    """Delivers messages to subscribers of the same process, synchronously.
+
+    A stand-in for PostgresNotifyBus in tests and single-process development servers.
+    """
+
+    def __init__(self):
+        self.callbacks = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def subscribe(self, channel, callback):
+        with self.lock:
+            self.callbacks[channel].append(callback)
+
+    def publish(self, channel, payload):
+        with self.lock:
+            callbacks = list(self.callbacks[channel])
+        for callback in callbacks:
+            try:
+                callback(payload)
+            except Exception:
+                logger.exception('Notify callback for %s failed', channel)
+
+    def publish_many(self, channel, payloads):
+        for payload in payloads:
+            self.publish(channel, payload)
+
+    def close(self):
+        with self.lock:
+            self.callbacks.clear()
+
+
+class PostgresNotifyBus(InProcessBus):
+    """Fans messages out to every web process through Postgres LISTEN/NOTIFY.
+
+    `publish` runs `pg_notify` on the request's connection, so a message sent inside a
+    transaction is only delivered if it commits. One listener thread per process holds a
+    dedicated connection and hands incoming payloads to the local subscribers; payloads
+    are JSON and must stay under Postgres' 8000 byte limit.
+    """
+    poll_timeout = 5
+    reconnect_delay = 1
+
+    def __init__(self, using='default'):
+        super().__init__()
+        self.using = using
+        self.listening = set()
+        self.thread = None
+        self.stopped = threading.Event()
+        self.wakeup_read, self.wakeup_write = os.pipe()
+
+    def subscribe(self, channel, callback):
+        super().subscribe(channel, callback)
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.listen, name='notify-listener', daemon=True)
+                self.thread.start()
+        os.write(self.wakeup_write, b'.')  # Have the listener LISTEN on the new channel
+
+    def publish(self, channel, payload):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [channel, json.dumps(payload, separators=(',', ':'))])
+
+    def publish_many(self, channel, payloads):
+        # One statement whatever the number of messages; each is still delivered on its own
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload',
+                [channel, [json.dumps(payload, separators=(',', ':')) for payload in payloads]],
+            )
+
+    def listen(self):
+        while not self.stopped.is_set():
+            try:
+                self.listen_once()
+            except Exception:
+                logger.exception('Notify listener lost its connection, reconnecting')
+                self.stopped.wait(self.reconnect_delay)
+
+    def listen_once(self):
+        import psycopg2
+
+        connection = connections[self.using]
+        listener = psycopg2.connect(**connection.get_connection_params())
+        listener.autocommit = True
+        self.listening = set()
+        try:
+            while not self.stopped.is_set():
+                with self.lock:
+                    channels = set(self.callbacks) - self.listening
+                with listener.cursor() as cursor:
+                    for channel in channels:
+                        cursor.execute(f'LISTEN {connection.ops.quote_name(channel)}')
+                self.listening |= channels
+
+                readable, _, _ = select.select([listener, self.wakeup_read], [], [], self.poll_timeout)
+                if self.wakeup_read in readable:
+                    os.read(self.wakeup_read, 1024)
+                listener.poll()
+                while listener.notifies:
+                    notify = listener.notifies.pop(0)
+                    super().publish(notify.channel, json.loads(notify.payload))
+        finally:
+            listener.close()
+
+    def close(self):
+        self.stopped.set()
+        os.write(self.wakeup_write, b'.')
+        if self.thread is not None:
+            self.thread.join(timeout=self.poll_timeout)
+        super().close()
+        os.close(self.wakeup_read)
+        os.close(self.wakeup_write)
+
+    def wait_until_listening(self, channel, timeout=5):
+        """Block until LISTEN has run for `channel` (mainly for tests and benchmarks)."""
+        deadline = time.monotonic() + timeout
+        while channel not in self.listening and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return channel in self.listening
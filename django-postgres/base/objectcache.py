@@ -0,0 +1,214 @@
+# base/objectcache.py
+"""Process-local caches of events and participants, kept in step across workers.
+
+Events are read on every register, RSVP, image upload and detail request but rarely
+change, so each worker keeps the rows it has read: `events.get_or_404(pk)` and
+`participants.get_or_create(email, defaults)` answer from memory when they can. Each
+cache is an LRU of at most OBJECT_CACHE_SIZE rows, none older than OBJECT_CACHE_TTL
+seconds (0 turns caching off). It keeps column values, not instances: every hit is a
+new instance, built as if just read from the database, that callers may change and save.
+
+Saving or deleting a row (base.signals) drops it from this process's cache at once
+and, when the transaction commits, from every process's: a message on
+INVALIDATION_CHANNEL of the notify bus (Postgres LISTEN/NOTIFY, or InProcessBus for a
+single process). Rows changed with queryset.update() must be dropped with
+`invalidate`. Anything missed (a listener reconnecting) is stale for at most the TTL.
+
+Only rows read outside a transaction are stored: inside one they may not be committed
+yet, or may be about to change. Hits, misses, evictions and invalidations are counted
+in base.metrics.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+from django.shortcuts import get_object_or_404
+
+from . import metrics
+from .models import Event, Participant
+from .notify import get_bus
+
+INVALIDATION_CHANNEL = 'ratiba_object_cache'
+PKS_PER_MESSAGE = 500  # Keeps a message well under the 8000 byte NOTIFY payload limit
+
+_caches = {}  # name -> ObjectCache
+_subscribed = False
+_subscribe_lock = threading.Lock()
+
+
+class ObjectCache:
+    """Rows of `model` by `field`, least recently used first."""
+
+    def __init__(self, name, model, field='pk'):
+        self.name = name
+        self.model = model
+        self.field = field
+        self.key_field = model._meta.pk if field == 'pk' else model._meta.get_field(field)
+        self.entries = OrderedDict()  # key -> (expires at, pk, database, column values)
+        self.attnames = [field.attname for field in model._meta.concrete_fields]
+        self.keys = {}  # pk -> key, so rows cached by another field can be dropped by pk
+        self.generation = 0  # Bumped by every invalidation (see store)
+        self.lock = threading.Lock()
+        _caches[name] = self
+
+    def normalize(self, key):
+        # URL kwargs are ints, request bodies may hold "12"; both must find the same entry
+        try:
+            return self.key_field.to_python(key)
+        except ValidationError:
+            return key  # Left for the database lookup to reject as before
+
+    def lookup(self, key):
+        """A new instance of the cached row, or None."""
+        if getattr(settings, 'OBJECT_CACHE_TTL', 0) <= 0:
+            return None
+        entry, expired = None, False
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self.entries.move_to_end(key)
+                else:
+                    del self.entries[key]
+                    self.keys.pop(entry[1], None)
+                    entry, expired = None, True
+        if expired:
+            metrics.registry.increment('ratiba_object_cache_evictions_total', self.name)
+        if entry is None:
+            metrics.registry.increment('ratiba_object_cache_misses_total', self.name)
+            return None
+        metrics.registry.increment('ratiba_object_cache_hits_total', self.name)
+        _, _, database, values = entry
+        return self.model.from_db(database, self.attnames, values)  # Sends post_init like a query would
+
+    def store(self, instance, generation, using=None):
+        """Keep `instance`, read when the cache was at `generation`.
+
+        Skipped if anything was invalidated since: the row may have changed after it
+        was read, and storing it now would bring the old version back.
+        """
+        ttl = getattr(settings, 'OBJECT_CACHE_TTL', 0)
+        if ttl <= 0 or transaction.get_connection(using).in_atomic_block:
+            return
+        subscribe()
+        key = getattr(instance, self.field)
+        # Raw values: a file field's FieldFile points back at the instance it was read from
+        values = [getattr(value, 'name', value) if isinstance(value, FieldFile) else value
+                  for value in (getattr(instance, attname) for attname in self.attnames)]
+        evicted = 0
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[key] = (time.monotonic() + ttl, instance.pk, instance._state.db, tuple(values))
+            self.entries.move_to_end(key)
+            self.keys[instance.pk] = key
+            while len(self.entries) > getattr(settings, 'OBJECT_CACHE_SIZE', 10_000):
+                _, (_, oldest, _, _) = self.entries.popitem(last=False)
+                self.keys.pop(oldest, None)
+                evicted += 1
+        if evicted:
+            metrics.registry.increment('ratiba_object_cache_evictions_total', self.name, evicted)
+
+    def get_or_404(self, key):
+        key = self.normalize(key)
+        instance = self.lookup(key)
+        if instance is None:
+            generation = self.generation
+            instance = get_object_or_404(self.model, **{self.field: key})
+            self.store(instance, generation)
+        return instance
+
+    def get_or_create(self, key, defaults=None):
+        key = self.normalize(key)
+        instance = self.lookup(key)
+        if instance is not None:
+            return instance, False
+        generation = self.generation
+        instance, created = self.model.objects.get_or_create(defaults=defaults, **{self.field: key})
+        self.store(instance, generation)
+        return instance, created
+
+    def discard(self, pks):
+        dropped = 0
+        with self.lock:
+            self.generation += 1
+            for pk in pks:
+                key = self.keys.pop(pk, None)
+                if key is not None and self.entries.pop(key, None) is not None:
+                    dropped += 1
+        if dropped:
+            metrics.registry.increment('ratiba_object_cache_invalidations_total', self.name, dropped)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.keys.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+events = ObjectCache('event', Event)
+participants = ObjectCache('participant', Participant, field='email')
+CACHES_BY_MODEL = {Event: events, Participant: participants}
+
+
+def dispatch(payload):
+    cache = _caches.get(payload.get('cache'))
+    if cache is not None:
+        cache.discard(payload.get('pks', []))
+
+
+def subscribe():
+    """Listen for other processes' invalidations; done before this process stores anything."""
+    global _subscribed
+    if _subscribed:
+        return
+    with _subscribe_lock:
+        if not _subscribed:
+            get_bus().subscribe(INVALIDATION_CHANNEL, dispatch)
+            _subscribed = True
+
+
+class PendingInvalidations:
+    """Rows changed on a connection; each run announces and forgets them."""
+
+    def __init__(self):
+        self.pks = {}  # cache name -> pks
+
+    def __call__(self):
+        pending, self.pks = self.pks, {}
+        messages = []
+        for name, pks in pending.items():
+            pks = sorted(pks)
+            messages += [{'cache': name, 'pks': pks[start:start + PKS_PER_MESSAGE]}
+                         for start in range(0, len(pks), PKS_PER_MESSAGE)]
+        if messages:
+            get_bus().publish_many(INVALIDATION_CHANNEL, messages)
+
+
+def invalidate(model, pks, using=None):
+    """Drop rows of `model` here now, and in every process once the transaction commits."""
+    cache = CACHES_BY_MODEL[model]
+    cache.discard(pks)
+    connection = transaction.get_connection(using)
+    pending = getattr(connection, 'pending_cache_invalidations', None)
+    if pending is None:
+        pending = connection.pending_cache_invalidations = PendingInvalidations()
+    pending.pks.setdefault(cache.name, set()).update(pks)
+    # As in live.announce_counts: a call per change, the first to run on commit announces all
+    transaction.on_commit(pending, using)
+
+
+def reset():
+    """Empty every cache and forget the bus subscription (tests, benchmarks)."""
+    global _subscribed
+    for cache in _caches.values():
+        cache.clear()
+    with _subscribe_lock:
+        _subscribed = False
@@ -1,7 +1,195 @@
+import json
+
+from django.core.paginator import EmptyPage, InvalidPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+COUNT_EXACT = 'exact'
+COUNT_AUTO = 'auto'  # Exact below the threshold, planner estimate above it
+COUNT_NONE = 'none'
+COUNT_MODES = (COUNT_EXACT, COUNT_AUTO, COUNT_NONE)
+
+
+def table_row_estimate(model, using='default'):
+    """Row count of a model's table according to the Postgres statistics (pg_class.reltuples).
+
+    Returns None on other databases, or when the table has never been analysed.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+def query_row_estimate(queryset):
+    """Number of rows the Postgres planner expects a queryset to return, or None elsewhere."""
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    if not queryset.query.where:
+        return table_row_estimate(queryset.model, queryset.db)
+    if not queryset.query.is_sliced:
+        queryset = queryset.order_by()
+    plan = json.loads(queryset.explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def bounded_count(queryset, limit):
+    """COUNT(*) of a queryset that stops after `limit` rows: SELECT count(*) FROM (... LIMIT limit)."""
+    if not queryset.query.is_sliced:
+        queryset = queryset.order_by()  # The order does not change the count
+    return queryset[:limit].count()
+
+
+class LookaheadPage(Page):
+    """Page whose `has_next` comes from fetching one extra row rather than from the count."""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class EstimatedCountPaginator(Paginator):
+    """Django paginator that avoids COUNT(*) on large result sets.
+
+    In the default `auto` mode rows are counted up to one past `estimate_threshold`, which
+    bounds the cost of the COUNT(*); only result sets larger than that get the planner's
+    row estimate instead. An unfiltered table already estimated above the threshold in the
+    Postgres statistics is not counted at all. In `none` mode nothing is counted.
+    Whenever the count is not exact, pages are fetched with one row of lookahead so the
+    next/last page logic stays correct even if the estimate is off.
+    """
+    estimate_threshold = 100_000
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True,
+                 count_mode=COUNT_AUTO, estimate_threshold=None):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.count_mode = count_mode
+        if estimate_threshold is not None:
+            self.estimate_threshold = estimate_threshold
+        self.count_is_exact = True
+
+    @cached_property
+    def count(self):
+        if self.count_mode == COUNT_NONE:
+            self.count_is_exact = False
+            return None
+        if self.count_mode == COUNT_AUTO and hasattr(self.object_list, 'query'):
+            queryset = self.object_list
+            if not queryset.query.where:
+                estimate = table_row_estimate(queryset.model, queryset.db)  # A catalog lookup, no scan
+                if estimate is not None and estimate > self.estimate_threshold:
+                    self.count_is_exact = False
+                    return estimate
+            count = bounded_count(queryset, self.estimate_threshold + 1)
+            if count <= self.estimate_threshold:
+                return count
+            self.count_is_exact = False
+            return max(query_row_estimate(queryset) or 0, count)
+        return super().count
+
+    def validate_number(self, number):
+        if self.count is not None and self.count_is_exact:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.count is not None and self.count_is_exact:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('That page contains no results')
+        return LookaheadPage(rows[:self.per_page], number, self, has_next=len(rows) > self.per_page)
+
 
 class CustomPageNumberPagination(pagination.PageNumberPagination):
-    page_size=10
-    page_size_query_param='count'
-    max_page_size=50
-    page_query_param= 'p'
\ No newline at end of file
+    """Default API pagination: page numbers, with the total count made cheap on large tables.
+
+    `?count=exact|auto|none` picks how the total is worked out (default `auto`). The
+    response says whether `count` is exact; it is null when counting was skipped.
+    """
+    django_paginator_class = EstimatedCountPaginator
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+    count_query_param = 'count'
+    count_mode = COUNT_AUTO
+    estimate_threshold = 100_000
+
+    def get_count_mode(self, request):
+        mode = request.query_params.get(self.count_query_param, self.count_mode)
+        return mode if mode in COUNT_MODES else self.count_mode
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(
+            queryset, page_size,
+            count_mode=self.get_count_mode(request),
+            estimate_threshold=self.estimate_threshold,
+        )
+        page_number = self.get_page_number(request, paginator)
+
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+
+        if paginator.count is not None and paginator.num_pages > 1 and self.template is not None:
+            # The browsable API should display pagination controls.
+            self.display_page_controls = True
+
+        return list(self.page)
+
+    def get_page_number(self, request, paginator):
+        page_number = request.query_params.get(self.page_query_param) or 1
+        if page_number in self.last_page_strings and paginator.count is not None and paginator.count_is_exact:
+            page_number = paginator.num_pages
+        return page_number
+
+    def get_paginated_response(self, data):
+        paginator = self.page.paginator
+        return Response({
+            'count': paginator.count,
+            'count_is_exact': paginator.count_is_exact,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count']['nullable'] = True
+        response_schema['properties']['count_is_exact'] = {'type': 'boolean', 'example': True}
+        return response_schema
+
+
+class TimestampCursorPagination(pagination.CursorPagination):
+    """Cursor pagination over `timestamp`, newest first.
+
+    Pairs with (<filter column>, timestamp) indexes so every page is an index range scan,
+    however deep the client scrolls.
+    """
+    ordering = '-timestamp'
+    page_size_query_param = 'page_size'
+    max_page_size = 50
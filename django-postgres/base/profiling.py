@@ -0,0 +1,216 @@
+# base/profiling.py
+"""Profiles of single requests, taken on demand by staff.
+
+A staff user sends `X-Profile: cprofile` (or `?profile=cprofile`) with a request, or
+`sample` for the sampling profiler. ProfilingMiddleware runs that one request under the
+profiler, records every SQL query it ran with its offset and duration, and stores both
+as a RequestProfile; the X-Profile-Id and X-Profile-Url response headers point to it.
+
+The flag is ignored for everyone else. Staff requests over PROFILING_RATE_LIMIT or
+PROFILING_GLOBAL_RATE_LIMIT, or arriving while this process is already profiling one,
+are served normally with an `X-Profile: rate-limited` or `X-Profile: busy` header.
+
+- cprofile: deterministic, every call is timed (and slowed down); the file is pstats
+  data for `python -m pstats` or snakeviz.
+- sample: the request thread's stack is read every PROFILING_SAMPLE_INTERVAL seconds,
+  so hot code is barely slowed; the file holds collapsed stacks for flamegraph.pl or
+  speedscope.
+
+Only the work done before the response is returned is profiled, not the body of a
+streaming response.
+"""
+import contextlib
+import cProfile
+import marshal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import RequestProfile
+
+HEADER = 'X-Profile'
+QUERY_PARAMETER = 'profile'
+
+_busy = threading.Lock()  # One profile per process at a time: cProfile cannot run twice at once
+
+
+class DeterministicProfiler:
+    name = RequestProfile.CPROFILE
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def dump(self):
+        self.profiler.create_stats()
+        return marshal.dumps(self.profiler.stats)  # What Profile.dump_stats() writes
+
+
+class SamplingProfiler:
+    name = RequestProfile.SAMPLE
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.thread_id = threading.get_ident()  # The request thread
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.sampler = None
+
+    def start(self):
+        self.sampler = threading.Thread(target=self.run, name='request-profiler', daemon=True)
+        self.sampler.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                names.append(f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.sampler.join()
+
+    def dump(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common()).encode()
+
+
+class SqlTimeline:
+    """A `connection.execute_wrapper` noting when each query started and how long it took."""
+
+    def __init__(self, start, limit=1000):
+        self.start = start
+        self.limit = limit
+        self.queries = []
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            if len(self.queries) < self.limit:
+                # Parameters are left out: they can hold personal data and tokens
+                self.queries.append({
+                    'start_ms': round((started - self.start) * 1000, 3),
+                    'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+                    'sql': sql,
+                    'many': many,
+                    'database': context['connection'].alias,
+                })
+
+
+def requested_profiler(request):
+    value = request.headers.get(HEADER) or request.GET.get(QUERY_PARAMETER)
+    return value if value in (RequestProfile.CPROFILE, RequestProfile.SAMPLE) else None
+
+
+def rate_limited(user):
+    """Whether `user` (or all staff together) used up the profiles of the current window."""
+    now = timezone.now()
+    for limit, window, filters in (
+        (*settings.PROFILING_RATE_LIMIT, {'user': user}),
+        (*settings.PROFILING_GLOBAL_RATE_LIMIT, {}),
+    ):
+        since = now - timedelta(seconds=window)
+        if RequestProfile.objects.filter(created_at__gte=since, **filters).count() >= limit:
+            return True
+    return False
+
+
+def prune():
+    keep = settings.PROFILING_KEEP
+    oldest_kept = RequestProfile.objects.order_by('-id').values_list('id', flat=True)[keep - 1:keep].first()
+    if oldest_kept is not None:
+        RequestProfile.objects.filter(id__lt=oldest_kept).delete()
+
+
+class ProfilingMiddleware:
+    """Profiles the requests staff ask for (see the module docstring).
+
+    Goes after the authentication middleware, which set `request.user`. In an async
+    chain a request asking for a profile is handled in a thread of its own, which also
+    runs the view's synchronous code, so that is the thread profiled.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.handle(request, self.get_response)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'PROFILING_ENABLED', False) or requested_profiler(request) is None:
+            return await self.get_response(request)
+        return await sync_to_async(self.handle)(request, async_to_sync(self.get_response))
+
+    def handle(self, request, get_response):
+        mode = requested_profiler(request) if getattr(settings, 'PROFILING_ENABLED', False) else None
+        if mode is None:
+            return get_response(request)
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated or not user.is_staff:
+            return get_response(request)
+
+        if rate_limited(user):
+            refusal = 'rate-limited'
+        elif not _busy.acquire(blocking=False):
+            refusal = 'busy'
+        else:
+            try:
+                return self.profile(request, mode, user, get_response)
+            finally:
+                _busy.release()
+        response = get_response(request)
+        response[HEADER] = refusal
+        return response
+
+    def profile(self, request, mode, user, get_response):
+        if mode == RequestProfile.SAMPLE:
+            profiler = SamplingProfiler(settings.PROFILING_SAMPLE_INTERVAL)
+        else:
+            profiler = DeterministicProfiler()
+        start = time.perf_counter()
+        timeline = SqlTimeline(start)
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timeline))
+            profiler.start()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.stop()
+        duration = time.perf_counter() - start
+
+        profile = RequestProfile.objects.create(
+            user=user, method=request.method, path=request.get_full_path()[:2000],
+            status_code=response.status_code, duration_ms=duration * 1000, profiler=profiler.name,
+            query_count=timeline.count, queries=timeline.queries, data=profiler.dump(),
+        )
+        prune()
+        response[f'{HEADER}-Id'] = str(profile.id)
+        response[f'{HEADER}-Url'] = reverse('request-profile-detail', args=[profile.id])
+        return response
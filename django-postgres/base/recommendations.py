@@ -0,0 +1,338 @@
+# base/recommendations.py
+"""Precomputed "similar events" (SimilarEvent), by cosine similarity of TF-IDF vectors.
+
+`manage.py build_similar_events` (rebuild_all) fits the vocabulary and IDF on every
+event, stores them (SimilarityTerm) with each event's sparse vector (EventVector), and
+recomputes every list. Saving an event whose title or description changed only queues
+it (SimilarityUpdate); the `update_similar_events` worker then vectorises it with the
+stored vocabulary and scores it against the stored vectors of the events sharing one
+of its words, found through the GIN index on EventVector.columns. Lists the event left
+are refilled. Words new since the last rebuild are ignored until the next one.
+
+So that one update stays cheap however many events there are, candidates are only
+looked up by the event's words used by at most SIMILAR_EVENTS_MAX_TERM_EVENTS events
+(by its rarest word if it has no such word), and at most SIMILAR_EVENTS_MAX_CANDIDATES
+of them are scored. Events sharing nothing but common words score low anyway; the
+next rebuild, which scores every pair, still finds them.
+"""
+import math
+import re
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Event, EventVector, SimilarEvent, SimilarityTerm, SimilarityUpdate
+
+TOKEN_RE = re.compile(r'[a-z0-9]{2,}')
+STOP_WORDS = frozenset("""
+    a an and are as at be by for from has have in is it its of on or that the this to was were will with
+    you your we our us all can join come event events
+""".split())
+TITLE_WEIGHT = 2  # Title words count twice as much as description words
+
+
+def get_k():
+    return getattr(settings, 'SIMILAR_EVENTS_K', 10)
+
+
+def get_max_features():
+    return getattr(settings, 'SIMILAR_EVENTS_MAX_FEATURES', 5000)
+
+
+def get_max_term_events():
+    return getattr(settings, 'SIMILAR_EVENTS_MAX_TERM_EVENTS', 1000)
+
+
+def get_max_candidates():
+    return getattr(settings, 'SIMILAR_EVENTS_MAX_CANDIDATES', 5000)
+
+
+def tokenize(title, description):
+    text = f'{title} ' * TITLE_WEIGHT + (description or '')
+    words = TOKEN_RE.findall(text.lower())
+    return [word for word in words if word not in STOP_WORDS]
+
+
+class TfidfModel:
+    """A vocabulary (word -> column) with the IDF and document frequency of each column."""
+
+    def __init__(self, vocabulary, idf, document_frequency):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.document_frequency = document_frequency
+
+    @classmethod
+    def fit(cls, documents, max_features):
+        document_frequency = Counter()
+        for tokens in documents:
+            document_frequency.update(set(tokens))
+
+        # Words used by a single event cannot make two events similar, so leave them out
+        shared = [(df, word) for word, df in document_frequency.items() if df > 1]
+        shared.sort(reverse=True)
+        vocabulary = {word: index for index, (_, word) in enumerate(shared[:max_features])}
+
+        n_docs = len(documents)
+        idf = np.zeros(len(vocabulary), dtype=np.float32)
+        frequencies = np.zeros(len(vocabulary), dtype=np.int64)
+        for word, index in vocabulary.items():
+            idf[index] = math.log((1 + n_docs) / (1 + document_frequency[word])) + 1
+            frequencies[index] = document_frequency[word]
+        return cls(vocabulary, idf, frequencies)
+
+    @classmethod
+    def load(cls):
+        """The stored model, or None before the first rebuild."""
+        terms = list(SimilarityTerm.objects.values_list('word', 'column', 'idf', 'events'))
+        if not terms:
+            return None
+        idf = np.zeros(len(terms), dtype=np.float32)
+        frequencies = np.zeros(len(terms), dtype=np.int64)
+        for _, column, value, events in terms:
+            idf[column] = value
+            frequencies[column] = events
+        return cls({word: column for word, column, _, _ in terms}, idf, frequencies)
+
+    def save(self):
+        SimilarityTerm.objects.all().delete()
+        SimilarityTerm.objects.bulk_create(
+            (SimilarityTerm(word=word, column=column, idf=float(self.idf[column]), events=int(self.document_frequency[column]))
+             for word, column in self.vocabulary.items()),
+            batch_size=5000,
+        )
+
+    def vectorize(self, tokens):
+        """(columns, weights) of a document: ascending columns, L2-normalised weights."""
+        counts = Counter(token for token in tokens if token in self.vocabulary)
+        columns = np.array(sorted(self.vocabulary[word] for word in counts), dtype=np.int64)
+        by_column = {self.vocabulary[word]: count for word, count in counts.items()}
+        weights = np.array([1 + math.log(by_column[column]) for column in columns], dtype=np.float32)  # Sublinear tf
+        weights *= self.idf[columns]
+        norm = np.linalg.norm(weights)
+        if norm:
+            weights /= norm
+        return columns, weights
+
+
+class Corpus:
+    """The vectors of many events, as CSR arrays plus the transposed (per word) postings."""
+
+    def __init__(self, event_ids, vectors, n_features):
+        self.event_ids = np.asarray(event_ids, dtype=np.int64)
+        lengths = np.array([len(columns) for columns, _ in vectors], dtype=np.int64)
+        self.indptr = np.concatenate([[0], np.cumsum(lengths)])
+        self.indices = np.concatenate([columns for columns, _ in vectors] or [[]]).astype(np.int64)
+        self.data = np.concatenate([weights for _, weights in vectors] or [[]]).astype(np.float32)
+
+        order = np.argsort(self.indices, kind='stable')
+        self.posting_rows = np.repeat(np.arange(len(vectors)), lengths)[order]
+        self.posting_data = self.data[order]
+        self.posting_ptr = np.concatenate([[0], np.cumsum(np.bincount(self.indices, minlength=n_features))])
+
+    def scores(self, row):
+        """(rows, scores) of the other rows sharing a word with `row`."""
+        start, end = self.indptr[row], self.indptr[row + 1]
+        rows, products = [], []
+        for column, weight in zip(self.indices[start:end], self.data[start:end]):
+            first, last = self.posting_ptr[column], self.posting_ptr[column + 1]
+            rows.append(self.posting_rows[first:last])
+            products.append(self.posting_data[first:last] * weight)
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        others, position = np.unique(np.concatenate(rows), return_inverse=True)
+        totals = np.bincount(position, weights=np.concatenate(products))
+        keep = others != row  # An event is not similar to itself
+        return others[keep], totals[keep]
+
+
+def best(candidates, scores, k):
+    """The k best positive (candidate, score) pairs, best first, ties by candidate."""
+    keep = scores > 0
+    candidates, scores = candidates[keep], scores[keep]
+    if len(scores) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+        candidates, scores = candidates[top], scores[top]
+    order = np.lexsort((candidates, -scores))
+    return [(int(candidates[i]), float(scores[i])) for i in order]
+
+
+def documents_from_database():
+    rows = Event.objects.order_by('id').values_list('id', 'title', 'description')
+    event_ids, documents = [], []
+    for event_id, title, description in rows.iterator(chunk_size=2000):
+        event_ids.append(event_id)
+        documents.append(tokenize(title, description))
+    return event_ids, documents
+
+
+def rebuild_all(k=None):
+    """Fit the model on every event, store it with the vectors, and replace every list."""
+    k = k or get_k()
+    event_ids, documents = documents_from_database()
+    model = TfidfModel.fit(documents, get_max_features())
+    vectors = [model.vectorize(tokens) for tokens in documents]
+    corpus = Corpus(event_ids, vectors, len(model.vocabulary))
+    with transaction.atomic():
+        model.save()
+        EventVector.objects.all().delete()
+        EventVector.objects.bulk_create(
+            (EventVector(event_id=event_id, columns=columns.tolist(), weights=weights.tolist())
+             for event_id, (columns, weights) in zip(event_ids, vectors) if len(columns)),
+            batch_size=5000,
+        )
+        SimilarEvent.objects.all().delete()
+        batch = []
+        for row, event_id in enumerate(event_ids):
+            others, scores = corpus.scores(row)
+            batch.extend(
+                SimilarEvent(event_id=event_id, similar_id=int(corpus.event_ids[other]), score=score)
+                for other, score in best(others, scores, k)
+            )
+            if len(batch) >= 5000:
+                SimilarEvent.objects.bulk_create(batch)
+                batch = []
+        SimilarEvent.objects.bulk_create(batch)
+    return len(event_ids)
+
+
+def lookup_columns(columns, model):
+    """The columns of a vector to look candidates up by: its words used by few enough events."""
+    frequencies = model.document_frequency[columns]
+    rare = columns[frequencies <= get_max_term_events()]
+    if not len(rare) and len(columns):
+        rare = columns[np.argmin(frequencies)][None]  # Only common words: the least common of them
+    return rare
+
+
+def stored_scores(columns, weights, exclude, model):
+    """(event ids, scores) of the stored vectors sharing one of the vector's less common words."""
+    rows = (EventVector.objects.filter(columns__overlap=lookup_columns(columns, model).tolist())
+            .exclude(event_id=exclude).values_list('event_id', 'columns', 'weights')[:get_max_candidates()])
+    event_ids, other_columns, other_weights, lengths = [], [], [], []
+    for event_id, candidate_columns, candidate_weights in rows.iterator(chunk_size=2000):
+        event_ids.append(event_id)
+        other_columns.extend(candidate_columns)
+        other_weights.extend(candidate_weights)
+        lengths.append(len(candidate_columns))
+    if not event_ids:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    query = np.zeros(len(model.vocabulary), dtype=np.float32)
+    query[columns] = weights
+    products = query[np.array(other_columns, dtype=np.int64)] * np.array(other_weights, dtype=np.float32)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    return np.array(event_ids, dtype=np.int64), np.add.reduceat(products, starts).astype(np.float32)
+
+
+def replace_list(event_id, neighbours):
+    SimilarEvent.objects.filter(event_id=event_id).delete()
+    SimilarEvent.objects.bulk_create(
+        SimilarEvent(event_id=event_id, similar_id=other_id, score=score) for other_id, score in neighbours
+    )
+
+
+def refill(event_ids, model, k):
+    """Recompute the lists of events from their stored vectors."""
+    if not event_ids:
+        return
+    for event_id, columns, weights in EventVector.objects.filter(event_id__in=event_ids).values_list('event_id', 'columns', 'weights'):
+        vector = np.array(columns, dtype=np.int64), np.array(weights, dtype=np.float32)
+        replace_list(event_id, best(*stored_scores(*vector, event_id, model), k))
+    # Events without a vector share no word with anything
+    SimilarEvent.objects.filter(event_id__in=event_ids).exclude(event_id__in=EventVector.objects.values('event_id')).delete()
+
+
+def update_event(event_id, model, k=None):
+    """Refresh the neighbours of one created, edited or deleted event.
+
+    The event's own list is recomputed; it is offered to the lists of the events it
+    scores against, and the lists it drops out of are refilled.
+    """
+    k = k or get_k()
+    listed_by = set(SimilarEvent.objects.filter(similar_id=event_id).values_list('event_id', flat=True))
+    row = Event.objects.filter(pk=event_id).values_list('title', 'description').first()
+    with transaction.atomic():
+        SimilarEvent.objects.filter(Q(event_id=event_id) | Q(similar_id=event_id)).delete()
+        columns, weights = model.vectorize(tokenize(*row)) if row else (np.zeros(0, dtype=np.int64), None)
+        if not len(columns):
+            EventVector.objects.filter(event_id=event_id).delete()
+            refill(listed_by, model, k)
+            return
+        EventVector.objects.update_or_create(event_id=event_id, defaults={'columns': columns.tolist(), 'weights': weights.tolist()})
+        candidates, scores = stored_scores(columns, weights, event_id, model)
+        replace_list(event_id, best(candidates, scores, k))
+
+        # Offer this event to every other event it scores against, keeping their top k
+        candidates = {int(other_id): float(score) for other_id, score in zip(candidates, scores) if score > 0}
+        current = {}
+        for other_id, score in SimilarEvent.objects.filter(event_id__in=candidates).values_list('event_id', 'score'):
+            current.setdefault(other_id, []).append(score)
+        additions = []
+        for other_id, score in candidates.items():
+            other_scores = current.get(other_id, [])
+            if len(other_scores) < k or score > min(other_scores):
+                additions.append(SimilarEvent(event_id=other_id, similar_id=event_id, score=score))
+        SimilarEvent.objects.bulk_create(additions)
+        trim_to_k([addition.event_id for addition in additions], k)
+
+        # Lists this event no longer makes it into would otherwise stay one short
+        refill(listed_by - {addition.event_id for addition in additions}, model, k)
+
+
+def trim_to_k(event_ids, k):
+    """Drop anything past the k best neighbours of the given events."""
+    if not event_ids:
+        return
+    stale = []
+    rows = SimilarEvent.objects.filter(event_id__in=event_ids).order_by('event_id', '-score', 'similar_id')
+    seen = Counter()
+    for pk, other_id in rows.values_list('pk', 'event_id'):
+        seen[other_id] += 1
+        if seen[other_id] > k:
+            stale.append(pk)
+    SimilarEvent.objects.filter(pk__in=stale).delete()
+
+
+def enqueue(event_ids):
+    """Queue events for `process_queue`; part of the caller's transaction."""
+    SimilarityUpdate.objects.bulk_create((SimilarityUpdate(event_id=event_id) for event_id in event_ids), ignore_conflicts=True)
+
+
+def enqueue_listing(event_id):
+    """Queue the events whose lists include an event, in one INSERT ... SELECT."""
+    queue, similar = SimilarityUpdate._meta.db_table, SimilarEvent._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {queue} (event_id, queued_at) SELECT event_id, %s FROM {similar} WHERE similar_id = %s '
+            f'ON CONFLICT DO NOTHING',
+            [timezone.now(), event_id],
+        )
+
+
+def process_queue(batch_size=100, k=None):
+    """Refresh the neighbours of the queued events; returns how many were refreshed."""
+    processed = 0
+    model = TfidfModel.load()
+    while True:
+        # Claimed and committed first, so saves meanwhile queue their event again
+        with transaction.atomic():
+            claimed = list(SimilarityUpdate.objects.select_for_update(skip_locked=True)
+                           .order_by('queued_at').values_list('event_id', flat=True)[:batch_size])
+            SimilarityUpdate.objects.filter(event_id__in=claimed).delete()
+        if not claimed:
+            return processed
+        if model is None:  # Nothing fitted yet: fit on everything instead
+            rebuild_all(k)
+            model = TfidfModel.load()
+            processed += len(claimed)
+            continue
+        try:
+            for event_id in claimed:
+                update_event(event_id, model, k)
+                processed += 1
+        except Exception:
+            enqueue(claimed)
+            raise
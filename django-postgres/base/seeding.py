@@ -0,0 +1,254 @@
+# base/seeding.py
+"""Deterministic synthetic data for benchmarks (see the seed_synthetic_data command).
+
+The same seed and options always produce the same rows. Event popularity follows a
+Zipf-like law, so a few events take most registrations and the rest have a long thin
+tail. Event dates are spread over a window around today, and registration statuses
+are drawn from a configurable mix.
+
+Rows are produced by generators and streamed into PostgreSQL with COPY, so memory stays
+flat however many millions are loaded. Other databases get bulk_create in batches.
+Neither path sends signals: similar events and live counts are not computed.
+"""
+import itertools
+import math
+import random
+import time
+from datetime import datetime, time as time_of_day, timedelta
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import geo
+from .models import Booking, Event, Participant, Registration
+
+DEFAULT_STATUSES = {'confirmed': 0.6, 'pending': 0.15, 'rsvp': 0.15, 'cancelled': 0.1}
+
+# Where in-person events take place: (city, latitude, longitude)
+CITIES = [
+    ('Nairobi', -1.2864, 36.8172), ('Mombasa', -4.0435, 39.6682), ('Kisumu', -0.0917, 34.7680),
+    ('Nakuru', -0.3031, 36.0800), ('Eldoret', 0.5143, 35.2698), ('Nyeri', -0.4201, 36.9476),
+]
+CITY_WEIGHTS = [50, 15, 10, 10, 10, 5]
+VENUES = ['Hall', 'Gardens', 'Arena', 'Conference Centre', 'Library', 'Stadium', 'Hub', 'Theatre']
+TOPICS = ['Python', 'Jazz', 'Startup', 'Photography', 'Marathon', 'Film', 'Data', 'Poetry', 'Chess', 'Food']
+KINDS = ['Meetup', 'Workshop', 'Festival', 'Conference', 'Night', 'Summit', 'Clinic', 'Showcase']
+FIRST_NAMES = ['Amina', 'Brian', 'Cynthia', 'David', 'Esther', 'Felix', 'Grace', 'Hassan', 'Irene', 'James',
+               'Kevin', 'Lucy', 'Mercy', 'Njeri', 'Otieno', 'Peter', 'Wanjiru', 'Zawadi']
+LAST_NAMES = ['Achieng', 'Kamau', 'Mutua', 'Odhiambo', 'Wafula', 'Kiprop', 'Njoroge', 'Omondi', 'Chebet', 'Mwangi']
+
+
+def parse_weights(value):
+    """'confirmed=0.6,pending=0.4' -> {'confirmed': 0.6, 'pending': 0.4}"""
+    weights = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+def popularity_counts(rng, events, total, skew, cap):
+    """How many rows each of `events` events gets, about `total` in all.
+
+    The k-th most popular event is weighted 1/k**skew; which event is k-th is shuffled so
+    popularity does not follow the ids. No event gets more than `cap` (one row per
+    participant): what the head cannot take is spread over the others.
+    """
+    ranks = list(range(1, events + 1))
+    rng.shuffle(ranks)
+    weights = [1 / rank ** skew for rank in ranks]
+    total = min(total, cap * events)
+    capped = set()
+    while True:
+        open_weight = sum(weight for index, weight in enumerate(weights) if index not in capped)
+        scale = (total - cap * len(capped)) / open_weight if open_weight else 0
+        full = {index for index, weight in enumerate(weights) if index not in capped and weight * scale > cap}
+        if not full:
+            break
+        capped |= full
+    counts = []
+    for index, weight in enumerate(weights):
+        expected = cap if index in capped else weight * scale
+        whole = math.floor(expected)
+        counts.append(min(cap, whole + (rng.random() < expected - whole)))  # Rounded at random, so totals add up
+    return counts
+
+
+class Seeder:
+    """Generates the rows of each table; ids of rows already loaded are passed back in."""
+
+    def __init__(self, seed=0, days_past=365, days_ahead=180, online_share=0.1, paid_share=0.3,
+                 statuses=None, skew=1.1, booking_rate=0.3, booked_share=0.8, today=None):
+        self.seed = seed
+        self.days_past = days_past
+        self.days_ahead = days_ahead
+        self.online_share = online_share
+        self.paid_share = paid_share
+        self.statuses = statuses or DEFAULT_STATUSES
+        self.skew = skew
+        self.booking_rate = booking_rate
+        self.booked_share = booked_share
+        self.today = today or timezone.localdate()  # Dates are relative to it
+        self.tz = timezone.get_current_timezone()
+        self.event_starts = []
+
+    def rng(self, table):
+        return random.Random(f'{self.seed}:{table}')  # One stream per table: changing one count leaves the others alone
+
+    def events(self, count):
+        """Rows for base_event, as (title, description, date, time, venue, charge, latitude, longitude, geohash)."""
+        rng = self.rng('events')
+        self.event_starts = []
+        for index in range(count):
+            day = self.today + timedelta(days=rng.randint(-self.days_past, self.days_ahead))
+            start = time_of_day(rng.randint(8, 21), rng.choice((0, 30)))
+            self.event_starts.append(datetime.combine(day, start, tzinfo=self.tz))
+            topic, kind = rng.choice(TOPICS), rng.choice(KINDS)
+            if rng.random() < self.online_share:
+                venue, latitude, longitude, geohash = 'Online', None, None, ''
+            else:
+                city, lat, lng = rng.choices(CITIES, weights=CITY_WEIGHTS)[0]
+                latitude, longitude = round(rng.gauss(lat, 0.05), 6), round(rng.gauss(lng, 0.05), 6)
+                venue, geohash = f'{city} {rng.choice(VENUES)}', geo.encode(latitude, longitude)
+            yield (
+                f'{topic} {kind} #{index}', f'A synthetic {topic.lower()} {kind.lower()}.', day, start, venue,
+                'pay' if rng.random() < self.paid_share else 'free', latitude, longitude, geohash,
+            )
+
+    def participants(self, count, offset):
+        """Rows for base_participant, as (name, email); `offset` keeps emails unique across runs."""
+        rng = self.rng('participants')
+        for index in range(count):
+            yield f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', f'participant{offset + index}@seed.example.com'
+
+    def pairs(self, table, event_ids, participant_ids, total):
+        """(rng, event index, event id, participant id) for about `total` rows, distinct per event."""
+        rng = self.rng(table)
+        counts = popularity_counts(rng, len(event_ids), total, self.skew, len(participant_ids))
+        for index, (event_id, count) in enumerate(zip(event_ids, counts)):
+            for participant in rng.sample(range(len(participant_ids)), count):
+                yield rng, index, event_id, participant_ids[participant]
+
+    def signed_up(self, rng, index):
+        # Sign-ups come in during the weeks before the event, most of them close to it
+        return self.event_starts[index] - timedelta(minutes=rng.expovariate(1 / (60 * 24 * 14)))
+
+    def registrations(self, event_ids, participant_ids, total):
+        """Rows for base_registration, as (event_id, participant_id, timestamp, status)."""
+        names, cum_weights = list(self.statuses), list(itertools.accumulate(self.statuses.values()))
+        for rng, index, event_id, participant_id in self.pairs('registrations', event_ids, participant_ids, total):
+            yield event_id, participant_id, self.signed_up(rng, index), rng.choices(names, cum_weights=cum_weights)[0]
+
+    def bookings(self, event_ids, participant_ids, total):
+        """Rows for base_booking, as (event_id, participant_id, timestamp, booked)."""
+        total = round(total * self.booking_rate)
+        for rng, index, event_id, participant_id in self.pairs('bookings', event_ids, participant_ids, total):
+            yield event_id, participant_id, self.signed_up(rng, index), rng.random() < self.booked_share
+
+
+EVENT_COLUMNS = ['title', 'description', 'date', 'time', 'venue', 'charge', 'latitude', 'longitude', 'geohash']
+PARTICIPANT_COLUMNS = ['name', 'email']
+REGISTRATION_COLUMNS = ['event_id', 'participant_id', 'timestamp', 'status']
+BOOKING_COLUMNS = ['event_id', 'participant_id', 'timestamp', 'booked']
+
+
+def copy_value(value):
+    kind = type(value)
+    if kind is int:  # Ids, most of what is copied
+        return str(value)
+    if kind is str:
+        return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+    if value is None:
+        return '\\N'
+    if kind is bool:
+        return 't' if value else 'f'
+    return str(value)
+
+
+class CopyStream:
+    """A file-like object over rows, in COPY text format, read as COPY asks for it."""
+
+    def __init__(self, rows):
+        self.lines = ('\t'.join(map(copy_value, row)) + '\n' for row in rows)
+        self.buffer = ''
+
+    def read(self, size=-1):
+        parts, length = [self.buffer], len(self.buffer)
+        while size < 0 or length < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            parts.append(line)
+            length += len(line)
+        data = ''.join(parts)
+        if size < 0:
+            size = len(data)
+        self.buffer = data[size:]
+        return data[:size]
+
+
+def copy_rows(connection, model, columns, rows):
+    """COPY `rows` into the table of `model` (PostgreSQL only)."""
+    quote = connection.ops.quote_name
+    sql = f'COPY {quote(model._meta.db_table)} ({", ".join(map(quote, columns))}) FROM STDIN'
+    with connection.cursor() as cursor:
+        if hasattr(cursor.cursor, 'copy_expert'):  # psycopg2
+            cursor.copy_expert(sql, CopyStream(rows), size=65536)
+        else:  # psycopg 3
+            with cursor.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+
+
+def create_rows(connection, model, columns, rows, batch_size):
+    """bulk_create `rows` into `model` in batches, for databases without COPY."""
+    manager = model._default_manager.db_manager(connection.alias)
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, batch_size)):
+        manager.bulk_create([model(**dict(zip(columns, row))) for row in batch])
+
+
+def new_ids(connection, model, after):
+    """Ids of the rows inserted after id `after`, in insertion order."""
+    return list(model._default_manager.db_manager(connection.alias).filter(pk__gt=after)
+                .order_by('pk').values_list('pk', flat=True))
+
+
+def last_id(connection, model):
+    return model._default_manager.db_manager(connection.alias).order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+def load(seeder, events, participants, registrations, using='default', method='auto', batch_size=10_000, report=None):
+    """Seed the four tables with `seeder`, in one transaction; returns {table: rows loaded}.
+
+    `method` is 'copy', 'orm' (bulk_create) or 'auto' (COPY on PostgreSQL).
+    `report(table, rows, seconds)` is called as each table is done.
+    """
+    connection = connections[using]
+    if method == 'auto':
+        method = 'copy' if connection.vendor == 'postgresql' else 'orm'
+    loaded = {}
+
+    def insert(model, columns, rows):
+        start = time.perf_counter()
+        before = last_id(connection, model)
+        if method == 'copy':
+            copy_rows(connection, model, columns, rows)
+        else:
+            create_rows(connection, model, columns, rows, batch_size)
+        loaded[model._meta.db_table] = model._default_manager.db_manager(using).filter(pk__gt=before).count()
+        if report is not None:
+            report(model._meta.db_table, loaded[model._meta.db_table], time.perf_counter() - start)
+        return before
+
+    with transaction.atomic(using=using):
+        event_ids = new_ids(connection, Event, insert(Event, EVENT_COLUMNS, seeder.events(events)))
+        offset = last_id(connection, Participant)
+        participant_ids = new_ids(connection, Participant,
+                                  insert(Participant, PARTICIPANT_COLUMNS, seeder.participants(participants, offset)))
+        insert(Registration, REGISTRATION_COLUMNS, seeder.registrations(event_ids, participant_ids, registrations))
+        insert(Booking, BOOKING_COLUMNS, seeder.bookings(event_ids, participant_ids, registrations))
+    with connection.cursor() as cursor:
+        for model in (Event, Participant, Registration, Booking):
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')  # Plans need the new sizes
+    return loaded
@@ -1,12 +1,25 @@
 from rest_framework import serializers
-from .models import Event, Participant, Registration, Booking
-from django.shortcuts import get_object_or_404
+from .models import Event, Participant, Registration, Booking, RequestProfile
+from django.urls import reverse
 from django.utils import timezone
 from django.conf import settings
 from datetime import datetime
 from rest_framework.fields import ImageField
+from . import checkin, objectcache
 
-class EventSerializer(serializers.ModelSerializer):
+CHECKIN_BATCH_MAX = 5000  # Scans per upload
+
+class SparseFieldsMixin:
+    """Serializer mixin accepting `fields=[...]` to drop every other field."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+class EventSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
 
     # Explicitly define the image field as an ImageField
@@ -14,20 +27,107 @@ class EventSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Event
-        fields = ['id', 'title', 'description', 'image', 'date', 'time', 'venue', 'charge', 'image_url']
+        fields = ['id', 'title', 'description', 'image', 'date', 'time', 'venue', 'charge', 'latitude', 'longitude', 'image_url', 'updated_at', 'view_count']
 
     def get_image_url(self, obj):
         """Returns the full URL for the image."""
         if obj.image:
+            url = obj.image.url
             request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url  # Directly return the image URL if no request context
+            if request and url.startswith('/'):
+                # Scheme and host are worked out (and the host validated) once per response, not per event
+                if not hasattr(self, '_url_root'):
+                    self._url_root = request.build_absolute_uri('/')[:-1]
+                return self._url_root + url
+            return url  # Already absolute, or no request context
         return None
     
+class NearbyEventSerializer(EventSerializer):
+    distance_km = serializers.FloatField(read_only=True)  # Set by the nearby view
+
+    class Meta(EventSerializer.Meta):
+        fields = EventSerializer.Meta.fields + ['distance_km']
+
+class SimilarEventSerializer(EventSerializer):
+    similarity = serializers.FloatField(read_only=True)  # Set by the similar events view
+
+    class Meta(EventSerializer.Meta):
+        fields = EventSerializer.Meta.fields + ['similarity']
+
+class SyncQuerySerializer(serializers.Serializer):
+    """Validates the query parameters of the event sync endpoint."""
+    cursor = serializers.CharField(required=False, allow_blank=True, help_text="Cursor from the previous sync; omit for a full sync")
+    page_size = serializers.IntegerField(required=False, min_value=1, max_value=500, default=100)
+
+class CheckInBatchSerializer(serializers.Serializer):
+    """A scanner's batch of scans; each scan is {"token": ..., "scanned_at": ISO 8601}."""
+    scanner = serializers.CharField(max_length=64, required=False, allow_blank=True, default='')
+    # Scans are checked by base.checkin.record_scans, which is far cheaper per item than a nested serializer
+    scans = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=CHECKIN_BATCH_MAX)
+
+class RequestProfileSerializer(serializers.ModelSerializer):
+    """A stored request profile without its data; the detail view adds the SQL timeline."""
+    user = serializers.StringRelatedField()
+
+    class Meta:
+        model = RequestProfile
+        fields = ['id', 'created_at', 'user', 'method', 'path', 'status_code', 'duration_ms', 'profiler', 'query_count']
+
+class RequestProfileDetailSerializer(RequestProfileSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta(RequestProfileSerializer.Meta):
+        fields = RequestProfileSerializer.Meta.fields + ['download_url', 'queries']
+
+    def get_download_url(self, obj):
+        return reverse('request-profile-download', args=[obj.id])
+
+class NearbyQuerySerializer(serializers.Serializer):
+    """Validates the query parameters of the nearby events endpoint."""
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+    radius = serializers.FloatField(min_value=0.01, max_value=200, default=10)  # Kilometres
+
+class EventListQuerySerializer(serializers.Serializer):
+    """Validates the query parameters of the event list."""
+    ordering = serializers.ChoiceField(choices=['date', 'popular'], default='date')  # popular: most viewed first
+
+class TypeaheadQuerySerializer(serializers.Serializer):
+    """Validates the query parameters of the typeahead endpoint."""
+    q = serializers.CharField(max_length=100)
+    kind = serializers.ChoiceField(choices=['venue', 'title'], required=False)  # Both if unset
+    limit = serializers.IntegerField(min_value=1, max_value=20, default=10)
+
+class EventSummarySerializer(serializers.ModelSerializer):
+    """Compact event representation embedded in registration and booking listings."""
+    class Meta:
+        model = Event
+        fields = ['id', 'title', 'date', 'time', 'venue', 'charge']
+
 class EventImageUploadSerializer(serializers.Serializer):
     image = serializers.ImageField(required=True)
 
+IMAGE_UPLOAD_TYPES = {  # Content type -> (Pillow format, file extension)
+    'image/jpeg': ('JPEG', '.jpg'),
+    'image/png': ('PNG', '.png'),
+    'image/gif': ('GIF', '.gif'),
+    'image/webp': ('WEBP', '.webp'),
+}
+
+class ImageUploadUrlSerializer(serializers.Serializer):
+    """Announces a direct upload: what will be PUT and how big it is."""
+    content_type = serializers.ChoiceField(choices=sorted(IMAGE_UPLOAD_TYPES))
+    size = serializers.IntegerField(min_value=1)
+
+    def validate_size(self, value):
+        limit = settings.EVENT_IMAGE_MAX_BYTES
+        if value > limit:
+            raise serializers.ValidationError(f"Images can be at most {limit} bytes.")
+        return value
+
+class ImageUploadCompleteSerializer(serializers.Serializer):
+    upload_token = serializers.CharField()
+
 class ParticipantSerializer(serializers.ModelSerializer):
     class Meta:
         model = Participant
@@ -49,7 +149,7 @@ class RegistrationSerializer(serializers.ModelSerializer):
         participant, created = Participant.objects.get_or_create(**participant_data)
 
         # Retrieve the event instance by ID or raise an error
-        event = get_object_or_404(Event, id=event_id)
+        event = objectcache.events.get_or_404(event_id)
 
         # Create the registration instance
         registration = Registration.objects.create(participant=participant, event=event, **validated_data)
@@ -71,6 +171,33 @@ class RegistrationSerializer(serializers.ModelSerializer):
 
         return instance
 
+class ParticipantRegistrationSerializer(serializers.ModelSerializer):
+    event = EventSummarySerializer(read_only=True)
+    checkin_token = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Registration
+        fields = ['id', 'event', 'timestamp', 'status', 'checkin_token']
+
+    def get_checkin_token(self, obj):
+        # Shown as a QR code at the door; cancelled registrations no longer admit anyone
+        if not self.context.get('show_checkin_tokens') or obj.status == 'cancelled':
+            return None
+        return checkin.registration_token(obj)
+
+class ParticipantBookingSerializer(serializers.ModelSerializer):
+    event = EventSummarySerializer(read_only=True)
+    checkin_token = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Booking
+        fields = ['id', 'event', 'timestamp', 'booked', 'checkin_token']
+
+    def get_checkin_token(self, obj):
+        if not self.context.get('show_checkin_tokens') or not obj.booked:
+            return None  # Only the owner and staff get tokens (see views.CheckInTokensMixin)
+        return checkin.booking_token(obj)
+
 class BookingSerializer(serializers.ModelSerializer):
     event = serializers.PrimaryKeyRelatedField(queryset=Event.objects.all())
     participant = serializers.PrimaryKeyRelatedField(queryset=Participant.objects.all())
@@ -96,7 +223,8 @@ class RSVPSerializer(serializers.Serializer):
 
     def validate_event_id(self, value):
         """Ensure the event exists and is in the future."""
-        event = get_object_or_404(Event, id=value)
+        event = objectcache.events.get_or_404(value)
+        self.event = event  # Reused by create()
         
         # Check if the event date/time has passed
         event_datetime = timezone.make_aware(
@@ -120,13 +248,13 @@ class RSVPSerializer(serializers.Serializer):
         participant_data = validated_data['participant']
 
         # Retrieve or create the participant
-        participant, created = Participant.objects.get_or_create(
-            email=participant_data['email'],
+        participant, created = objectcache.participants.get_or_create(
+            participant_data['email'],
             defaults=participant_data
         )
 
-        # Retrieve the event instance by ID
-        event = get_object_or_404(Event, id=event_id)
+        # The event validate_event_id() loaded
+        event = getattr(self, 'event', None) or objectcache.events.get_or_404(event_id)
 
         # Retrieve or create the registration and set the status to 'rsvp'
         registration, created = Registration.objects.get_or_create(
@@ -0,0 +1,92 @@
+# base/signals.py
+from django.conf import settings
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import blobs, live, objectcache, recommendations
+from .models import Booking, Event, EventTombstone, Participant, Registration
+
+SIMILARITY_FIELDS = ('title', 'description')
+
+
+def similarity_text(instance):
+    # Read from __dict__ so deferred fields are not fetched just to be compared
+    return tuple(instance.__dict__.get(field) for field in SIMILARITY_FIELDS)
+
+
+def image_name(instance):
+    # The raw column value until first accessed, a FieldFile afterwards
+    image = instance.__dict__.get('image')
+    return getattr(image, 'name', image) or ''
+
+
+@receiver(post_init, sender=Event)
+def remember_similarity_text(sender, instance, **kwargs):
+    instance._similarity_text = similarity_text(instance)
+    instance._image_name = image_name(instance)
+
+
+@receiver(post_save, sender=Event)
+def refresh_similar_events(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """Queue an event for its "similar events" to be recomputed when its title or description change."""
+    if raw or not getattr(settings, 'SIMILAR_EVENTS_INCREMENTAL', True):
+        return
+    if update_fields is not None and not set(SIMILARITY_FIELDS) & set(update_fields):
+        return
+    current = similarity_text(instance)
+    if not created and current == instance._similarity_text:
+        return
+    instance._similarity_text = current
+    recommendations.enqueue([instance.pk])
+
+
+@receiver(pre_delete, sender=Event)
+def refill_similar_events(sender, instance, **kwargs):
+    """Queue the events listing a deleted event, whose lists the deletion leaves short."""
+    if getattr(settings, 'SIMILAR_EVENTS_INCREMENTAL', True):
+        recommendations.enqueue_listing(instance.pk)
+
+
+@receiver(post_save, sender=Event)
+def count_image_references(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """Keep the reference counts of shared image blobs in step with the events using them."""
+    if raw or (update_fields is not None and 'image' not in update_fields):
+        return
+    current = image_name(instance)
+    if current == instance._image_name:
+        return
+    blobs.acquire(current)
+    blobs.release(instance._image_name)
+    instance._image_name = current
+
+
+@receiver(post_delete, sender=Event)
+def release_image(sender, instance, **kwargs):
+    blobs.release(image_name(instance))
+
+
+@receiver(post_delete, sender=Event)
+def record_tombstone(sender, instance, **kwargs):
+    """Leave a tombstone so delta sync clients learn about the deletion."""
+    EventTombstone.objects.update_or_create(event_id=instance.pk, defaults={'deleted_at': timezone.now()})
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=Participant)
+@receiver(post_delete, sender=Participant)
+def invalidate_cached_object(sender, instance, using=None, **kwargs):
+    """Drop the row from the object caches of every worker (see base.objectcache)."""
+    objectcache.invalidate(sender, [instance.pk], using)
+
+
+@receiver(post_save, sender=Registration)
+@receiver(post_delete, sender=Registration)
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def announce_seat_counts(sender, instance, raw=False, using=None, **kwargs):
+    """Push the event's new counts to live watchers once the change is committed."""
+    if raw:
+        return
+    live.announce_counts(instance.event_id, using)
@@ -0,0 +1,110 @@
+# base/sync.py
+import base64
+import heapq
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Event, EventTombstone
+
+
+def settle_window():
+    # Rows are stamped before they commit, so the newest few seconds are left for the next sync
+    return timedelta(seconds=getattr(settings, 'SYNC_SETTLE_SECONDS', 2))
+
+
+def tombstone_retention():
+    return timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+class SyncCursor:
+    """Where a client is in the two change streams: (updated_at, id) of events and
+    (deleted_at, event_id) of tombstones, plus when it last synced. Sent to clients as
+    opaque base64 JSON."""
+
+    def __init__(self, changed=None, deleted=None, synced_at=None):
+        self.changed = changed  # None: from the beginning
+        self.deleted = deleted  # None: no deletions yet (initial sync)
+        self.synced_at = synced_at
+
+    @classmethod
+    def decode(cls, value):
+        """Parse a cursor from a client; raises ValueError when it is malformed."""
+        if not value:
+            return cls()
+        try:
+            data = json.loads(base64.urlsafe_b64decode(value.encode()))
+            changed, deleted = (
+                (datetime.fromisoformat(data[key][0]), int(data[key][1])) if data.get(key) else None
+                for key in ('c', 'd')
+            )
+            return cls(changed, deleted, datetime.fromisoformat(data['s']))
+        except (TypeError, KeyError, IndexError, ValueError, UnicodeError, AttributeError) as exc:
+            raise ValueError('Invalid sync cursor') from exc
+
+    def encode(self):
+        data = {
+            key: [position[0].isoformat(), position[1]] if position else None
+            for key, position in (('c', self.changed), ('d', self.deleted))
+        }
+        data['s'] = self.synced_at.isoformat()
+        return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode()
+
+    def is_expired(self, now=None):
+        """True when tombstones the client still needs may already have been pruned."""
+        return self.synced_at is not None and self.synced_at < (now or timezone.now()) - tombstone_retention()
+
+
+class SyncPage:
+    def __init__(self, changed, deleted, cursor, has_more):
+        self.changed = changed  # Event instances, oldest change first
+        self.deleted = deleted  # Ids of deleted events
+        self.cursor = cursor
+        self.has_more = has_more
+
+
+def after(queryset, field, id_field, position):
+    """Rows strictly past `position` in (field, id_field) order; an index range scan on both."""
+    if position is None:
+        return queryset
+    timestamp, last_id = position
+    return queryset.filter(**{f'{field}__gte': timestamp}).exclude(**{field: timestamp, f'{id_field}__lte': last_id})
+
+
+def sync_page(cursor, limit, queryset=None, now=None):
+    """Up to `limit` changes (edits and deletions together) following `cursor`, in time order."""
+    upper = (now or timezone.now()) - settle_window()
+    events = queryset if queryset is not None else Event.objects.all()
+    events = after(events.filter(updated_at__lte=upper), 'updated_at', 'id', cursor.changed)
+    events = list(events.order_by('updated_at', 'id')[:limit + 1])
+
+    deleted_from = cursor.deleted if cursor.deleted is not None or cursor.changed is not None else (upper, 0)
+    tombstones = after(EventTombstone.objects.filter(deleted_at__lte=upper), 'deleted_at', 'event_id', deleted_from)
+    tombstones = list(tombstones.order_by('deleted_at', 'event_id').values_list('deleted_at', 'event_id')[:limit + 1])
+
+    merged = heapq.merge(
+        ((event.updated_at, 0, event.id, event) for event in events),
+        ((deleted_at, 1, event_id, None) for deleted_at, event_id in tombstones),
+    )
+    changed, deleted = [], []
+    next_cursor = SyncCursor(cursor.changed, deleted_from, synced_at=upper)
+    for timestamp, kind, row_id, event in merged:
+        if len(changed) + len(deleted) == limit:
+            break
+        if kind == 0:
+            changed.append(event)
+            next_cursor.changed = (timestamp, row_id)
+        else:
+            deleted.append(row_id)
+            next_cursor.deleted = (timestamp, row_id)
+    has_more = len(events) + len(tombstones) > len(changed) + len(deleted)
+    return SyncPage(changed, deleted, next_cursor, has_more)
+
+
+def prune_tombstones(now=None):
+    """Delete tombstones past the retention period; returns how many went."""
+    horizon = (now or timezone.now()) - tombstone_retention()
+    deleted, _ = EventTombstone.objects.filter(deleted_at__lt=horizon).delete()
+    return deleted
@@ -1,3 +1,2016 @@
-from django.test import TestCase
+import asyncio
+import base64
+import io
+import json
+import logging
+import logging.handlers
+import marshal
+import math
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from decimal import Decimal
+from unittest import mock, skipUnless
+from urllib.parse import urlsplit
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+import numpy
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.core.paginator import EmptyPage
+from django.db import DatabaseError, IntegrityError, connection, models, transaction
+from django.http import Http404, HttpResponse
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import blobs, checkin, geo, live, log, metrics, notify, objectcache, profiling, recommendations, sync, typeahead, uploads, viewcounts
+from .models import (
+    Event, EventTombstone, EventVector, SimilarEvent, SimilarityTerm, SimilarityUpdate, Participant, Registration, Booking,
+    MediaBlob, CheckIn, RequestProfile,
+)
+from .media import ContentAddressedStorage, FileRange, MediaMiddleware, read_chunks
+from .pagination import EstimatedCountPaginator, table_row_estimate
+from .renderers import FastJSONRenderer, orjson as orjson_installed
+from .serializers import EventSerializer
+from .uploads import LocalObjectStoreApp
+from .views import NearbyEventList
+
+
+class GeoTests(TestCase):
+    def test_encode_matches_reference_geohash(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_decode_round_trips(self):
+        lat, lng = geo.decode(geo.encode(-1.2864, 36.8172))
+        self.assertAlmostEqual(lat, -1.2864, places=4)
+        self.assertAlmostEqual(lng, 36.8172, places=4)
+
+    def test_neighbours_wrap_around_the_antimeridian(self):
+        cells = geo.neighbours(geo.encode(0.0, 179.99, 4))
+        self.assertEqual(len(cells), 9)
+        self.assertIn(geo.encode(0.0, -179.99, 4), cells)
+
+    def test_covering_cells_contain_every_point_in_the_circle(self):
+        lat, lng, radius = -1.2864, 36.8172, 25
+        cells = geo.covering_cells(lat, lng, radius)
+        for bearing in range(0, 360, 15):
+            # Walk just inside the circle edge in every direction
+            d_lat = radius * 0.99 / geo.KM_PER_DEGREE
+            point_lat = lat + d_lat * math.cos(math.radians(bearing))
+            point_lng = lng + d_lat * math.sin(math.radians(bearing)) / math.cos(math.radians(point_lat))
+            geohash = geo.encode(point_lat, point_lng)
+            self.assertTrue(any(geohash.startswith(cell) for cell in cells), (bearing, geohash))
+
+    def test_haversine_distance(self):
+        # Nairobi to Mombasa is roughly 440km as the crow flies
+        self.assertAlmostEqual(geo.haversine_km(-1.2864, 36.8172, -4.0435, 39.6682), 440, delta=5)
+
+
+class NearbyEventListTests(APITestCase):
+    def setUp(self):
+        self.cbd = Event.objects.create(title='CBD', description='-', latitude=-1.2864, longitude=36.8172)
+        self.westlands = Event.objects.create(title='Westlands', description='-', latitude=-1.2676, longitude=36.8108)
+        self.karen = Event.objects.create(title='Karen', description='-', latitude=-1.3197, longitude=36.7073)
+        self.mombasa = Event.objects.create(title='Mombasa', description='-', latitude=-4.0435, longitude=39.6682)
+        Event.objects.create(title='Online', description='-')
+
+    def test_save_sets_geohash(self):
+        self.assertEqual(self.cbd.geohash, geo.encode(-1.2864, 36.8172))
+        self.cbd.latitude = None
+        self.cbd.save()
+        self.assertEqual(self.cbd.geohash, '')
+
+    def test_returns_events_within_radius_nearest_first(self):
+        response = self.client.get(reverse('nearby-event-list'), {'lat': -1.2864, 'lng': 36.8172, 'radius': 15})
+        self.assertEqual(response.status_code, 200)
+        titles = [event['title'] for event in response.data['results']]
+        self.assertEqual(titles, ['CBD', 'Westlands', 'Karen'])
+        distances = [event['distance_km'] for event in response.data['results']]
+        self.assertEqual(distances, sorted(distances))
+
+    def test_excludes_events_outside_radius(self):
+        response = self.client.get(reverse('nearby-event-list'), {'lat': -1.2864, 'lng': 36.8172, 'radius': 5})
+        titles = [event['title'] for event in response.data['results']]
+        self.assertEqual(titles, ['CBD', 'Westlands'])
+
+    def test_database_distance_matches_haversine(self):
+        events = Event.objects.annotate(distance_km=geo.haversine_expression(-1.2864, 36.8172)).filter(latitude__isnull=False)
+        for event in events:
+            self.assertAlmostEqual(event.distance_km, geo.haversine_km(-1.2864, 36.8172, event.latitude, event.longitude), places=6)
+
+    def test_pages_through_at_most_max_results(self):
+        with mock.patch.object(NearbyEventList, 'max_results', 2):
+            response = self.client.get(reverse('nearby-event-list'), {'lat': -1.2864, 'lng': 36.8172, 'radius': 15, 'page_size': 1})
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([event['title'] for event in response.data['results']], ['CBD'])
+        self.assertIsNotNone(response.data['next'])
+
+    def test_rejects_invalid_coordinates(self):
+        response = self.client.get(reverse('nearby-event-list'), {'lat': 95, 'lng': 36.8})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('nearby-event-list'), {'lat': -1.28})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(NOTIFY_BUS_BACKEND='base.notify.InProcessBus')
+class TypeaheadTests(APITestCase):
+    def setUp(self):
+        notify.reset_bus()
+        typeahead.reset_index()
+        self.addCleanup(notify.reset_bus)
+        self.addCleanup(typeahead.reset_index)
+        with self.captureOnCommitCallbacks(execute=True):  # As if committed: changes are announced per transaction
+            self.jazz = Event.objects.create(title='Jazz Night', description='-', venue='Sarit Expo Centre')
+            Event.objects.create(title='Python Meetup', description='-', venue='Nairobi Garage')
+            Event.objects.create(title='Data Science Meetup', description='-', venue='Nairobi Garage')
+            Event.objects.create(title='Café Scientifique', description='-')
+
+    def suggest(self, query, **params):
+        response = self.client.get(reverse('event-typeahead'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(result['kind'], result['text']) for result in response.data['results']]
+
+    def test_matches_the_start_of_any_word(self):
+        self.assertEqual(self.suggest('nai'), [('venue', 'Nairobi Garage')])
+        self.assertEqual(self.suggest('EXPO c'), [('venue', 'Sarit Expo Centre')])
+        self.assertEqual(self.suggest('cafe'), [('title', 'Café Scientifique')])  # Accents and case are ignored
+        self.assertEqual(self.suggest('meetup'), [('title', 'Data Science Meetup'), ('title', 'Python Meetup')])
+        self.assertEqual(self.suggest('meetup', kind='title', limit=1), [('title', 'Data Science Meetup')])
+
+        response = self.client.get(reverse('event-typeahead'), {'q': 'ga'})
+        self.assertEqual(response.data['results'], [{'kind': 'venue', 'text': 'Nairobi Garage', 'events': 2, 'match': 'prefix'}])
+        with self.captureOnCommitCallbacks(execute=True):
+            Event.objects.create(title='Garage Sale', description='-')
+            Event.objects.create(title='Gala Dinner', description='-')
+        # Texts starting with the query first, then the most used, then alphabetical
+        self.assertEqual(self.suggest('ga'), [('title', 'Gala Dinner'), ('title', 'Garage Sale'), ('venue', 'Nairobi Garage')])
+
+    def test_answers_from_memory_and_follows_changes(self):
+        self.suggest('jazz')
+        with self.assertNumQueries(0):
+            self.assertEqual(typeahead.suggest('ja', limit=5), [
+                {'kind': 'title', 'text': 'Jazz Night', 'events': 1, 'match': 'prefix'},
+            ])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jazz.title = 'Blues Night'
+            self.jazz.save()
+            Event.objects.create(title='Jazz Brunch', description='-', venue='Sarit Expo Centre')
+        with self.assertNumQueries(1):  # The changed events are read once
+            self.assertEqual(self.suggest('ja'), [('title', 'Jazz Brunch')])
+        self.assertEqual(typeahead.get_index().uses['venue', 'Sarit Expo Centre'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jazz.delete()
+        self.assertEqual(self.suggest('blu'), [])
+        self.assertEqual(typeahead.get_index().uses['venue', 'Sarit Expo Centre'], 1)
+
+    def test_rebuilt_when_old(self):
+        self.suggest('jazz')
+        Event.objects.filter(pk=self.jazz.pk).update(title='Jazz Picnic')  # Unannounced
+        self.assertEqual(self.suggest('jazz p'), [])
+        with self.settings(TYPEAHEAD_REBUILD_SECONDS=0):
+            self.assertEqual(self.suggest('jazz p'), [('title', 'Jazz Picnic')])
+
+    def test_fuzzy_matches_only_without_prefix_matches(self):
+        self.suggest('ja')  # Builds the index
+        fuzzy = [{'kind': 'title', 'text': 'Jazz Night', 'events': 1, 'match': 'fuzzy'}]
+        with mock.patch.object(typeahead, 'fuzzy_available', return_value=True), \
+                mock.patch.object(typeahead, 'fuzzy_search', return_value=fuzzy) as fuzzy_search:
+            with self.assertNumQueries(0):  # One prefix match of the ten asked for is enough
+                self.assertEqual(self.suggest('meetup'), [('title', 'Data Science Meetup'), ('title', 'Python Meetup')])
+            fuzzy_search.assert_not_called()
+            self.assertEqual(self.suggest('jaz nite'), [('title', 'Jazz Night')])
+            fuzzy_search.assert_called_once_with('jaz nite', None, 10)
+            self.suggest('xy')  # Too short to match on trigrams
+            self.assertEqual(fuzzy_search.call_count, 1)
+
+    def test_fuzzy_matches(self):
+        if not typeahead.fuzzy_available():
+            self.skipTest('pg_trgm is not installed on this server')
+        self.assertEqual(self.suggest('garaje'), [('venue', 'Nairobi Garage')])
+        response = self.client.get(reverse('event-typeahead'), {'q': 'scientifiqe'})
+        self.assertEqual(response.data['results'][0]['match'], 'fuzzy')
+
+    def test_rejects_bad_parameters(self):
+        self.assertEqual(self.client.get(reverse('event-typeahead')).status_code, 400)
+        self.assertEqual(self.client.get(reverse('event-typeahead'), {'q': 'a', 'kind': 'city'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('event-typeahead'), {'q': 'a', 'limit': 50}).status_code, 400)
+
+
+class ViewCountTests(APITestCase):
+    def setUp(self):
+        self.counter = viewcounts.ViewCounter()
+        self.counter.pid = os.getpid()  # Started: no flusher thread, flushed by the tests
+        patcher = mock.patch.object(viewcounts, 'counter', self.counter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.quiet = Event.objects.create(title='Quiet', description='-', date=timezone.localdate())
+        self.busy = Event.objects.create(title='Busy', description='-', date=timezone.localdate() + timedelta(days=1))
+
+    def view(self, event, times=1):
+        for _ in range(times):
+            self.assertEqual(self.client.get(reverse('event-detail', args=[event.id])).status_code, 200)
+
+    def test_views_are_written_in_one_batch(self):
+        self.view(self.busy, 3)
+        self.view(self.quiet)
+        self.assertEqual(Event.objects.get(pk=self.busy.pk).view_count, 0)  # Nothing written per request
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.counter.flush(), 2)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('FROM (VALUES', queries[0]['sql'])
+        self.assertEqual(dict(Event.objects.values_list('title', 'view_count')), {'Busy': 3, 'Quiet': 1})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counter.flush(), 0)
+
+        self.view(self.busy)
+        self.counter.flush()
+        self.assertEqual(Event.objects.get(pk=self.busy.pk).view_count, 4)  # Added to, not replaced
+
+    def test_popular_ordering(self):
+        self.view(self.busy, 2)
+        self.counter.flush()
+        response = self.client.get(reverse('event-list'), {'ordering': 'popular'})
+        self.assertEqual([event['title'] for event in response.data], ['Busy', 'Quiet'])
+        self.assertEqual(response.data[0]['view_count'], 2)
+        response = self.client.get(reverse('event-list'))
+        self.assertEqual([event['title'] for event in response.data], ['Quiet', 'Busy'])  # By date, as before
+        self.assertEqual(self.client.get(reverse('event-list'), {'ordering': 'views'}).status_code, 400)
+
+    def test_saving_an_older_copy_keeps_the_count(self):
+        stale = Event.objects.get(pk=self.busy.pk)
+        self.view(self.busy, 2)
+        self.counter.flush()
+        stale.title = 'Busier'
+        stale.save()
+        self.assertEqual(Event.objects.values_list('title', 'view_count').get(pk=self.busy.pk), ('Busier', 2))
+        stale.title = 'Busiest'
+        stale.save(update_fields=['title'])
+        self.assertEqual(Event.objects.values_list('title', 'view_count').get(pk=self.busy.pk), ('Busiest', 2))
+
+    def test_saving_a_deleted_event_inserts_it_again(self):
+        event = Event.objects.get(pk=self.busy.pk)
+        Event.objects.filter(pk=self.busy.pk).delete()
+        event.title = 'Back'
+        event.save()  # As for any model: no row to update, so one is inserted
+        self.assertEqual(Event.objects.values_list('title', 'view_count').get(pk=self.busy.pk), ('Back', 0))
+
+    def test_failed_write_is_retried(self):
+        self.view(self.busy)
+        with mock.patch('base.viewcounts.write_views', side_effect=DatabaseError('gone')), \
+                self.assertLogs('base.viewcounts', 'ERROR'):
+            self.assertEqual(self.counter.flush(), 0)
+        self.view(self.busy)
+        self.assertEqual(self.counter.flush(), 1)
+        self.assertEqual(Event.objects.get(pk=self.busy.pk).view_count, 2)
+
+    def test_views_of_another_database_are_dropped(self):
+        self.view(self.busy)
+        self.counter.database = 'ratiba'  # As at exit, once the test database is gone
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counter.flush(), 0)
+
+
+class SimilarEventTests(APITestCase):
+    def setUp(self):
+        self.jazz = Event.objects.create(title='Jazz night', description='Live jazz band and saxophone music downtown')
+        self.blues = Event.objects.create(title='Blues and jazz evening', description='Live blues band with jazz saxophone')
+        self.hackathon = Event.objects.create(title='Python hackathon', description='Build software with Python and Django')
+        self.meetup = Event.objects.create(title='Django meetup', description='Talks about Django software and Python')
+        recommendations.rebuild_all(k=2)
+
+    def test_rebuild_finds_textually_similar_events(self):
+        similar = list(SimilarEvent.objects.filter(event=self.jazz).values_list('similar_id', flat=True))
+        self.assertEqual(similar[0], self.blues.id)
+        self.assertNotIn(self.hackathon.id, similar)
+
+    def test_endpoint_returns_neighbours_by_score_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('similar-event-list', args=[self.meetup.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['id'], self.hackathon.id)
+        scores = [event['similarity'] for event in response.data]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_rebuild_stores_vocabulary_and_sparse_vectors(self):
+        model = recommendations.TfidfModel.load()
+        self.assertIn('jazz', model.vocabulary)
+        self.assertNotIn('downtown', model.vocabulary)  # Used by one event only
+        vector = EventVector.objects.get(event=self.jazz)
+        self.assertEqual(vector.columns, sorted(vector.columns))
+        self.assertAlmostEqual(math.fsum(weight ** 2 for weight in vector.weights), 1, places=5)
+
+    def test_save_only_queues_the_event(self):
+        gala = Event.objects.create(title='Jazz gala', description='Saxophone and live jazz band')
+        self.assertTrue(SimilarityUpdate.objects.filter(event_id=gala.id).exists())
+        self.assertFalse(SimilarEvent.objects.filter(event=gala).exists())
+
+    def test_created_event_is_added_incrementally(self):
+        gala = Event.objects.create(title='Jazz gala', description='Saxophone and live jazz band')
+        self.assertEqual(recommendations.process_queue(), 5)  # Queued by the saves of setUp too
+        self.assertFalse(SimilarityUpdate.objects.exists())
+        self.assertTrue(SimilarEvent.objects.filter(event=gala, similar=self.jazz).exists())
+        self.assertTrue(SimilarEvent.objects.filter(event=self.jazz, similar=gala).exists())
+        self.assertLessEqual(SimilarEvent.objects.filter(event=self.jazz).count(), 2)
+
+    def test_edit_moves_event_between_lists(self):
+        self.blues.title = 'Django sprint'
+        self.blues.description = 'Python software sprint for Django contributors'
+        self.blues.save()
+        recommendations.process_queue()
+        self.assertFalse(SimilarEvent.objects.filter(event=self.blues, similar=self.jazz).exists())
+        self.assertTrue(SimilarEvent.objects.filter(event=self.blues, similar=self.meetup).exists())
+
+    def test_lists_an_event_leaves_are_refilled(self):
+        conference = Event.objects.create(title='Django conference', description='Talks on Django')
+        recommendations.rebuild_all(k=1)
+        self.assertEqual(list(SimilarEvent.objects.filter(event=self.hackathon).values_list('similar_id', flat=True)),
+                         [self.meetup.id])
+        self.meetup.title = 'Jazz jam'
+        self.meetup.description = 'Saxophone band night'
+        self.meetup.save()
+        recommendations.process_queue(k=1)
+        # The next best from the stored vectors, although the conference itself did not change
+        self.assertEqual(list(SimilarEvent.objects.filter(event=self.hackathon).values_list('similar_id', flat=True)),
+                         [conference.id])
+
+    def test_deleting_an_event_refills_the_lists_it_was_in(self):
+        recommendations.process_queue()
+        self.assertTrue(SimilarEvent.objects.filter(event=self.jazz, similar=self.blues).exists())
+        self.blues.delete()
+        self.assertTrue(SimilarityUpdate.objects.filter(event_id=self.jazz.id).exists())
+        recommendations.process_queue()
+        self.assertFalse(SimilarEvent.objects.filter(event=self.jazz).exists())  # Nothing else shares its words
+
+    def test_first_update_without_a_model_rebuilds(self):
+        SimilarityTerm.objects.all().delete()
+        SimilarEvent.objects.all().delete()
+        Event.objects.create(title='Jazz gala', description='Saxophone and live jazz band')
+        recommendations.process_queue()
+        self.assertTrue(SimilarityTerm.objects.exists())
+        self.assertTrue(SimilarEvent.objects.filter(event=self.jazz).exists())
+
+    def test_updates_look_candidates_up_by_uncommon_words(self):
+        Event.objects.bulk_create(Event(title=f'Music {i}', description='Music downtown') for i in range(3))
+        recommendations.rebuild_all(k=2)
+        model = recommendations.TfidfModel.load()
+        self.assertEqual(SimilarityTerm.objects.get(word='music').events, 4)  # Jazz night's description too
+        columns, weights = model.vectorize(recommendations.tokenize('Jazz music', ''))
+        with override_settings(SIMILAR_EVENTS_MAX_TERM_EVENTS=2):
+            self.assertEqual(recommendations.lookup_columns(columns, model).tolist(), [model.vocabulary['jazz']])
+            event_ids, scores = recommendations.stored_scores(columns, weights, None, model)
+        self.assertEqual(set(event_ids.tolist()), {self.jazz.id, self.blues.id})
+        self.assertTrue((scores > 0).all())
+
+    @override_settings(SIMILAR_EVENTS_MAX_CANDIDATES=1)
+    def test_updates_score_a_bounded_number_of_candidates(self):
+        gala = Event.objects.create(title='Jazz gala', description='Saxophone and live jazz band')
+        recommendations.process_queue()
+        self.assertEqual(SimilarEvent.objects.filter(event=gala).count(), 1)
+
+    def test_unrelated_save_does_not_recompute(self):
+        SimilarityUpdate.objects.all().delete()
+        self.jazz.venue = 'Alliance Francaise'
+        self.jazz.save()
+        self.assertFalse(SimilarityUpdate.objects.exists())
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        Event.objects.bulk_create(Event(title=f'Event {i}', description='-') for i in range(30))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE base_event')
+
+    def test_table_row_estimate_reads_planner_statistics(self):
+        self.assertEqual(table_row_estimate(Event), 30)
+
+    def test_uses_estimate_above_threshold_for_unfiltered_querysets(self):
+        paginator = EstimatedCountPaginator(Event.objects.all(), 10)
+        paginator.estimate_threshold = 10
+        Event.objects.create(title='Not analysed yet', description='-')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 30)
+        self.assertNotIn('COUNT(', queries[0]['sql'])
+
+    def test_counts_exactly_below_threshold(self):
+        Event.objects.create(title='Not analysed yet', description='-')
+        paginator = EstimatedCountPaginator(Event.objects.all(), 10)
+        self.assertEqual(paginator.count, 31)
+        self.assertTrue(paginator.count_is_exact)
+
+    def test_filtered_querysets_are_counted_up_to_the_threshold(self):
+        paginator = EstimatedCountPaginator(Event.objects.filter(title__startswith='Event 1'), 10, estimate_threshold=11)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 11)
+        self.assertTrue(paginator.count_is_exact)
+        self.assertEqual(len(queries), 1)  # No EXPLAIN below the threshold
+        self.assertIn('LIMIT 12', queries[0]['sql'])
+
+    def test_filtered_querysets_above_the_threshold_use_the_planner_estimate(self):
+        paginator = EstimatedCountPaginator(Event.objects.filter(title__startswith='Event 1'), 10, estimate_threshold=5)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertGreaterEqual(paginator.count, 6)
+        self.assertFalse(paginator.count_is_exact)
+        self.assertEqual(len(queries), 2)
+        self.assertIn('LIMIT 6', queries[0]['sql'])
+        self.assertTrue(queries[1]['sql'].startswith('EXPLAIN'))
+        exact = EstimatedCountPaginator(Event.objects.filter(title__startswith='Event 1'), 10, count_mode='exact', estimate_threshold=0)
+        self.assertEqual(exact.count, 11)
+
+    def test_estimated_pages_use_lookahead_for_next_page(self):
+        queryset = Event.objects.order_by('id')
+        paginator = EstimatedCountPaginator(queryset, 10, count_mode='none')
+        self.assertFalse(paginator.page(3).has_next())
+        self.assertTrue(paginator.page(2).has_next())
+        self.assertEqual(len(paginator.page(3)), 10)
+        with self.assertRaises(EmptyPage):
+            paginator.page(4)
+
+
+class CustomPageNumberPaginationTests(APITestCase):
+    def setUp(self):
+        Event.objects.bulk_create(
+            Event(title=f'Event {i}', description='-', date=timezone.localdate() + timedelta(days=1)) for i in range(12)
+        )
+
+    def test_default_pagination_counts_small_tables_exactly(self):
+        response = self.client.get(reverse('future-event-list'))
+        self.assertEqual(response.data['count'], 12)
+        self.assertTrue(response.data['count_is_exact'])
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertIn('page=2', response.data['next'])
+
+    def test_count_can_be_skipped(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('future-event-list'), {'count': 'none', 'page': 3})
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+        self.assertIsNone(response.data['count'])
+        self.assertFalse(response.data['count_is_exact'])
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNone(response.data['next'])
+        self.assertIn('page=2', response.data['previous'])
+
+    def test_page_size_and_out_of_range_pages(self):
+        response = self.client.get(reverse('future-event-list'), {'page_size': 12})
+        self.assertEqual(len(response.data['results']), 12)
+        self.assertEqual(self.client.get(reverse('future-event-list'), {'page': 9}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('future-event-list'), {'page': 9, 'count': 'none'}).status_code, 404)
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password123')
+        self.client.force_login(user)
+        self.event = Event.objects.create(title='Launch', description='-')
+
+    def add_registrations(self, count):
+        start = Participant.objects.count()
+        participants = Participant.objects.bulk_create(
+            Participant(name=f'P{i}', email=f'p{i}@example.com') for i in range(start, start + count)
+        )
+        Registration.objects.bulk_create(Registration(event=self.event, participant=p) for p in participants)
+
+    def test_registration_changelist_query_count_does_not_grow_with_rows(self):
+        self.add_registrations(3)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.client.get('/admin/base/registration/').status_code, 200)
+        self.add_registrations(30)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.client.get('/admin/base/registration/').status_code, 200)
+        self.assertEqual(len(small), len(large))
+
+    def test_registration_change_form_uses_autocomplete(self):
+        self.add_registrations(1)
+        registration = Registration.objects.get()
+        response = self.client.get(f'/admin/base/registration/{registration.pk}/change/')
+        self.assertContains(response, 'admin-autocomplete')
+
+
+class ParticipantHistoryTests(APITestCase):
+    def setUp(self):
+        self.participant = Participant.objects.create(name='Amina', email='amina@example.com')
+        other = Participant.objects.create(name='Brian', email='brian@example.com')
+        now = timezone.now()
+        self.events = Event.objects.bulk_create(Event(title=f'Event {i}', description='-') for i in range(7))
+        for offset, event in enumerate(self.events):
+            Registration.objects.create(event=event, participant=self.participant, timestamp=now - timedelta(hours=offset))
+            Booking.objects.create(event=event, participant=self.participant, timestamp=now - timedelta(hours=offset))
+        Registration.objects.create(event=self.events[0], participant=other)
+
+    def test_registrations_newest_first_with_events_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('participant-registrations', args=[self.participant.id]))
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([r['event']['id'] for r in results], [e.id for e in self.events[:5]])
+        self.assertEqual(results[0]['event']['title'], 'Event 0')
+        self.assertNotIn('description', results[0]['event'])
+
+    def test_cursor_pagination_walks_all_registrations(self):
+        url = reverse('participant-registrations', args=[self.participant.id])
+        seen = []
+        while url:
+            response = self.client.get(url)
+            seen.extend(r['id'] for r in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+    def test_bookings(self):
+        response = self.client.get(reverse('participant-bookings', args=[self.participant.id]), {'page_size': 10})
+        self.assertEqual(len(response.data['results']), 7)
+        self.assertIn('booked', response.data['results'][0])
+
+
+class QueryPlanTests(APITestCase):
+    """Runs EXPLAIN on every query an endpoint makes against a seeded database and fails
+    on sequential scans of the large tables, i.e. on a missing or unusable index."""
+
+    EVENTS = 20000
+    PARTICIPANTS = 20000
+    REGISTRATIONS_PER_PARTICIPANT = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO base_event (title, description, date, time, venue, charge, geohash) "
+                "SELECT 'Event ' || n, 'Synthetic event', CURRENT_DATE + 30 + n %% 300, '18:00', '', 'free', "
+                "CASE WHEN n %% 2 = 0 THEN 'kzf0' ELSE 'sb8q' END || n FROM generate_series(1, %s) AS n",
+                [cls.EVENTS],
+            )
+            cursor.execute(
+                "INSERT INTO base_participant (name, email) "
+                "SELECT 'Participant ' || n, 'participant' || n || '@example.com' FROM generate_series(1, %s) AS n",
+                [cls.PARTICIPANTS],
+            )
+            for table in ('base_registration', 'base_booking'):
+                extra = "(ARRAY['confirmed', 'pending', 'cancelled', 'rsvp'])[1 + (p.id + k) %% 4]" if table == 'base_registration' else 'k %% 2 = 0'
+                column = 'status' if table == 'base_registration' else 'booked'
+                # Event ids are computed, not joined: without statistics yet, a join could be planned as a nested loop
+                cursor.execute(
+                    f"INSERT INTO {table} (event_id, participant_id, timestamp, {column}) "
+                    f"SELECT first.id + (p.id * 7 + k * 13) %% %s, p.id, now() - (p.id || ' minutes')::interval, {extra} "
+                    "FROM base_participant p CROSS JOIN generate_series(1, %s) AS k "
+                    "CROSS JOIN (SELECT min(id) AS id FROM base_event) AS first",
+                    [cls.EVENTS, cls.REGISTRATIONS_PER_PARTICIPANT],
+                )
+            cursor.execute('ANALYZE base_event, base_participant, base_registration, base_booking')
+        # Validate the deferred foreign keys once here rather than after every test
+        connection.check_constraints()
+        cls.event = Event.objects.order_by('id')[10]
+        cls.participant = Participant.objects.order_by('id')[10]
+
+    def assert_index_only_access(self, request, tables=('base_event', 'base_participant', 'base_registration', 'base_booking'),
+                                 counts=True):
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        self.assertLess(response.status_code, 400, getattr(response, 'data', response))
+        checked = 0
+        for query in queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE')):
+                continue  # Savepoints and the paginator's own EXPLAIN
+            if not counts and 'COUNT(' in sql:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN ' + sql)
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+            for table in tables:
+                self.assertNotRegex(plan, rf'Seq Scan on {table}\b', f'{sql}\n{plan}')
+            checked += 1
+        self.assertGreater(checked, 0)
+        return response
+
+    def test_event_detail(self):
+        self.assert_index_only_access(lambda: self.client.get(reverse('event-detail', args=[self.event.id])))
+
+    def test_nearby_events(self):
+        self.assert_index_only_access(
+            lambda: self.client.get(reverse('nearby-event-list'), {'lat': -1.2864, 'lng': 36.8172, 'radius': 5})
+        )
+
+    def test_list_participants(self):
+        response = self.assert_index_only_access(lambda: self.client.get(reverse('list-participants', args=[self.event.id])))
+        self.assertGreater(response.data['count'], 0)
+
+    def test_register_event(self):
+        payload = {'event_id': self.event.id, 'participant': {'name': 'New', 'email': 'new@example.com'}}
+        self.assert_index_only_access(lambda: self.client.post(reverse('register-event'), payload, format='json'))
+
+    def test_rsvp_event(self):
+        payload = {'event_id': self.event.id, 'participant': {'name': 'Guest', 'email': 'guest@example.com'}}
+        self.assert_index_only_access(lambda: self.client.post(reverse('rsvp-event'), payload, format='json'))
+
+    def test_participant_registrations(self):
+        self.assert_index_only_access(lambda: self.client.get(reverse('participant-registrations', args=[self.participant.id])))
+
+    def test_participant_bookings(self):
+        self.assert_index_only_access(lambda: self.client.get(reverse('participant-bookings', args=[self.participant.id])))
+
+    def test_admin_filters(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password123'))
+        # The rows of a page; counting half the bookings is up to the paginator (EstimatedCountPaginator)
+        self.assert_index_only_access(lambda: self.client.get('/admin/base/event/', {'charge__exact': 'pay'}))
+        self.assert_index_only_access(lambda: self.client.get('/admin/base/booking/', {'booked__exact': '1'}), counts=False)
+
+    def test_active_registration_count_uses_partial_index(self):
+        queryset = Registration.objects.filter(event=self.event, status__in=Registration.ACTIVE_STATUSES)
+        self.assertIn('registration_active_idx', queryset.explain())
+
+    def test_booked_count_uses_event_booked_index(self):
+        self.assertIn('booking_event_booked_idx', Booking.objects.filter(event=self.event, booked=True).explain())
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        self.event = Event.objects.create(title='Gala', description='x' * 5000, date=tomorrow, venue='KICC')
+        similar = Event.objects.create(title='Gala dinner', description='y' * 5000, date=tomorrow)
+        SimilarEvent.objects.create(event=self.event, similar=similar, score=0.5)
+
+    def test_list_endpoints_leave_out_description_by_default(self):
+        for url in (reverse('event-list'), reverse('future-event-list'), reverse('similar-event-list', args=[self.event.id])):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            results = response.data['results'] if isinstance(response.data, dict) else response.data
+            self.assertNotIn('description', results[0], url)
+            self.assertIn('title', results[0], url)
+            self.assertFalse(any('"base_event"."description"' in query['sql'] for query in queries), url)
+
+    def test_detail_returns_description_by_default(self):
+        response = self.client.get(reverse('event-detail', args=[self.event.id]))
+        self.assertEqual(len(response.data['description']), 5000)
+
+    def test_fields_selects_response_fields_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('event-list'), {'fields': 'id,title,image_url'})
+        self.assertEqual(set(response.data[0]), {'id', 'title', 'image_url'})
+        select = next(query['sql'] for query in queries if query['sql'].startswith('SELECT'))
+        self.assertIn('"base_event"."image"', select)
+        self.assertNotIn('"base_event"."venue"', select)
+
+    def test_fields_can_ask_for_description_on_lists(self):
+        response = self.client.get(reverse('future-event-list'), {'fields': 'id,description'})
+        self.assertEqual(len(response.data['results'][0]['description']), 5000)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse('event-detail', args=[self.event.id]), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+
+
+def make_png(color='red', size=(20, 20)):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class MediaTestCase(APITestCase):
+    """Runs each test against a throwaway MEDIA_ROOT."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_SERVE=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class MediaMiddlewareTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = bytes(range(256)) * 4
+        self.name = ContentAddressedStorage().save('clip.bin', ContentFile(self.content))
+        self.url = f'/media/{self.name}'
+
+    def test_full_response_with_validators(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+        revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+        suffix = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(suffix.streaming_content), self.content[-5:])
+
+        open_ended = self.client.get(self.url, HTTP_RANGE='bytes=1000-')
+        self.assertEqual(b''.join(open_ended.streaming_content), self.content[1000:])
+
+    def test_unsatisfiable_and_stale_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        stale = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"')
+        self.assertEqual(stale.status_code, 200)
+
+    def test_only_blobs_are_cached_forever(self):
+        self.assertEqual(self.client.get(self.url)['Cache-Control'], 'public, max-age=31536000, immutable')
+        name = FileSystemStorage(location=self.media_root).save('event_images/clip.bin', ContentFile(self.content))
+        self.assertEqual(self.client.get(f'/media/{name}')['Cache-Control'], 'public, max-age=3600')
+
+    def test_head_and_missing_files(self):
+        response = self.client.head(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(self.client.get('/media/event_images/missing.png').status_code, 404)
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+
+    async def test_streams_in_chunks_read_off_the_event_loop_under_asgi(self):
+        async def get_response(request):
+            return HttpResponse(status=418)
+        middleware = MediaMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        factory = AsyncRequestFactory()
+
+        response = await middleware(factory.get(self.url))
+        self.assertTrue(response.is_async)  # Not read into a list by Django before sending
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(b''.join([chunk async for chunk in response]), self.content)
+
+        response = await middleware(factory.get(self.url, headers={'Range': 'bytes=10-19'}))
+        self.assertEqual((response.status_code, response['Content-Range']), (206, f'bytes 10-19/{len(self.content)}'))
+        self.assertEqual(b''.join([chunk async for chunk in response]), self.content[10:20])
+        self.assertEqual((await middleware(factory.get('/events/'))).status_code, 418)
+
+        file = open(os.path.join(self.media_root, self.name), 'rb')
+        chunks = [chunk async for chunk in read_chunks(FileRange(file, 24, 1000), chunk_size=100)]
+        self.assertEqual([len(chunk) for chunk in chunks], [100] * 10)
+        self.assertEqual(b''.join(chunks), self.content[24:])
+        self.assertTrue(file.closed)
+
+    def test_uploads_being_hashed_are_not_served(self):
+        incoming = os.path.join(self.media_root, 'blobs', 'incoming')
+        with open(os.path.join(incoming, 'tmpupload'), 'wb') as temporary:
+            temporary.write(self.content)
+        for path in ('blobs/incoming/tmpupload', 'blobs//incoming/tmpupload', 'blobs/./incoming/tmpupload', 'blobs/incoming/'):
+            self.assertEqual(self.client.get(f'/media/{path}').status_code, 404, path)
+
+
+class ContentAddressedImageTests(MediaTestCase):
+    def upload(self, event, content, filename='banner.png'):
+        upload = SimpleUploadedFile(filename, content, content_type='image/png')
+        response = self.client.post(reverse('event-image-upload', args=[event.id]), {'image': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        event.refresh_from_db()
+        return event.image.name
+
+    def test_identical_uploads_share_one_blob(self):
+        first = Event.objects.create(title='Series 1', description='-')
+        second = Event.objects.create(title='Series 2', description='-')
+        name = self.upload(first, make_png(), 'week1.png')
+        self.assertEqual(self.upload(second, make_png(), 'week2.png'), name)
+        self.assertRegex(name, r'^blobs/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+        self.assertEqual(len(os.listdir(os.path.dirname(os.path.join(self.media_root, name)))), 1)
+
+    def test_uploaded_event_image_is_served_with_immutable_caching(self):
+        event = Event.objects.create(title='Gala', description='-')
+        upload = SimpleUploadedFile('poster.png', make_png(), content_type='image/png')
+        response = self.client.post(reverse('event-image-upload', args=[event.id]), {'image': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        event.refresh_from_db()
+
+        response = self.client.get(event.image.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(b''.join(response.streaming_content), make_png())
+
+    def test_blob_is_deleted_with_its_last_reference(self):
+        first = Event.objects.create(title='Series 1', description='-')
+        second = Event.objects.create(title='Series 2', description='-')
+        shared = self.upload(first, make_png())
+        self.upload(second, make_png())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            replacement = self.upload(first, make_png('blue'))
+        self.assertEqual(MediaBlob.objects.get(name=shared).ref_count, 1)
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, shared)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(MediaBlob.objects.filter(name=shared).exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, shared)))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, replacement)))
+
+    def test_blob_referenced_again_before_its_deletion_is_kept(self):
+        event = Event.objects.create(title='Series 1', description='-')
+        name = self.upload(event, make_png())
+        with self.captureOnCommitCallbacks() as callbacks:
+            event.delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 0)  # Pending deletion
+        blobs.acquire(ContentAddressedStorage().save('again.png', ContentFile(make_png())))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, name)))
+
+    def test_upload_after_the_deletion_writes_the_blob_again(self):
+        event = Event.objects.create(title='Series 1', description='-')
+        name = self.upload(event, make_png())
+        with self.captureOnCommitCallbacks(execute=True):
+            event.delete()
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, name)))
+        self.assertEqual(self.upload(Event.objects.create(title='Series 2', description='-'), make_png()), name)
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, name)))
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+
+    def test_dedupe_command_backfills_existing_images(self):
+        legacy = FileSystemStorage(location=self.media_root)
+        events = [Event.objects.create(title=f'Old {index}', description='-') for index in range(3)]
+        names = [legacy.save(f'event_images/copy{index}.png', ContentFile(make_png())) for index in range(2)]
+        names.append(legacy.save('event_images/other.png', ContentFile(make_png('green'))))
+        for event, name in zip(events, names):
+            Event.objects.filter(pk=event.pk).update(image=name)
+
+        call_command('dedupe_event_images', stdout=io.StringIO())
+
+        images = [Event.objects.get(pk=event.pk).image.name for event in events]
+        self.assertEqual(images[0], images[1])
+        self.assertNotEqual(images[0], images[2])
+        self.assertEqual(dict(MediaBlob.objects.values_list('name', 'ref_count')), {images[0]: 2, images[2]: 1})
+        for name in names:
+            self.assertFalse(legacy.exists(name))
+        self.assertEqual(ContentAddressedStorage().open(images[0]).read(), make_png())
+
+
+class BlobLockTests(TransactionTestCase):
+    """A blob is deleted and uploaded again concurrently, on two real connections."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.name = ContentAddressedStorage().save('poster.png', ContentFile(make_png()))
+        MediaBlob.objects.create(name=self.name, size=len(make_png()), ref_count=0)  # Pending deletion
+
+    def test_upload_waits_for_the_deletion_then_writes_the_file_again(self):
+        locked, saved = threading.Event(), []
+
+        def upload():
+            try:
+                locked.wait()
+                with transaction.atomic():
+                    name = ContentAddressedStorage().save('again.png', ContentFile(make_png()))
+                    blobs.acquire(name)
+                saved.append(name)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=upload)
+        thread.start()
+        with transaction.atomic():
+            blobs.lock(self.name)
+            locked.set()
+            thread.join(0.5)
+            self.assertTrue(thread.is_alive())  # Waiting for the lock
+            blobs.delete_unreferenced(self.name)
+        thread.join(10)
+        self.assertEqual(saved, [self.name])
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, self.name)))
+        self.assertEqual(MediaBlob.objects.get(name=self.name).ref_count, 1)
+
+
+class DirectUploadTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.store_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.store_root, ignore_errors=True)
+        settings_override = override_settings(OBJECT_STORE_ROOT=self.store_root, OBJECT_STORE_URL='http://store.test')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.event = Event.objects.create(title='Launch', description='-')
+        self.object_store = LocalObjectStoreApp()
+
+    def request_upload(self, content_type='image/png', size=None, event=None):
+        event = event or self.event
+        response = self.client.post(
+            reverse('event-image-upload-url', args=[event.id]),
+            {'content_type': content_type, 'size': size or len(make_png())}, format='json',
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def put(self, upload_url, body, content_type='image/png'):
+        url = urlsplit(upload_url)
+        environ = {
+            'REQUEST_METHOD': 'PUT', 'PATH_INFO': url.path, 'QUERY_STRING': url.query,
+            'CONTENT_TYPE': content_type, 'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body),
+        }
+        statuses = []
+        self.object_store(environ, lambda status, headers: statuses.append(status))
+        return int(statuses[0].split()[0])
+
+    def complete(self, upload_token, event=None):
+        event = event or self.event
+        return self.client.post(
+            reverse('event-image-upload-complete', args=[event.id]), {'upload_token': upload_token}, format='json',
+        )
+
+    def test_full_direct_upload_flow(self):
+        upload = self.request_upload()
+        self.assertTrue(upload['upload_url'].startswith('http://store.test/incoming/events/'))
+        self.assertEqual(self.put(upload['upload_url'], make_png()), 200)
+
+        response = self.complete(upload['upload_token'])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.event.refresh_from_db()
+        self.assertRegex(self.event.image.name, r'^blobs/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(self.event.image.read(), make_png())
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+        self.assertEqual(os.listdir(os.path.join(self.store_root, 'incoming', 'events', str(self.event.id))), [])
+
+    def test_object_store_rejects_bad_puts(self):
+        upload = self.request_upload()
+        self.assertEqual(self.put(upload['upload_url'].replace('signature=', 'signature=0'), make_png()), 403)
+        self.assertEqual(self.put(upload['upload_url'], make_png(), content_type='image/gif'), 403)
+        self.assertEqual(self.put(upload['upload_url'], make_png() + b'extra'), 413)
+        with override_settings(OBJECT_STORE_UPLOAD_TTL=-1):
+            expired = self.request_upload()
+        self.assertEqual(self.put(expired['upload_url'], make_png()), 403)
+
+    def test_upload_url_validation(self):
+        url = reverse('event-image-upload-url', args=[self.event.id])
+        self.assertEqual(self.client.post(url, {'content_type': 'text/html', 'size': 10}, format='json').status_code, 400)
+        with override_settings(EVENT_IMAGE_MAX_BYTES=100):
+            self.assertEqual(self.client.post(url, {'content_type': 'image/png', 'size': 101}, format='json').status_code, 400)
+
+    def test_completion_checks_token_and_content(self):
+        other = Event.objects.create(title='Other', description='-')
+        upload = self.request_upload()
+        self.assertEqual(self.complete(upload['upload_token']).status_code, 400)  # Nothing uploaded yet
+        self.put(upload['upload_url'], make_png())
+        self.assertEqual(self.complete(upload['upload_token'], event=other).status_code, 400)
+        self.assertEqual(self.complete(upload['upload_token'] + 'x').status_code, 400)
+
+        fake = self.request_upload(size=20)
+        self.assertEqual(self.put(fake['upload_url'], b'<html>not a png</html>'[:20]), 200)
+        self.assertEqual(self.complete(fake['upload_token']).status_code, 400)
+        self.event.refresh_from_db()
+        self.assertFalse(self.event.image)
+
+
+class AsgiTests(TestCase):
+    """The web process serves everything over ASGI (see the Procfile), not just the streams."""
+
+    async def test_json_endpoints_and_media_under_asgi(self):
+        event = await Event.objects.acreate(title='Ticket drop', description='-')
+        response = await self.async_client.get(reverse('event-detail', args=[event.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['title'], 'Ticket drop')
+        self.assertEqual((await self.async_client.get('/media/missing.png')).status_code, 404)
+
+    def test_every_middleware_runs_async(self):
+        # One sync-only middleware would put every request through sync_to_async
+        for path in settings.MIDDLEWARE:
+            self.assertTrue(getattr(import_string(path), 'async_capable', False), path)
+
+    async def test_media_streams_through_the_whole_chain(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        content = os.urandom(100_000)
+        with self.settings(MEDIA_ROOT=media_root, MEDIA_SERVE=True):
+            name = await sync_to_async(ContentAddressedStorage().save)('clip.bin', ContentFile(content))
+            response = await self.async_client.get(f'/media/{name}')
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), content)
+
+    def test_procfile_runs_the_asgi_application(self):
+        with open(os.path.join(settings.BASE_DIR.parent, 'Procfile')) as procfile:
+            web = next(line for line in procfile if line.startswith('web:'))
+        self.assertIn('ratiba.asgi:application', web)
+
+
+@override_settings(NOTIFY_BUS_BACKEND='base.notify.InProcessBus')
+class LiveCountsTests(TestCase):
+    def setUp(self):
+        notify.reset_bus()
+        live.reset_broadcaster()
+        self.addCleanup(notify.reset_bus)
+        self.addCleanup(live.reset_broadcaster)
+        self.event = Event.objects.create(title='Ticket drop', description='-', date=timezone.localdate() + timedelta(days=3))
+        self.participant = Participant.objects.create(name='Wanjiru', email='wanjiru@example.com')
+        with self.captureOnCommitCallbacks(execute=True):  # As if committed: changes are announced per transaction
+            Registration.objects.create(event=self.event, participant=self.participant, status='rsvp')
+
+    def register(self, status='confirmed'):
+        participant = Participant.objects.create(name='Otieno', email=f'otieno-{status}@example.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            Registration.objects.create(event=self.event, participant=participant, status=status)
+            Booking.objects.create(event=self.event, participant=participant, booked=True)
+
+    async def test_stream_sends_counts_then_changes(self):
+        response = await self.async_client.get(reverse('event-live-counts', args=[self.event.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n')
+        first = (await anext(stream)).decode()
+        self.assertIn('"registrations":1,"rsvps":1,"bookings":0', first)
+        self.assertEqual(live.get_broadcaster().watcher_count(self.event.id), 1)
+
+        await sync_to_async(self.register)()
+        latest = (await asyncio.wait_for(anext(stream), 5)).decode()
+        # The registration and booking arrive as two notifications; the mailbox keeps the newest
+        self.assertTrue(latest.startswith('event: counts\n'))
+        self.assertIn('"registrations":2,"rsvps":1,"bookings":1', latest)
+        await stream.aclose()
+
+    def test_wsgi_requests_get_one_snapshot(self):
+        response = self.client.get(reverse('event-live-counts', args=[self.event.id]))
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('retry: 5000\n'))
+        self.assertIn('"registrations":1', body)
+        self.assertEqual(self.client.get(reverse('event-live-counts', args=[self.event.id + 1000])).status_code, 404)
+
+    def test_one_notification_reaches_every_watcher(self):
+        broadcaster = live.get_broadcaster()
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+
+        async def subscribe(count):
+            return [broadcaster.subscribe(self.event.id) for _ in range(count)]
+
+        async def receive(subscriptions):
+            return [await asyncio.wait_for(subscription.queue.get(), 5) for subscription in subscriptions]
+
+        subscriptions = loop.run_until_complete(subscribe(1000))
+        with CaptureQueriesContext(connection) as queries:
+            live.publish_counts(self.event.id)
+        payloads = loop.run_until_complete(receive(subscriptions))
+        self.assertEqual(len(payloads), 1000)
+        self.assertEqual(payloads[0]['registrations'], 1)
+        self.assertEqual(len(queries), 2)  # The counts are read once, whatever the number of watchers
+
+    def test_cascades_announce_each_event_once(self):
+        received = []
+        notify.get_bus().subscribe(live.LIVE_CHANNEL, received.append)
+        others = Event.objects.bulk_create(Event(title=f'Other {i}', description='-') for i in range(3))
+        with self.captureOnCommitCallbacks(execute=True):
+            for event in others:
+                Registration.objects.create(event=event, participant=self.participant, status='confirmed')
+                Booking.objects.create(event=event, participant=self.participant, booked=True)
+        self.assertEqual([payload['event'] for payload in received], sorted(event.id for event in others))
+        self.assertEqual(received[0], {'event': others[0].id, 'registrations': 1, 'rsvps': 0, 'bookings': 1})
+
+        received.clear()
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            self.participant.delete()
+        self.assertEqual(sorted(payload['event'] for payload in received), sorted([self.event.id, *(e.id for e in others)]))
+        self.assertTrue(all(payload['registrations'] == 0 for payload in received))
+        self.assertEqual(sum('GROUP BY' in query['sql'] for query in queries), 2)  # Counted together
+
+
+class PostgresNotifyBusTests(TransactionTestCase):
+    def test_notifications_are_delivered_after_commit(self):
+        bus = notify.PostgresNotifyBus()
+        self.addCleanup(bus.close)
+        received, delivered = [], threading.Event()
+
+        def callback(payload):
+            received.append(payload)
+            delivered.set()
+
+        bus.subscribe('ratiba_test', callback)
+        self.assertTrue(bus.wait_until_listening('ratiba_test'))
+        bus.publish('ratiba_test', {'event': 7, 'bookings': 3})
+        self.assertTrue(delivered.wait(5))
+        self.assertEqual(received, [{'event': 7, 'bookings': 3}])
+
+        delivered.clear()
+        bus.publish_many('ratiba_test', [{'event': 8}, {'event': 9}])
+        for _ in range(50):
+            if len(received) == 3:
+                break
+            delivered.wait(0.1)
+        self.assertEqual(received[1:], [{'event': 8}, {'event': 9}])
+
+
+@override_settings(NOTIFY_BUS_BACKEND='base.notify.InProcessBus', OBJECT_CACHE_TTL=300, OBJECT_CACHE_SIZE=100)
+class ObjectCacheTests(TransactionTestCase):
+    """Rows are only cached outside transactions, so these tests commit for real."""
+
+    def setUp(self):
+        notify.reset_bus()
+        objectcache.reset()
+        self.addCleanup(notify.reset_bus)
+        self.addCleanup(objectcache.reset)
+        with metrics.registry.lock:
+            metrics.registry.counters.clear()
+        self.event = Event.objects.create(title='Harvest fair', description='-', date=timezone.localdate() + timedelta(days=5))
+
+    def counters(self):
+        return {key: count for key, count in metrics.registry.counter_snapshot().items() if key[1] == 'event'}
+
+    def test_reads_are_served_from_memory_until_the_row_changes(self):
+        objectcache.events.get_or_404(self.event.id)
+        with self.assertNumQueries(0):
+            cached = objectcache.events.get_or_404(str(self.event.id))  # Request bodies carry strings
+        self.assertEqual(cached.title, 'Harvest fair')
+        cached.title = 'Changed, not saved'
+        self.assertEqual(objectcache.events.get_or_404(self.event.id).title, 'Harvest fair')  # Each hit is a new instance
+
+        cached.save()
+        self.assertEqual(len(objectcache.events), 0)
+        self.assertEqual(objectcache.events.get_or_404(self.event.id).title, 'Changed, not saved')
+        self.event.delete()
+        with self.assertRaises(Http404):
+            objectcache.events.get_or_404(self.event.id)
+        self.assertEqual(self.counters(), {
+            ('ratiba_object_cache_hits_total', 'event'): 2,
+            ('ratiba_object_cache_misses_total', 'event'): 3,
+            ('ratiba_object_cache_invalidations_total', 'event'): 2,
+        })
+
+    def test_changes_are_announced_once_per_transaction(self):
+        other = Event.objects.create(title='Book swap', description='-')
+        received = []
+        notify.get_bus().subscribe(objectcache.INVALIDATION_CHANNEL, received.append)
+        with transaction.atomic():
+            for event in (self.event, other, self.event):
+                event.save()
+            self.assertEqual(received, [])
+        self.assertEqual(received, [{'cache': 'event', 'pks': sorted([self.event.id, other.id])}])
+
+    def test_rolled_back_changes_do_not_hold_back_later_ones(self):
+        other = Event.objects.create(title='Book swap', description='-')
+        received = []
+        notify.get_bus().subscribe(objectcache.INVALIDATION_CHANNEL, received.append)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.event.save()
+            Event.objects.create(pk=other.pk, title='Duplicate', description='-')
+        with transaction.atomic():
+            with self.assertRaises(IntegrityError), transaction.atomic():  # A savepoint
+                other.save()
+                Event.objects.create(pk=other.pk, title='Duplicate', description='-')
+            other.save()
+        with transaction.atomic():
+            self.event.save()
+        # Rolled back rows are only announced along with the next commit
+        self.assertEqual(received, [{'cache': 'event', 'pks': sorted([self.event.id, other.id])},
+                                    {'cache': 'event', 'pks': [self.event.id]}])
+
+    def test_invalidations_from_other_processes(self):
+        objectcache.events.get_or_404(self.event.id)
+        participant, created = objectcache.participants.get_or_create('amina@example.com', {'name': 'Amina'})
+        self.assertTrue(created)
+        self.assertEqual(objectcache.participants.get_or_create('amina@example.com')[0].pk, participant.pk)
+
+        objectcache.dispatch({'cache': 'participant', 'pks': [participant.pk]})  # Keyed by email, dropped by pk
+        objectcache.dispatch({'cache': 'event', 'pks': [self.event.id + 1]})
+        self.assertEqual((len(objectcache.events), len(objectcache.participants)), (1, 0))
+
+        # An update() sends no signals: the writer invalidates explicitly
+        Event.objects.filter(pk=self.event.id).update(title='Renamed')
+        objectcache.invalidate(Event, [self.event.id])
+        self.assertEqual(objectcache.events.get_or_404(self.event.id).title, 'Renamed')
+
+    def test_size_and_age_bounds(self):
+        events = [self.event, *(Event.objects.create(title=f'Extra {i}', description='-') for i in range(2))]
+        with self.settings(OBJECT_CACHE_SIZE=2):
+            for event in events:  # The third evicts events[0]
+                objectcache.events.get_or_404(event.id)
+            objectcache.events.get_or_404(events[1].id)  # Now the most recently used
+            objectcache.events.get_or_404(events[0].id)  # Back, evicting events[2]
+        self.assertEqual(list(objectcache.events.entries), [events[1].id, events[0].id])
+
+        later = time.monotonic() + 301
+        with mock.patch('base.objectcache.time.monotonic', return_value=later), self.assertNumQueries(1):
+            objectcache.events.get_or_404(events[1].id)
+        self.assertEqual(self.counters()[('ratiba_object_cache_evictions_total', 'event')], 3)
+
+        body = metrics.render({}, metrics.registry.counter_snapshot())
+        self.assertIn('# TYPE ratiba_object_cache_evictions_total counter', body)
+        self.assertIn('ratiba_object_cache_evictions_total{cache="event"} 3', body)
+
+    def test_rows_read_in_a_transaction_are_not_kept(self):
+        with transaction.atomic():
+            objectcache.events.get_or_404(self.event.id)
+        self.assertEqual(len(objectcache.events), 0)
+        with self.settings(OBJECT_CACHE_TTL=0):
+            objectcache.events.get_or_404(self.event.id)
+        self.assertEqual(len(objectcache.events), 0)
+
+    def test_views_share_the_cached_event(self):
+        self.client.get(reverse('event-detail', args=[self.event.id]))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('event-detail', args=[self.event.id]))
+        self.assertEqual(response.json()['title'], 'Harvest fair')
+        self.assertFalse(any('base_event' in query['sql'] for query in queries))
+
+    @override_settings(NOTIFY_BUS_BACKEND='base.notify.PostgresNotifyBus')
+    def test_invalidation_over_postgres(self):
+        notify.reset_bus()
+        objectcache.reset()
+        objectcache.events.get_or_404(self.event.id)
+        self.assertTrue(notify.get_bus().wait_until_listening(objectcache.INVALIDATION_CHANNEL))
+        notify.get_bus().publish(objectcache.INVALIDATION_CHANNEL, {'cache': 'event', 'pks': [self.event.id]})
+        for _ in range(50):
+            if not len(objectcache.events):
+                break
+            time.sleep(0.1)
+        self.assertEqual(len(objectcache.events), 0)
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class EventSyncTests(APITestCase):
+    def setUp(self):
+        self.events = [Event.objects.create(title=f'Event {i}', description='-') for i in range(3)]
+
+    def sync(self, cursor=None, **params):
+        if cursor:
+            params['cursor'] = cursor
+        response = self.client.get(reverse('event-sync'), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_full_sync_in_bounded_pages_then_deltas(self):
+        # Same timestamp for all three: the id breaks the tie
+        Event.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        seen, cursor = [], None
+        for _ in range(3):
+            page = self.sync(cursor, page_size=1)
+            seen += [event['id'] for event in page['changed']]
+            cursor = page['cursor']
+        self.assertEqual(seen, [event.id for event in self.events])
+        self.assertFalse(page['has_more'])
+        self.assertIn('description', page['changed'][0])
+
+        page = self.sync(cursor)
+        self.assertEqual((page['changed'], page['deleted'], page['has_more']), ([], [], False))
+
+        edited, removed = self.events[0], self.events[1]
+        removed_id = removed.id
+        edited.title = 'Renamed'
+        edited.save(update_fields=['title'])
+        removed.delete()
+        Event.objects.create(title='New', description='-')
+        page = self.sync(cursor)
+        self.assertEqual([event['title'] for event in page['changed']], ['Renamed', 'New'])
+        self.assertEqual(page['deleted'], [removed_id])
+
+        page = self.sync(page['cursor'])
+        self.assertEqual((page['changed'], page['deleted']), ([], []))
+
+    def test_deletions_before_the_first_sync_are_not_sent(self):
+        deleted_id = self.events[0].id
+        self.events[0].delete()
+        page = self.sync()
+        self.assertEqual(len(page['changed']), 2)
+        self.assertEqual(page['deleted'], [])
+        self.assertTrue(EventTombstone.objects.filter(event_id=deleted_id).exists())
+
+    def test_sparse_fields_and_bad_cursors(self):
+        page = self.sync(fields='id,title')
+        self.assertEqual(set(page['changed'][0]), {'id', 'title'})
+        self.assertEqual(self.client.get(reverse('event-sync'), {'cursor': 'garbage'}).status_code, 400)
+
+        old = sync.SyncCursor(synced_at=timezone.now() - timedelta(days=31)).encode()
+        response = self.client.get(reverse('event-sync'), {'cursor': old})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.data['reset'])
+
+    def test_recent_changes_wait_for_the_settle_window(self):
+        with self.settings(SYNC_SETTLE_SECONDS=60):
+            self.assertEqual(self.sync()['changed'], [])
+
+
+class CheckInTests(APITestCase):
+    def setUp(self):
+        self.event = Event.objects.create(title='Concert', description='-')
+        self.participants = Participant.objects.bulk_create(
+            Participant(name=f'Guest {i}', email=f'guest{i}@example.com') for i in range(3)
+        )
+        self.registrations = [Registration.objects.create(event=self.event, participant=p, status='confirmed')
+                              for p in self.participants]
+        self.booking = Booking.objects.create(event=self.event, participant=self.participants[0], booked=True)
+        self.staff = get_user_model().objects.create_user('door', 'door@example.com', password_hash='!')
+        self.staff.is_staff = True
+        self.staff.save()
+
+    def scan(self, token, minutes=0):
+        return {'token': token, 'scanned_at': (timezone.now() - timedelta(minutes=minutes)).isoformat()}
+
+    def test_deleting_a_participant_finds_its_check_ins_by_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.participants[1].delete()
+        sql = next(query['sql'] for query in queries if 'base_checkin' in query['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')  # The table is tiny: only use no index if there is none
+            cursor.execute('EXPLAIN ' + sql)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            cursor.execute('RESET enable_seqscan')
+        self.assertNotIn('Seq Scan on base_checkin', plan)
+
+    def test_tokens_verify_offline_with_the_event_key(self):
+        token = checkin.registration_token(self.registrations[0])
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(reverse('event-checkin-key', args=[self.event.id]))
+        key = base64.urlsafe_b64decode(response.data['key'])
+
+        ticket = checkin.read_token(token, key)
+        self.assertEqual((ticket.kind, ticket.ticket_id, ticket.event_id, ticket.participant_id),
+                         ('registration', self.registrations[0].id, self.event.id, self.participants[0].id))
+        message, signature = token.rsplit('.', 1)
+        self.assertIsNone(checkin.read_token(message.replace(f'.{self.event.id}.', '.999.') + '.' + signature))
+        self.assertIsNone(checkin.read_token(token, checkin.event_key(self.event.id + 1)))
+        self.assertIsNone(checkin.read_token('R1.2'))
+
+    def tokens(self, name, participant):
+        return [ticket['checkin_token'] for ticket in self.client.get(reverse(name, args=[participant.id])).data['results']]
+
+    def test_tickets_listed_with_tokens_for_their_owner(self):
+        self.registrations[1].status = 'cancelled'
+        self.registrations[1].save()
+        owner = get_user_model().objects.create_user('guest1', 'Guest1@example.com', password_hash='!')
+        self.client.force_authenticate(owner)
+        self.assertEqual(self.tokens('participant-registrations', self.participants[1]), [None])
+        self.assertEqual(self.tokens('participant-registrations', self.participants[0]), [None])  # Someone else's
+
+        guest = get_user_model().objects.create_user('guest0', 'guest0@example.com', password_hash='!')
+        self.client.force_authenticate(guest)
+        self.assertEqual(self.tokens('participant-registrations', self.participants[0]),
+                         [checkin.registration_token(self.registrations[0])])
+        self.assertEqual(self.tokens('participant-bookings', self.participants[0]), [checkin.booking_token(self.booking)])
+
+    def test_staff_see_every_token(self):
+        self.client.force_authenticate(self.staff)
+        self.assertEqual(self.tokens('participant-bookings', self.participants[0]), [checkin.booking_token(self.booking)])
+
+    def test_anonymous_requests_get_no_tokens(self):
+        for participant in self.participants:
+            self.assertEqual(self.tokens('participant-registrations', participant), [None])
+        self.assertEqual(self.tokens('participant-bookings', self.participants[0]), [None])
+
+    def test_ticket_ids_beyond_32_bits(self):
+        booking = Booking.objects.create(id=2 ** 31 + 7, event=self.event, participant=self.participants[1], booked=True)
+        self.client.force_authenticate(self.staff)
+        response = self.client.post(reverse('checkin-batch'), {'scans': [self.scan(checkin.booking_token(booking))]}, format='json')
+        self.assertEqual(response.data['recorded'], 1, response.data)
+        self.assertTrue(CheckIn.objects.filter(kind='booking', ticket_id=2 ** 31 + 7).exists())
+
+    def test_batch_recorded_in_one_insert_and_deduplicated(self):
+        self.registrations[2].status = 'cancelled'
+        self.registrations[2].save()
+        tokens = [checkin.registration_token(r) for r in self.registrations]
+        scans = [
+            self.scan(tokens[0], minutes=5),
+            self.scan(tokens[0], minutes=10),  # Same ticket scanned twice: the earlier scan is kept
+            self.scan(checkin.booking_token(self.booking)),
+            self.scan(tokens[1][:-2] + 'AA'),  # Forged
+            {'token': tokens[1], 'scanned_at': 'yesterday'},
+            self.scan(tokens[2]),  # Cancelled after the token was issued
+        ]
+        url = reverse('checkin-batch')
+        self.assertEqual(self.client.post(url, {'scans': scans}, format='json').status_code, 401)
+
+        self.client.force_authenticate(self.staff)
+        with self.assertNumQueries(3):  # Registrations, bookings, one INSERT
+            response = self.client.post(url, {'scanner': 'gate-1', 'scans': scans}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data, {'received': 6, 'recorded': 2, 'duplicates': 1, 'invalid': [3, 4], 'revoked': [5]})
+        first = CheckIn.objects.get(kind='registration', ticket_id=self.registrations[0].id)
+        self.assertEqual((first.event_id, first.participant_id, first.scanner),
+                         (self.event.id, self.participants[0].id, 'gate-1'))
+        self.assertLess(first.scanned_at, timezone.now() - timedelta(minutes=9))
+
+        # A retried upload and a second gate scanning the same ticket change nothing
+        response = self.client.post(url, {'scanner': 'gate-2', 'scans': scans[:3]}, format='json')
+        self.assertEqual((response.data['recorded'], response.data['duplicates']), (0, 3))
+        self.assertEqual(CheckIn.objects.count(), 2)
+        self.assertEqual(CheckIn.objects.get(kind='booking').scanner, 'gate-1')
+
+
+class SettingsProfileTests(SimpleTestCase):
+    def test_api_profile_serves_json_without_admin_docs_or_sessions(self):
+        # A separate interpreter: the app registry cannot switch INSTALLED_APPS in-process
+        script = (
+            "import json, sys, django; django.setup()\n"
+            "from django.conf import settings\n"
+            "from django.test import Client\n"
+            "client = Client()\n"
+            "print(json.dumps({\n"
+            "    'statuses': [client.get(url).status_code for url in ('/admin/', '/redoc/', '/events/nearby/?lat=x')],\n"
+            "    'content_type': client.get('/events/nearby/?lat=x')['Content-Type'],\n"
+            "    'loaded': [m for m in ('drf_yasg.views', 'django_heroku', 'django.contrib.sessions.middleware') if m in sys.modules],\n"
+            "    'csrf': 'django.middleware.csrf.CsrfViewMiddleware' in settings.MIDDLEWARE,\n"
+            "}))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script],
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'ratiba.settings_api', 'LOG_LEVELS': 'django=ERROR'},
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=60,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        self.assertEqual(data['statuses'], [404, 404, 400])
+        self.assertEqual(data['content_type'], 'application/json')
+        self.assertEqual(data['loaded'], [])
+        self.assertFalse(data['csrf'])
+
+    def test_docs_are_built_on_first_request(self):
+        with self.assertNoLogs('drf_yasg', 'WARNING'):  # Every view inspected without raising
+            response = self.client.get('/api/api.json/', {'format': 'openapi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('/events/sync/', response.json()['paths'])
+
+
+class ListHandler(logging.Handler):
+    def __init__(self, gate=None):
+        super().__init__()
+        self.lines = []
+        self.gate = gate  # Holds the listener up until set
+
+    def emit(self, record):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.lines.append(json.loads(self.format(record)))
+
+
+class LoggingTests(SimpleTestCase):
+    def make_handler(self, target, maxsize=100):
+        target.setFormatter(log.JsonFormatter())
+        handler = log.NonBlockingQueueHandler(queue.Queue(maxsize))
+        handler.listener = log.QueueListener(handler.queue, target)
+        logger = logging.getLogger(f'ratiba.test.{self._testMethodName}')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        return logger, handler
+
+    def test_records_become_json_lines_in_the_listener_thread(self):
+        target = ListHandler()
+        logger, handler = self.make_handler(target)
+        arguments = ['before']
+        logger.info('Value %s', arguments, extra={'event_id': 7})
+        arguments[0] = 'after'  # The message was merged when the record was queued
+        try:
+            raise ValueError('bad')
+        except ValueError:
+            logger.exception('Failed')
+        logger.debug('Below the level, never queued')
+        handler.listener.stop()
+
+        first, second = target.lines
+        self.assertEqual((first['level'], first['message'], first['event_id']), ('INFO', "Value ['before']", 7))
+        self.assertEqual(first['logger'], f'ratiba.test.{self._testMethodName}')
+        self.assertIn('ValueError: bad', second['exception'])
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        release = threading.Event()
+        target = ListHandler(release)
+        logger, handler = self.make_handler(target, maxsize=2)
+        for index in range(10):
+            logger.info('Record %s', index)
+        release.set()
+        handler.queue.join()
+        logger.warning('After the burst')
+        handler.listener.stop()
+
+        self.assertLess(len(target.lines), 10)
+        self.assertEqual(target.lines[-1]['message'], 'After the burst')
+        self.assertEqual(target.lines[-1]['dropped'] + len(target.lines), 11)
+
+    def test_sampling_keeps_a_share_of_info_records(self):
+        sampler = log.SamplingFilter({'base': 0, 'base.views': 0.5, 'base.views.hot': 1})
+        record = lambda name, level=logging.INFO: logging.LogRecord(name, level, __file__, 1, 'x', None, None)
+        self.assertFalse(sampler.filter(record('base.live')))
+        self.assertTrue(sampler.filter(record('base.live', logging.WARNING)))
+        self.assertTrue(sampler.filter(record('base.views.hot.path')))
+        self.assertTrue(sampler.filter(record('django.request')))
+        kept = [r for r in (record('base.views') for _ in range(2000)) if sampler.filter(r)]
+        self.assertTrue(700 < len(kept) < 1300, len(kept))
+        self.assertEqual(kept[0].sample_rate, 0.5)
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir, ignore_errors=True)
+        settings_override = override_settings(METRICS_DIR=self.metrics_dir, METRICS_TOKEN='scrape-me')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        with metrics.registry.lock:
+            metrics.registry.series.clear()  # Requests of earlier tests would add to the totals checked here
+        self.event = Event.objects.create(title='Launch', description='-', date=timezone.localdate())
+
+    def histogram(self, labels, name):
+        return metrics.registry.snapshot().get(labels, {}).get(name, metrics.new_histogram(name))
+
+    def test_requests_are_recorded_per_route_with_queries_and_size(self):
+        labels = ('events/<int:pk>/', 'GET', '200')
+        before = {name: self.histogram(labels, name) for name in metrics.HISTOGRAMS}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('event-detail', args=[self.event.id]))
+        after = {name: self.histogram(labels, name) for name in metrics.HISTOGRAMS}
+
+        self.assertEqual(sum(after['ratiba_http_request_duration_seconds'][:-1]),
+                         sum(before['ratiba_http_request_duration_seconds'][:-1]) + 1)
+        self.assertEqual(after['ratiba_http_request_queries'][-1] - before['ratiba_http_request_queries'][-1],
+                         len(queries))
+        self.assertEqual(after['ratiba_http_response_size_bytes'][-1] - before['ratiba_http_response_size_bytes'][-1],
+                         len(response.content))
+        self.client.get('/no-such-page/')
+        self.assertIn((metrics.UNMATCHED_ROUTE, 'GET', '404'), metrics.registry.snapshot())
+
+    def test_scrape_adds_up_the_workers_of_this_server(self):
+        self.client.get(reverse('event-detail', args=[self.event.id]))  # Starts the registry
+        other = {'ratiba_http_request_queries': [0, 0, 7] + [0] * 7 + [14]}  # Seven requests of two queries
+        with open(os.path.join(self.metrics_dir, f'{metrics.registry.server_pid}-1-worker.json'), 'w') as file:
+            json.dump([['events/', 'GET', '200', other]], file)
+        abandoned = os.path.join(self.metrics_dir, '4194305-1-gone.json')  # Above any pid_max: not running
+        with open(abandoned, 'w') as file:
+            json.dump([['events/', 'GET', '200', other]], file)
+
+        self.assertEqual(self.client.get(reverse('request-metrics')).status_code, 401)
+        response = self.client.get(reverse('request-metrics'), HTTP_AUTHORIZATION='Token scrape-me')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE ratiba_http_request_duration_seconds histogram', body)
+        route = 'route="events/",method="GET",status="200"'
+        self.assertIn(f'ratiba_http_request_queries_bucket{{{route},le="1.0"}} 0', body)
+        self.assertIn(f'ratiba_http_request_queries_bucket{{{route},le="2.0"}} 7', body)
+        self.assertIn(f'ratiba_http_request_queries_bucket{{{route},le="+Inf"}} 7', body)
+        self.assertIn(f'ratiba_http_request_queries_sum{{{route}}} 14', body)
+        self.assertIn('route="events/<int:pk>/",method="GET",status="200"', body)
+        self.assertFalse(os.path.exists(abandoned))
+
+    def test_flush_writes_this_process_for_the_others(self):
+        self.client.get(reverse('event-detail', args=[self.event.id]))
+        metrics.registry.flush()
+        with open(os.path.join(self.metrics_dir, metrics.registry.filename)) as file:
+            rows = json.load(file)['series']
+        self.assertIn(['events/<int:pk>/', 'GET', '200'], [row[:3] for row in rows])
+        self.assertEqual(os.listdir(self.metrics_dir), [metrics.registry.filename])  # No temporary files left
+
+    async def test_queries_of_sync_views_are_counted_under_asgi(self):
+        # The view runs on another thread's connection (sync_to_async), with the request's context
+        labels = ('events/<int:pk>/', 'GET', '200')
+        before = self.histogram(labels, 'ratiba_http_request_queries')[-1]
+        await sync_to_async(objectcache.events.clear)()
+        response = await self.async_client.get(reverse('event-detail', args=[self.event.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(self.histogram(labels, 'ratiba_http_request_queries')[-1], before)
+
+
+@override_settings(PROFILING_RATE_LIMIT=(2, 3600))
+class ProfilingTests(APITestCase):
+    def setUp(self):
+        self.event = Event.objects.create(title='Launch', description='-', date=timezone.localdate())
+        self.staff = get_user_model().objects.create_user('ops', 'ops@example.com', password_hash='!')
+        self.staff.is_staff = True
+        self.staff.save()
+        self.member = get_user_model().objects.create_user('member', 'member@example.com', password_hash='!')
+
+    def get(self, user, url, **extra):
+        token = RefreshToken.for_user(user).access_token
+        return self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}', **extra)
+
+    def test_staff_request_is_profiled_with_its_sql_timeline(self):
+        url = reverse('event-detail', args=[self.event.id])
+        response = self.get(self.staff, url, HTTP_X_PROFILE='cprofile')
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual((profile.user, profile.method, profile.path, profile.status_code),
+                         (self.staff, 'GET', url, 200))
+        self.assertTrue(any('base_event' in query['sql'] for query in profile.queries))
+        self.assertEqual(profile.query_count, len(profile.queries))
+
+        detail = self.get(self.staff, response['X-Profile-Url'])
+        self.assertEqual(detail.data['queries'], profile.queries)
+        download = self.get(self.staff, detail.data['download_url'])
+        self.assertIn('attachment; filename="profile-', download['Content-Disposition'])
+        stats = marshal.loads(b''.join(download))
+        self.assertTrue(any(name == 'get' and 'views.py' in filename for filename, _, name in stats))
+
+    async def test_profiles_under_asgi(self):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.staff).access_token))()
+        url = reverse('event-detail', args=[self.event.id])
+        response = await self.async_client.get(url, headers={'Authorization': f'Bearer {token}', 'X-Profile': 'cprofile'})
+        self.assertEqual(response.status_code, 200)
+        profile = await RequestProfile.objects.aget(pk=response['X-Profile-Id'])
+        self.assertEqual((profile.path, profile.status_code), (url, 200))
+        self.assertTrue(any('base_event' in query['sql'] for query in profile.queries))
+        stats = marshal.loads(bytes(profile.data))
+        self.assertTrue(any(name == 'get' and 'views.py' in filename for filename, _, name in stats))  # The view's thread
+
+    def test_sampling_profiler_writes_collapsed_stacks(self):
+        sampler = profiling.SamplingProfiler(interval=0.001)
+        sampler.start()
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        sampler.stop()
+        lines = sampler.dump().decode().splitlines()
+        self.assertTrue(lines)
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertIn('test_sampling_profiler_writes_collapsed_stacks', stack.split(';')[-1])
+        self.assertGreater(int(count), 0)
+
+        response = self.get(self.staff, reverse('event-list') + '?profile=sample')
+        self.assertEqual(RequestProfile.objects.get(pk=response['X-Profile-Id']).profiler, 'sample')
+
+    def test_only_staff_within_the_rate_limit(self):
+        url = reverse('event-detail', args=[self.event.id])
+        response = self.get(self.member, url, HTTP_X_PROFILE='cprofile')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.client.credentials()
+        self.assertEqual(self.client.get(url, HTTP_X_PROFILE='cprofile').status_code, 200)
+        self.assertFalse(RequestProfile.objects.exists())
+        self.assertEqual(self.get(self.member, reverse('request-profile-list')).status_code, 403)
+
+        for _ in range(2):
+            self.assertIn('X-Profile-Id', self.get(self.staff, url, HTTP_X_PROFILE='cprofile'))
+        response = self.get(self.staff, url, HTTP_X_PROFILE='cprofile')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Profile'], 'rate-limited')
+        self.assertEqual(RequestProfile.objects.count(), 2)
+
+    def test_old_profiles_are_pruned(self):
+        with override_settings(PROFILING_KEEP=3):
+            for index in range(5):
+                RequestProfile.objects.create(method='GET', path=f'/{index}/', status_code=200, duration_ms=1,
+                                              profiler='sample', query_count=0, data=b'')
+                profiling.prune()
+        self.assertEqual(list(RequestProfile.objects.values_list('path', flat=True)), ['/4/', '/3/', '/2/'])
+
+
+class SeedingTests(TestCase):
+    def seed(self, **options):
+        output = io.StringIO()
+        call_command('seed_synthetic_data', events=30, participants=200, registrations=1000, seed=7,
+                     today=timezone.localdate(), stdout=output, **options)
+        return output.getvalue()
+
+    def loaded(self):
+        """What was seeded, independent of the ids the rows were given."""
+        return {
+            'events': list(Event.objects.order_by('id').values_list('title', 'date', 'time', 'venue', 'charge', 'geohash')),
+            'participants': list(Participant.objects.order_by('id').values_list('name', flat=True)),
+            'registrations': list(Registration.objects.order_by('id').values_list(
+                'event__title', 'participant__name', 'timestamp', 'status')),
+            'bookings': list(Booking.objects.order_by('id').values_list('event__title', 'timestamp', 'booked')),
+        }
+
+    def test_seeding_is_deterministic_and_copy_matches_bulk_create(self):
+        output = self.seed(method='copy')
+        self.assertIn('base_registration:', output)
+        copied = self.loaded()
+        for model in (Booking, Registration, Participant, Event):
+            model.objects.all().delete()
+
+        self.seed(method='orm', batch_size=64)
+        self.assertEqual(self.loaded(), copied)
+
+    def test_distributions(self):
+        self.seed(statuses='confirmed=3,cancelled=1', skew=1.5)
+        self.assertEqual(Event.objects.count(), 30)
+        self.assertEqual(Participant.objects.count(), 200)
+        self.assertAlmostEqual(Registration.objects.count(), 1000, delta=50)
+        self.assertAlmostEqual(Booking.objects.count(), 300, delta=30)
+        self.assertEqual(set(Registration.objects.values_list('status', flat=True)), {'confirmed', 'cancelled'})
+
+        # A heavy head (capped at one registration per participant) and a long thin tail
+        per_event = sorted(Event.objects.annotate(n=models.Count('registration')).values_list('n', flat=True))
+        self.assertEqual(per_event[-1], 200)
+        self.assertLess(per_event[len(per_event) // 2], 20)
+
+        # Sign-ups come before the event, and coordinates match their grid cell
+        for registration in Registration.objects.select_related('event')[:50]:
+            self.assertLess(registration.timestamp.date(), registration.event.date + timedelta(days=1))
+        for event in Event.objects.exclude(latitude=None)[:10]:
+            self.assertEqual(event.geohash, geo.encode(event.latitude, event.longitude))
+
+    def test_bad_options(self):
+        with self.assertRaisesMessage(CommandError, 'Unknown statuses: done'):
+            self.seed(statuses='confirmed=1,done=1')
+
+
+class FastJSONRendererTests(TestCase):
+    def payloads(self):
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        events = [
+            Event.objects.create(title='Jazz \u2028 night \u2029', description='Caf\u00e9 "quotes" \\ \n tabs\t \U0001F3B7',
+                                 date=tomorrow, time='19:30', latitude=-1.2864, longitude=36.8172),
+            Event.objects.create(title='Online', description='', date=tomorrow, time='08:00:00.250000'),
+        ]
+        request = APIRequestFactory().get('/')
+        nairobi = timezone.get_current_timezone()
+        return [
+            EventSerializer(Event.objects.all(), many=True, context={'request': request}).data,
+            EventSerializer(events[0], context={'request': request}).data,
+            {'count': 2, 'next': None, 'results': [{'id': 1, 'ok': True, 'off': False, 'ratio': 0.1, 'big': 2 ** 63 - 1}]},
+            {'error': [ErrorDetail('This field is required.', code='required')], 'detail': ErrorDetail('Nope', code='x')},
+            {
+                'utc': timezone.now().replace(tzinfo=dt_timezone.utc), 'local': timezone.now().astimezone(nairobi),
+                'whole_second': datetime(2024, 1, 1, 10, 0, tzinfo=dt_timezone.utc), 'naive': datetime(2024, 1, 1, 10, 0, 0, 1500),
+                'date': tomorrow, 'time': dt_time(9, 15, 0, 42), 'decimal': Decimal('12.50'), 'uuid': uuid.uuid4(),
+                'lazy': gettext_lazy('Not found.'), 'tuple': (1, 'two'), 'bytes': b'raw', 'delta': timedelta(minutes=90),
+                'queryset': Event.objects.values_list('title', flat=True), 'numpy': numpy.float32(0.5),
+                'nested': [[], {}, [None]], 'float': 1234.5678, 'negative_zero': -0.0,
+                'microseconds': datetime(2024, 1, 1, 10, 0, 0, 123456, tzinfo=dt_timezone.utc),
+                'time_microseconds': dt_time(9, 15, 0, 123456), 'large_floats': [1e16, 1.5e300, 2.0 ** 70],
+            },
+            {'too_big_for_orjson': 2 ** 70, 1: 'int key'}, [], {}, 'text', 0,
+        ]
+
+    def assertSameBytes(self, renderer, media_type=None):
+        for data in self.payloads():
+            with self.subTest(data=data, renderer=renderer):
+                self.assertEqual(renderer.render(data, media_type, {}), JSONRenderer().render(data, media_type, {}))
+
+    def test_output_matches_json_renderer_byte_for_byte(self):
+        self.assertSameBytes(FastJSONRenderer())
+        self.assertSameBytes(FastJSONRenderer(), 'application/json; indent=4')
+        renderer = FastJSONRenderer()
+        renderer.use_orjson = False
+        self.assertSameBytes(renderer)
+
+    @skipUnless(orjson_installed, 'orjson is not installed')
+    def test_orjson_does_the_encoding(self):
+        self.assertTrue(FastJSONRenderer.use_orjson)
+        self.assertEqual(FastJSONRenderer().render({'tiny': 0.00001}, None, {}), b'{"tiny":0.00001}')  # Documented difference
+
+    def test_errors_are_still_raised(self):
+        for data in ({'aware_time': dt_time(9, tzinfo=dt_timezone.utc)}, {'object': object()}):
+            with self.subTest(data=data):
+                with self.assertRaises((TypeError, ValueError)):
+                    FastJSONRenderer().render(data, None, {})
+
+    def test_is_the_default_renderer(self):
+        response = self.client.get(reverse('event-list'))
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+
+
+class QueryCountTests(MediaTestCase):
+    """Pins the number of SQL queries of every route in base/urls.py.
+
+    Each check runs at two fixture sizes (see `grow`), so a query per row (N+1) fails
+    it. If a count changes on purpose, update it here and say why in the commit.
+    """
+    sizes = (3, 12)
+
+    def setUp(self):
+        super().setUp()
+        self.store_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.store_root, ignore_errors=True)
+        settings_override = override_settings(OBJECT_STORE_ROOT=self.store_root, OBJECT_STORE_URL='http://store.test',
+                                               METRICS_DIR=self.store_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.today = timezone.localdate()
+        self.image = ContentAddressedStorage().save('event_images/poster.png', ContentFile(make_png()))
+        self.event = Event.objects.create(title='Launch', description='Launch night', date=self.today + timedelta(days=1),
+                                          latitude=-1.2864, longitude=36.8172, image=self.image)
+        self.participant = Participant.objects.create(name='Amina', email='amina@example.com')
+        self.events, self.participants = [self.event], [self.participant]
+        self.staff = get_user_model().objects.create_user('ops', 'ops@example.com', password_hash='!')
+        self.staff.is_staff = True
+        self.staff.save()
+        self.staff_auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.staff).access_token}'}
+
+    def grow(self, size):
+        """Add events and participants until there are `size` of each.
+
+        The new events are registered for, booked and checked into by the first
+        participant, and similar to the first event; the new participants register
+        for and book the first event.
+        """
+        while len(self.events) < size:
+            index = len(self.events)
+            event = Event.objects.create(
+                title=f'Event {index}', description='-', date=self.today + timedelta(days=index % 3 - 1),
+                latitude=-1.2864 + index / 1000, longitude=36.8172, image=self.image,
+            )
+            registration = Registration.objects.create(event=event, participant=self.participant, status='confirmed')
+            Booking.objects.create(event=event, participant=self.participant, booked=True)
+            SimilarEvent.objects.create(event=self.event, similar=event, score=1 / index)
+            CheckIn.objects.create(kind=CheckIn.REGISTRATION, ticket_id=registration.id, event=event,
+                                   participant=self.participant, scanned_at=timezone.now())
+            EventTombstone.objects.create(event_id=1_000_000 + index)
+            RequestProfile.objects.create(user=self.staff, method='GET', path='/', status_code=200, duration_ms=1,
+                                          profiler='sample', query_count=0, data=b'x')
+            self.events.append(event)
+        while len(self.participants) < size:
+            index = len(self.participants)
+            participant = Participant.objects.create(name=f'Guest {index}', email=f'guest{index}@example.com')
+            Registration.objects.create(event=self.event, participant=participant, status='rsvp')
+            Booking.objects.create(event=self.event, participant=participant, booked=True)
+            self.participants.append(participant)
+
+    def assertQueriesPinned(self, count, request, prepare=lambda: None, status_code=200):
+        """`prepare()` sets up what one request needs (not counted); `request(prepared)` sends it."""
+        for size in self.sizes:
+            with self.captureOnCommitCallbacks(execute=True):  # As if committed before the request
+                self.grow(size)
+                prepared = prepare()
+            with self.subTest(size=size):
+                # On-commit work (live counts, similar events) is counted with the request
+                with self.assertNumQueries(count), self.captureOnCommitCallbacks(execute=True):
+                    response = request(prepared)
+                self.assertEqual(response.status_code, status_code, getattr(response, 'data', None))
+
+    def new_event(self):
+        event = Event.objects.create(title='Doomed', description='-', date=self.today + timedelta(days=2), image=self.image)
+        for participant in self.participants:
+            Registration.objects.create(event=event, participant=participant, status='confirmed')
+            Booking.objects.create(event=event, participant=participant, booked=True)
+        return event
+
+    def new_participant(self):
+        participant = Participant.objects.create(name='Leaving', email=f'leaving{Participant.objects.count()}@example.com')
+        for event in self.events:
+            Registration.objects.create(event=event, participant=participant, status='confirmed')
+            Booking.objects.create(event=event, participant=participant, booked=True)
+        return participant
+
+    def new_email(self):
+        return f'new{Participant.objects.count()}@example.com'
+
+    def test_event_list(self):
+        self.assertQueriesPinned(1, lambda _: self.client.get(reverse('event-list')))
+        self.assertQueriesPinned(1, lambda _: self.client.get(reverse('event-list'), {'ordering': 'popular'}))
+
+    def test_event_detail(self):
+        self.assertQueriesPinned(1, lambda _: self.client.get(reverse('event-detail', args=[self.event.id])))
+
+    def test_event_sync(self):
+        self.assertQueriesPinned(2, lambda _: self.client.get(reverse('event-sync'), {'page_size': 500}))
+
+    def test_past_and_future_events(self):
+        self.assertQueriesPinned(2, lambda _: self.client.get(reverse('past-event-list')))
+        self.assertQueriesPinned(2, lambda _: self.client.get(reverse('future-event-list')))
+
+    def test_nearby_events(self):
+        self.assertQueriesPinned(2, lambda _: self.client.get(reverse('nearby-event-list'),
+                                                              {'lat': -1.2864, 'lng': 36.8172, 'radius': 50}))
+
+    def test_similar_events(self):
+        self.assertQueriesPinned(1, lambda _: self.client.get(reverse('similar-event-list', args=[self.event.id])))
+
+    @override_settings(NOTIFY_BUS_BACKEND='base.notify.InProcessBus')
+    def test_typeahead(self):
+        notify.reset_bus()
+        self.addCleanup(notify.reset_bus)
+        self.addCleanup(typeahead.reset_index)
+        # Built from one query on first use (reset before each request), then answered from memory
+        self.assertQueriesPinned(1, lambda _: self.client.get(reverse('event-typeahead'), {'q': 'ev'}),
+                                 prepare=typeahead.reset_index)
+        self.assertQueriesPinned(0, lambda _: self.client.get(reverse('event-typeahead'), {'q': 'la'}))
+        # No prefix match: one trigram query per kind, where pg_trgm is installed
+        fuzzy_queries = 2 if typeahead.fuzzy_available() else 0
+        self.assertQueriesPinned(fuzzy_queries, lambda _: self.client.get(reverse('event-typeahead'), {'q': 'lanch'}))
+
+    def test_live_counts(self):
+        self.assertQueriesPinned(3, lambda _: self.client.get(reverse('event-live-counts', args=[self.event.id])))
+
+    def test_list_participants(self):
+        self.assertQueriesPinned(2, lambda _: self.client.get(reverse('list-participants', args=[self.event.id])))
+
+    def test_participant_registrations_and_bookings(self):
+        for name in ('participant-registrations', 'participant-bookings'):
+            self.assertQueriesPinned(1, lambda _: self.client.get(reverse(name, args=[self.participant.id])))
+
+    @override_settings(SIMILAR_EVENTS_K=1)
+    def test_create_event(self):
+        # The event, its place in the similar events queue (base.recommendations) and the cache invalidation
+        self.assertQueriesPinned(3, lambda _: self.client.post(reverse('create-event'), {
+            'title': 'Launch party', 'description': 'Launch night', 'date': str(self.today), 'time': '18:00',
+        }, format='json'), status_code=201)
+
+    def test_register_event(self):
+        # On commit: one notification for the caches, two counts and one notification for live counts
+        self.assertQueriesPinned(12, lambda email: self.client.post(reverse('register-event'), {
+            'event_id': self.event.id, 'participant': {'name': 'New', 'email': email},
+        }, format='json'), prepare=self.new_email, status_code=201)
+
+    def test_rsvp_event(self):
+        self.assertQueriesPinned(14, lambda email: self.client.post(reverse('rsvp-event'), {
+            'event_id': self.event.id, 'participant': {'name': 'New', 'email': email},
+        }, format='json'), prepare=self.new_email, status_code=201)
+
+    def test_delete_event(self):
+        self.assertQueriesPinned(23, lambda event: self.client.delete(reverse('delete-event', args=[event.id])),
+                                 prepare=self.new_event, status_code=204)
+
+    def test_delete_participant(self):
+        self.assertQueriesPinned(11, lambda participant: self.client.delete(
+            reverse('delete-participant', args=[participant.id])), prepare=self.new_participant, status_code=204)
+
+    def test_image_upload(self):
+        def new_image():
+            # New content every time, replacing the shared poster (still used by other events)
+            self.event.image = self.image
+            self.event.save(update_fields=['image'])
+            return SimpleUploadedFile('poster.png', make_png((len(self.events), 0, 0)), content_type='image/png')
+
+        # Includes the blob lock, here inside the test transaction the savepoint around the save, and the
+        # cache invalidation on commit
+        self.assertQueriesPinned(16, lambda image: self.client.post(
+            reverse('event-image-upload', args=[self.event.id]), {'image': image}, format='multipart',
+        ), prepare=new_image)
+
+    def test_direct_image_upload(self):
+        url = reverse('event-image-upload-url', args=[self.event.id])
+        self.assertQueriesPinned(1, lambda _: self.client.post(
+            url, {'content_type': 'image/png', 'size': len(make_png())}, format='json'), status_code=201)
+
+        def upload():
+            data = self.client.post(url, {'content_type': 'image/png', 'size': len(make_png())}, format='json').data
+            key = uploads.read_upload_token(data['upload_token'])['key']
+            with open(os.path.join(self.store_root, key), 'wb') as file:
+                file.write(make_png())
+            return data['upload_token']
+
+        os.makedirs(os.path.join(self.store_root, 'incoming', 'events', str(self.event.id)), exist_ok=True)
+        self.assertQueriesPinned(6, lambda token: self.client.post(
+            reverse('event-image-upload-complete', args=[self.event.id]), {'upload_token': token}, format='json',
+        ), prepare=upload)
+
+    def test_checkin_key_and_batch(self):
+        self.assertQueriesPinned(3, lambda _: self.client.get(
+            reverse('event-checkin-key', args=[self.event.id]), **self.staff_auth))
+
+        def scans():
+            now = timezone.now().isoformat()
+            return [{'token': checkin.registration_token(registration), 'scanned_at': now}
+                    for registration in Registration.objects.filter(event=self.event)]
+
+        self.assertQueriesPinned(4, lambda batch: self.client.post(
+            reverse('checkin-batch'), {'scanner': 'door-1', 'scans': batch}, format='json', **self.staff_auth,
+        ), prepare=scans, status_code=201)
+
+    def test_metrics(self):
+        self.assertQueriesPinned(0, lambda _: self.client.get(reverse('request-metrics')))
+
+    def test_request_profiles(self):
+        profile = RequestProfile.objects.create(user=self.staff, method='GET', path='/', status_code=200,
+                                                duration_ms=1, profiler='sample', query_count=0, data=b'x')
+        self.assertQueriesPinned(5, lambda _: self.client.get(reverse('request-profile-list'), **self.staff_auth))
+        self.assertQueriesPinned(3, lambda _: self.client.get(
+            reverse('request-profile-detail', args=[profile.id]), **self.staff_auth))
+        self.assertQueriesPinned(3, lambda _: self.client.get(
+            reverse('request-profile-download', args=[profile.id]), **self.staff_auth))
+
+    def test_printing_tickets_runs_no_queries(self):
+        Registration.objects.create(event=self.event, participant=self.participant, status='confirmed')
+        registration = Registration.objects.get(event=self.event, participant=self.participant)
+        booking = Booking.objects.select_related('participant', 'event').get(
+            pk=Booking.objects.create(event=self.event, participant=self.participant, booked=True).pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(str(registration), f'Participant {self.participant.id} registered for Event {self.event.id}')
+            self.assertEqual(str(booking), 'Amina booked for Launch')  # Names when they were joined
+
+    def test_every_route_is_covered(self):
+        from .urls import urlpatterns
+        tested = {name[len('test_'):] for name in dir(self) if name.startswith('test_')}
+        covered = {
+            'event-list': 'event_list', 'event-detail': 'event_detail', 'event-sync': 'event_sync',
+            'register-event': 'register_event', 'create-event': 'create_event', 'event-image-upload': 'image_upload',
+            'event-image-upload-url': 'direct_image_upload', 'event-image-upload-complete': 'direct_image_upload',
+            'similar-event-list': 'similar_events', 'event-live-counts': 'live_counts',
+            'event-checkin-key': 'checkin_key_and_batch', 'checkin-batch': 'checkin_key_and_batch',
+            'list-participants': 'list_participants', 'past-event-list': 'past_and_future_events',
+            'future-event-list': 'past_and_future_events', 'nearby-event-list': 'nearby_events', 'event-typeahead': 'typeahead',
+            'delete-event': 'delete_event', 'participant-registrations': 'participant_registrations_and_bookings',
+            'participant-bookings': 'participant_registrations_and_bookings', 'delete-participant': 'delete_participant',
+            'request-metrics': 'metrics', 'request-profile-list': 'request_profiles',
+            'request-profile-detail': 'request_profiles', 'request-profile-download': 'request_profiles',
+            'rsvp-event': 'rsvp_event',
+        }
+        self.assertEqual(sorted(pattern.name for pattern in urlpatterns), sorted(covered))
+        self.assertLessEqual(set(covered.values()), tested)
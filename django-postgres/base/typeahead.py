@@ -0,0 +1,218 @@
+# base/typeahead.py
+"""As-you-type suggestions of venues and event titles (the events/typeahead/ endpoint).
+
+Each worker keeps every distinct venue and title in a sorted list, keyed from the start
+of each word: "Sarit Expo Centre" is found by "sar", "expo c" and "cen". A query is a
+binary search plus a scan of at most SCAN_LIMIT keys, so it takes microseconds whatever
+the number of events. Matching ignores case and accents.
+
+The index is built on first use and kept in step by the object cache invalidations
+(base.objectcache), which every worker receives: the events they name are re-read the
+next time the index is searched. In case a message was missed, the index is built again
+from scratch every TYPEAHEAD_REBUILD_SECONDS.
+
+When the prefixes find nothing at all, queries of MIN_FUZZY_LENGTH or more characters
+are answered from Postgres by trigram word similarity, backed by GIN trigram indexes
+(pg_trgm): "arboretm" still finds "Nairobi Arboretum". Any prefix match keeps the query
+in memory, so only typos cost a database round trip. Where the server lacks pg_trgm
+(see migration 0019) only prefixes are matched.
+"""
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Count
+
+from .models import Event
+from .notify import get_bus
+from .objectcache import INVALIDATION_CHANNEL
+
+KINDS = {'venue': 'venue', 'title': 'title'}  # Suggestion kind -> Event field
+SCAN_LIMIT = 200  # Matching keys looked at per query; the best of them are returned
+MIN_FUZZY_LENGTH = 3  # Shorter queries have no trigram to match on
+WORD_START_RE = re.compile(r'(?<!\w)\w')
+
+_index = None
+_building = None  # The index being built, which must not miss changes made meanwhile
+_index_lock = threading.Lock()
+_subscribed = False
+_fuzzy_available = None
+
+
+def normalize(text):
+    """Lower case, without accents, with single spaces."""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ' '.join(''.join(char for char in decomposed if not unicodedata.combining(char)).split())
+
+
+def word_keys(text):
+    """The normalized text from the start of each word on, with whether it is the first word."""
+    normalized = normalize(text)
+    return {(normalized[match.start():], match.start() == 0) for match in WORD_START_RE.finditer(normalized)}
+
+
+class TypeaheadIndex:
+    """Venues and titles of every event, by the start of each of their words."""
+
+    def __init__(self):
+        self.keys = []  # Sorted (key, kind, text, whether the key starts the text)
+        self.uses = Counter()  # (kind, text) -> number of events using it
+        self.events = {}  # event id -> {kind: text}
+        self.dirty = set()  # Ids of events changed since they were indexed
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.built_at = time.monotonic()
+
+    def build(self, rows):
+        """Index (id, title, venue) rows in one go."""
+        keys = []
+        for event_id, title, venue in rows:
+            for kind, text in self.terms(title, venue).items():
+                self.events.setdefault(event_id, {})[kind] = text
+                self.uses[kind, text] += 1
+                if self.uses[kind, text] == 1:
+                    keys += [(key, kind, text, first) for key, first in word_keys(text)]
+        keys.sort()
+        self.keys = keys
+
+    @staticmethod
+    def terms(title, venue):
+        terms = {'title': (title or '').strip(), 'venue': (venue or '').strip()}
+        return {kind: text for kind, text in terms.items() if text}
+
+    def add(self, event_id, title, venue):
+        terms = self.terms(title, venue)
+        if terms:
+            self.events[event_id] = terms
+        for kind, text in terms.items():
+            self.uses[kind, text] += 1
+            if self.uses[kind, text] == 1:
+                for key, first in word_keys(text):
+                    bisect.insort(self.keys, (key, kind, text, first))
+
+    def remove(self, event_id):
+        for kind, text in self.events.pop(event_id, {}).items():
+            self.uses[kind, text] -= 1
+            if self.uses[kind, text] > 0:
+                continue
+            del self.uses[kind, text]
+            for key, first in word_keys(text):
+                position = bisect.bisect_left(self.keys, (key, kind, text, first))
+                if position < len(self.keys) and self.keys[position] == (key, kind, text, first):
+                    del self.keys[position]
+
+    def mark_changed(self, event_ids):
+        with self.lock:
+            self.dirty.update(event_ids)
+
+    def refresh(self):
+        """Re-read the events changed since they were indexed."""
+        # One refresh at a time, so an older read is never applied after a newer one
+        if not self.dirty or not self.refresh_lock.acquire(blocking=False):
+            return
+        try:
+            with self.lock:
+                changed, self.dirty = self.dirty, set()
+            rows = list(Event.objects.filter(pk__in=changed).values_list('id', 'title', 'venue'))
+            with self.lock:
+                for event_id in changed:
+                    self.remove(event_id)
+                for row in rows:
+                    self.add(*row)
+        finally:
+            self.refresh_lock.release()
+
+    def search(self, query, kind=None, limit=10):
+        """Suggestions with a word starting with `query`: those starting with it first, then the most used."""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        matches = {}
+        with self.lock:
+            position = bisect.bisect_left(self.keys, (prefix,))
+            for key, entry_kind, text, first in self.keys[position:position + SCAN_LIMIT]:
+                if not key.startswith(prefix):
+                    break
+                if kind is None or entry_kind == kind:
+                    # Texts starting with the query come before those matching a later word
+                    rank = (not first, -self.uses[entry_kind, text], text.casefold())
+                    if (entry_kind, text) not in matches or rank < matches[entry_kind, text]:
+                        matches[entry_kind, text] = rank
+        ranked = sorted(matches, key=matches.get)[:limit]
+        return [{'kind': entry_kind, 'text': text, 'events': self.uses[entry_kind, text], 'match': 'prefix'}
+                for entry_kind, text in ranked]
+
+
+def invalidated(payload):
+    """Object cache invalidation (from any worker): the named events need re-reading."""
+    if payload.get('cache') != 'event':
+        return
+    for index in {_index, _building} - {None}:
+        index.mark_changed(payload.get('pks', []))
+
+
+def get_index():
+    """This worker's index, built on first use and again once older than TYPEAHEAD_REBUILD_SECONDS."""
+    global _index, _building, _subscribed
+    index = _index
+    max_age = getattr(settings, 'TYPEAHEAD_REBUILD_SECONDS', 3600)
+    if index is not None and time.monotonic() - index.built_at < max_age:
+        index.refresh()
+        return index
+    with _index_lock:
+        if _index is index:  # Not rebuilt by another thread meanwhile
+            if not _subscribed:
+                get_bus().subscribe(INVALIDATION_CHANNEL, invalidated)  # Before reading: no change is missed
+                _subscribed = True
+            _building = TypeaheadIndex()
+            try:
+                _building.build(Event.objects.values_list('id', 'title', 'venue').order_by().iterator(chunk_size=5000))
+                _index = _building
+            finally:
+                _building = None
+        _index.refresh()  # Changes made while it was being built
+        return _index
+
+
+def reset_index():
+    global _index, _building, _subscribed, _fuzzy_available
+    with _index_lock:
+        _index, _building, _subscribed, _fuzzy_available = None, None, False, None
+
+
+def fuzzy_available():
+    global _fuzzy_available
+    if _fuzzy_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _fuzzy_available = cursor.fetchone() is not None
+    return _fuzzy_available
+
+
+def fuzzy_search(query, kind=None, limit=10):
+    """Venues and titles containing a word similar to `query`, most similar first (pg_trgm)."""
+    results = []
+    for entry_kind, field in KINDS.items():
+        if kind not in (None, entry_kind):
+            continue
+        rows = (Event.objects.filter(**{f'{field}__trigram_word_similar': query})
+                .values(field).annotate(events=Count('id'), score=TrigramWordSimilarity(query, field))
+                .order_by('-score', field)[:limit])
+        results += [(row['score'], entry_kind, row[field], row['events']) for row in rows]
+    results.sort(key=lambda result: (-result[0], result[2]))
+    return [{'kind': entry_kind, 'text': text, 'events': events, 'match': 'fuzzy'}
+            for _, entry_kind, text, events in results[:limit]]
+
+
+def suggest(query, kind=None, limit=10):
+    """Prefix matches, or fuzzy matches when there are none."""
+    results = get_index().search(query, kind, limit)
+    if not results and len(normalize(query)) >= MIN_FUZZY_LENGTH and fuzzy_available():
+        results = fuzzy_search(query, kind, limit)
+    return results
@@ -0,0 +1,165 @@
+# base/uploads.py
+import os
+import tempfile
+import time
+import uuid
+from urllib.parse import parse_qs, urlencode
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.module_loading import import_string
+
+UPLOAD_TOKEN_SALT = 'base.uploads.upload-token'
+PUT_SIGNATURE_SALT = 'base.uploads.put'
+CHUNK_SIZE = 64 * 1024
+
+
+def get_object_store():
+    return import_string(getattr(settings, 'OBJECT_STORE_BACKEND', 'base.uploads.LocalObjectStore'))()
+
+
+def upload_ttl():
+    return getattr(settings, 'OBJECT_STORE_UPLOAD_TTL', 15 * 60)
+
+
+def new_upload_key(event_id):
+    return f'incoming/events/{event_id}/{uuid.uuid4().hex}'
+
+
+def make_upload_token(event_id, key, content_type):
+    """Opaque token the client hands back on completion, tying an uploaded object to one event."""
+    return signing.dumps({'event': event_id, 'key': key, 'content_type': content_type}, salt=UPLOAD_TOKEN_SALT)
+
+
+def read_upload_token(token):
+    """Payload of a token from `make_upload_token`; raises signing.BadSignature when forged or expired."""
+    return signing.loads(token, salt=UPLOAD_TOKEN_SALT, max_age=upload_ttl() * 2)
+
+
+class LocalObjectStore:
+    """Filesystem stand-in for an S3-style object store.
+
+    `presign_put` hands out URLs in the same shape a real store would: the key in the
+    path, and the expiry, allowed content type, size limit and an HMAC in the query
+    string. `LocalObjectStoreApp` accepts PUTs against them, so the whole direct-upload
+    flow runs offline. Another store only needs the same five methods.
+    """
+
+    def __init__(self, root=None, base_url=None):
+        self.root = str(root or settings.OBJECT_STORE_ROOT)
+        self.base_url = (base_url or settings.OBJECT_STORE_URL).rstrip('/')
+
+    def signature(self, key, content_type, max_size, expires):
+        message = f'PUT\n{key}\n{content_type}\n{max_size}\n{expires}'
+        return salted_hmac(PUT_SIGNATURE_SALT, message, algorithm='sha256').hexdigest()
+
+    def presign_put(self, key, content_type, max_size, expires_in):
+        expires = int(time.time()) + expires_in
+        query = urlencode({
+            'content-type': content_type,
+            'max-size': max_size,
+            'expires': expires,
+            'signature': self.signature(key, content_type, max_size, expires),
+        })
+        return f'{self.base_url}/{key}?{query}', expires
+
+    def verify_put(self, key, query_string, content_type):
+        """Return the size limit of a valid signed PUT, or None when it must be refused."""
+        params = {name: values[0] for name, values in parse_qs(query_string).items()}
+        try:
+            max_size, expires = int(params['max-size']), int(params['expires'])
+            signed_type, signature = params['content-type'], params['signature']
+        except (KeyError, ValueError):
+            return None
+        if not constant_time_compare(signature, self.signature(key, signed_type, max_size, expires)):
+            return None
+        if expires < time.time() or signed_type != content_type:
+            return None
+        return max_size
+
+    def path(self, key):
+        return safe_join(self.root, key)
+
+    def write(self, key, stream, length):
+        """Stream `length` bytes into the object at `key`; it only appears once complete."""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as temporary:
+            try:
+                remaining = length
+                while remaining:
+                    chunk = stream.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise OSError('Upload ended early')
+                    temporary.write(chunk)
+                    remaining -= len(chunk)
+            except BaseException:
+                os.unlink(temporary.name)
+                raise
+        os.replace(temporary.name, path)
+
+    def size(self, key):
+        """Size of the object at `key`, or None if there is none."""
+        try:
+            return os.path.getsize(self.path(key))
+        except (SuspiciousFileOperation, OSError):
+            return None
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def delete(self, key):
+        try:
+            os.unlink(self.path(key))
+        except (SuspiciousFileOperation, FileNotFoundError):
+            pass
+
+
+class LocalObjectStoreApp:
+    """WSGI app serving signed PUTs for LocalObjectStore (see `manage.py run_object_store`).
+
+    It runs outside Django's request cycle, so the bytes never pass through the API
+    workers, just as with a real object store.
+    """
+    cors_headers = [
+        ('Access-Control-Allow-Origin', '*'),
+        ('Access-Control-Allow-Methods', 'PUT, OPTIONS'),
+        ('Access-Control-Allow-Headers', 'Content-Type'),
+    ]
+
+    def __init__(self, store=None):
+        self.store = store or LocalObjectStore()
+
+    def __call__(self, environ, start_response):
+        method = environ['REQUEST_METHOD']
+        if method == 'OPTIONS':
+            return self.respond(start_response, '204 No Content')
+        if method != 'PUT':
+            return self.respond(start_response, '405 Method Not Allowed', b'Only signed PUT uploads are accepted')
+
+        key = environ.get('PATH_INFO', '').lstrip('/')
+        max_size = self.store.verify_put(key, environ.get('QUERY_STRING', ''), environ.get('CONTENT_TYPE', ''))
+        if max_size is None:
+            return self.respond(start_response, '403 Forbidden', b'Invalid or expired signature')
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or '')
+        except ValueError:
+            return self.respond(start_response, '411 Length Required', b'Content-Length is required')
+        if length > max_size:
+            return self.respond(start_response, '413 Content Too Large', b'Upload exceeds the signed size limit')
+        try:
+            self.store.write(key, environ['wsgi.input'], length)
+        except SuspiciousFileOperation:
+            return self.respond(start_response, '403 Forbidden', b'Invalid key')
+        except OSError:
+            return self.respond(start_response, '400 Bad Request', b'Incomplete upload')
+        return self.respond(start_response, '200 OK')
+
+    def respond(self, start_response, status, body=b''):
+        start_response(status, self.cors_headers + [
+            ('Content-Type', 'text/plain'), ('Content-Length', str(len(body))),
+        ])
+        return [body]
@@ -2,20 +2,38 @@ from django.urls import path
 from .views import (
     EventList, EventDetail, RegisterEvent, CreateEvent,
     ListParticipants, PastEventList, FutureEventList,
-    DeleteEvent, DeleteParticipant, RSVPEvent, EventImageUploadView
+    DeleteEvent, DeleteParticipant, RSVPEvent, EventImageUploadView, EventImageUploadUrl, EventImageUploadComplete,
+    NearbyEventList, EventTypeahead, SimilarEventList, ParticipantRegistrationList, ParticipantBookingList,
+    EventLiveCounts, EventSync, EventCheckInKey, CheckInBatch, RequestMetrics,
+    RequestProfileList, RequestProfileDetail, RequestProfileDownload
 )
 
 urlpatterns = [
     path('events/', EventList.as_view(), name='event-list'),  # List all events
     path('events/<int:pk>/', EventDetail.as_view(), name='event-detail'),  # Retrieve a specific event
+    path('events/sync/', EventSync.as_view(), name='event-sync'),  # Events changed or deleted since a cursor
     path('register/', RegisterEvent.as_view(), name='register-event'),  # Register a participant for an event
     path('events/create/', CreateEvent.as_view(), name='create-event'),  # Create a new event
     path('events/<int:event_id>/upload-image/', EventImageUploadView.as_view(), name='event-image-upload'),  # Upload image for a specific event
+    path('events/<int:event_id>/image-upload-url/', EventImageUploadUrl.as_view(), name='event-image-upload-url'),  # Signed URL for a direct image upload
+    path('events/<int:event_id>/image-upload-complete/', EventImageUploadComplete.as_view(), name='event-image-upload-complete'),  # Attach a direct upload
+    path('events/<int:pk>/similar/', SimilarEventList.as_view(), name='similar-event-list'),  # List events similar to a specific event
+    path('events/<int:pk>/live/', EventLiveCounts.as_view(), name='event-live-counts'),  # Live counts over Server-Sent Events
+    path('events/<int:pk>/checkin-key/', EventCheckInKey.as_view(), name='event-checkin-key'),  # Key for offline token checks (staff)
+    path('checkins/', CheckInBatch.as_view(), name='checkin-batch'),  # Batched scan upload (staff)
     path('events/<int:pk>/participants/', ListParticipants.as_view(), name='list-participants'),  # List participants of a specific event
     path('events/past/', PastEventList.as_view(), name='past-event-list'),  # List past events
     path('events/future/', FutureEventList.as_view(), name='future-event-list'),  # List future events
+    path('events/nearby/', NearbyEventList.as_view(), name='nearby-event-list'),  # List events near a point, nearest first
+    path('events/typeahead/', EventTypeahead.as_view(), name='event-typeahead'),  # Venue and title suggestions as you type
     path('events/<int:pk>/delete/', DeleteEvent.as_view(), name='delete-event'),  # Delete an event
+    path('participants/<int:pk>/registrations/', ParticipantRegistrationList.as_view(), name='participant-registrations'),  # A participant's registrations
+    path('participants/<int:pk>/bookings/', ParticipantBookingList.as_view(), name='participant-bookings'),  # A participant's bookings
     path('participants/<int:pk>/delete/', DeleteParticipant.as_view(), name='delete-participant'),  # Delete a participant
+    path('metrics/', RequestMetrics.as_view(), name='request-metrics'),  # Request metrics in the Prometheus text format
+    path('profiles/', RequestProfileList.as_view(), name='request-profile-list'),  # Request profiles taken by staff
+    path('profiles/<int:pk>/', RequestProfileDetail.as_view(), name='request-profile-detail'),  # A profile's SQL timeline (staff)
+    path('profiles/<int:pk>/download/', RequestProfileDownload.as_view(), name='request-profile-download'),  # The profile file (staff)
     path('events/rsvp/', RSVPEvent.as_view(), name='rsvp-event'),
     # path('events/book/', BookEvent.as_view(), name='book-event'),
 ]
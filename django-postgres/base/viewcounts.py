@@ -0,0 +1,113 @@
+# base/viewcounts.py
+"""Event view counts (Event.view_count), buffered per worker.
+
+EventDetail calls `record(event_id)`, which only adds to a counter in memory. A thread
+writes the counts every EVENT_VIEWS_FLUSH_SECONDS, and once more at exit, with one
+statement for all the events viewed meanwhile:
+
+    UPDATE base_event SET view_count = base_event.view_count + v.views
+    FROM (VALUES (12, 3), (40, 1), ...) AS v (id, views) WHERE base_event.id = v.id
+
+A worker that crashes loses the views of at most one interval; a write that fails is
+retried with the next one. The counts rank events (`?ordering=popular` on the event
+list) and are approximate by design.
+
+view_count is written here only. Event.save() leaves it out of its UPDATE, so saving an instance read
+before a flush cannot undo the flush. Flushes do not touch updated_at or the object
+cache (base.objectcache): synced and cached events show a count that may be older.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+from .models import Event
+
+logger = logging.getLogger(__name__)
+
+
+def write_views(rows):
+    """Add `(event id, views)` rows to the events' counts, in one UPDATE."""
+    table = connection.ops.quote_name(Event._meta.db_table)
+    values = ', '.join(['(%s, %s)'] * len(rows))
+    # Ordered by id, so two workers flushing at once lock the rows in the same order
+    params = [value for row in sorted(rows) for value in row]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET view_count = {table}.view_count + v.views '
+            f'FROM (VALUES {values}) AS v (id, views) WHERE {table}.id = v.id',
+            params,
+        )
+
+
+class ViewCounter:
+    """The views of this process not written yet."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = Counter()  # event id -> views
+        self.database = None  # Name of the database the pending views were recorded against
+        self.pid = None
+        self.flusher = None
+
+    def start(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            # First use, or a forked child: the parent's views are the parent's to write
+            self.pending = Counter()
+            self.pid = os.getpid()
+        interval = getattr(settings, 'EVENT_VIEWS_FLUSH_SECONDS', 10)
+        if interval > 0:
+            self.flusher = threading.Thread(target=self.flush_periodically, args=(interval,),
+                                            name='event-views-flusher', daemon=True)
+            self.flusher.start()
+        atexit.register(self.flush)
+
+    def record(self, event_id):
+        if self.pid != os.getpid():
+            self.start()
+        with self.lock:
+            if not self.pending:
+                self.database = connection.settings_dict['NAME']
+            self.pending[event_id] += 1
+
+    def flush(self):
+        """Write the pending views; returns how many events they were for."""
+        with self.lock:
+            pending, database, self.pending = self.pending, self.database, Counter()
+        if not pending:
+            return 0
+        if database != connection.settings_dict['NAME']:
+            return 0  # Recorded in a test database that has been dropped since
+        try:
+            write_views(list(pending.items()))
+        except DatabaseError:
+            logger.exception('Writing the views of %d events failed; retrying with the next flush', len(pending))
+            with self.lock:
+                self.pending.update(pending)
+                self.database = database
+            return 0
+        return len(pending)
+
+    def flush_periodically(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing event views failed')  # The thread must live on
+            finally:
+                connection.close()  # This thread's own connection, not kept open between flushes
+
+
+counter = ViewCounter()
+
+
+def record(event_id):
+    counter.record(event_id)
@@ -1,17 +1,43 @@
 # base/views.py
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework import generics, status
 from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.utils.timezone import make_aware
 from drf_yasg.utils import swagger_auto_schema
 from datetime import datetime
+from django.db import transaction
 from django.db.models import Q
-from .models import Event, Participant, Registration, Booking
-from .serializers import EventSerializer, ParticipantSerializer, RegistrationSerializer, RSVPSerializer, BookingSerializer, EventImageUploadSerializer
+from functools import reduce
+import operator
+from . import geo
+from .models import Event, Participant, Registration, Booking, SimilarEvent, RequestProfile
+from .serializers import (
+    EventSerializer, ParticipantSerializer, RegistrationSerializer, RSVPSerializer, BookingSerializer,
+    EventImageUploadSerializer, NearbyEventSerializer, NearbyQuerySerializer, SimilarEventSerializer,
+    ParticipantRegistrationSerializer, ParticipantBookingSerializer,
+    ImageUploadUrlSerializer, ImageUploadCompleteSerializer, IMAGE_UPLOAD_TYPES, SyncQuerySerializer,
+    CheckInBatchSerializer, RequestProfileSerializer, RequestProfileDetailSerializer, TypeaheadQuerySerializer,
+    EventListQuerySerializer
+)
+from . import uploads
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.files.storage import default_storage
+import asyncio
+import base64
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views import View
+from . import checkin, live, metrics, objectcache, sync, typeahead, viewcounts
+from .pagination import TimestampCursorPagination
 from rest_framework.parsers import MultiPartParser, FormParser
 import logging
 
@@ -20,16 +46,99 @@ class AuthenticatedAPIView(APIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [AllowAny]
 
-class EventList(AuthenticatedAPIView, generics.ListAPIView):
-    """View to list all events."""
+class EventFieldsMixin:
+    """Sparse fieldsets for event endpoints.
+
+    `?fields=id,title,date` limits the response to those fields and the query to the
+    matching columns (via `.only()`). Without it, `default_excluded_fields` are left out
+    of both; list views use this to skip the unbounded description.
+    """
+    fields_query_param = 'fields'
+    default_excluded_fields = ()
+    required_model_fields = ('id',)
+    # Serializer-only fields and the model fields they are computed from
+    computed_field_sources = {'image_url': ['image'], 'distance_km': [], 'similarity': []}
+
+    def get_event_fields(self):
+        if not hasattr(self, '_event_fields'):
+            available = self.serializer_class.Meta.fields
+            requested = self.request.query_params.get(self.fields_query_param)
+            if requested:
+                fields = [name.strip() for name in requested.split(',') if name.strip()]
+                unknown = [name for name in fields if name not in available]
+                if unknown:
+                    raise ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}"})
+            else:
+                fields = [name for name in available if name not in self.default_excluded_fields]
+            self._event_fields = fields
+        return self._event_fields
+
+    def select_event_fields(self, queryset, prefix='', extra=()):
+        """Load only the columns the selected fields need (plus `extra` columns of a related model)."""
+        model_fields = set(self.required_model_fields)
+        for name in self.get_event_fields():
+            model_fields.update(self.computed_field_sources.get(name, [name]))
+        return queryset.only(*extra, *(prefix + name for name in sorted(model_fields)))
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_event_fields())
+        return super().get_serializer(*args, **kwargs)
+
+class EventList(EventFieldsMixin, AuthenticatedAPIView, generics.ListAPIView):
+    """View to list all events, by date or (`?ordering=popular`) most viewed first."""
     queryset = Event.objects.all()
     serializer_class = EventSerializer
+    default_excluded_fields = ('description',)
+
+    @swagger_auto_schema(query_serializer=EventListQuerySerializer)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        params = EventListQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = self.select_event_fields(super().get_queryset())
+        if params.validated_data['ordering'] == 'popular':
+            queryset = queryset.order_by('-view_count', 'id')  # event_popular_idx
+        return queryset
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
-        serializer = EventSerializer(queryset, many=True, context={'request': request})
+        serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+class EventSync(EventFieldsMixin, AuthenticatedAPIView, generics.GenericAPIView):
+    """View to fetch the events created, changed or deleted since a sync cursor.
+
+    Without `cursor` it starts a full sync. Keep calling with the returned cursor while
+    `has_more` is true; store the last cursor for the next launch. A 410 means the
+    cursor is too old to be continued and the client should sync from scratch.
+    """
+    serializer_class = EventSerializer
+    pagination_class = None  # Paged by the sync cursor, not the default page numbers
+    required_model_fields = ('id', 'updated_at')  # The cursor is built from these
+
+    @swagger_auto_schema(query_serializer=SyncQuerySerializer)
+    def get(self, request):
+        params = SyncQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        try:
+            cursor = sync.SyncCursor.decode(params.validated_data.get('cursor'))
+        except ValueError:
+            raise ValidationError({"cursor": ["Invalid sync cursor."]})
+        if cursor.is_expired():
+            return Response({"detail": "Sync cursor has expired, sync again without a cursor.", "reset": True},
+                            status=status.HTTP_410_GONE)
+
+        queryset = self.select_event_fields(Event.objects.all())
+        page = sync.sync_page(cursor, params.validated_data['page_size'], queryset=queryset)
+        return Response({
+            "changed": self.get_serializer(page.changed, many=True).data,
+            "deleted": page.deleted,
+            "cursor": page.cursor.encode(),
+            "has_more": page.has_more,
+        })
+
 class CreateEvent(AuthenticatedAPIView, generics.CreateAPIView):
     """View to create a new event."""
     queryset = Event.objects.all()
@@ -39,24 +148,155 @@ class EventImageUploadView(APIView):
     parser_classes = (MultiPartParser, FormParser)
 
     def post(self, request, event_id):
-        event = get_object_or_404(Event, id=event_id)
+        event = objectcache.events.get_or_404(event_id)
         serializer = EventImageUploadSerializer(data=request.data)
 
         if serializer.is_valid():
             image = serializer.validated_data['image']
             event.image = image
-            event.save()
+            with transaction.atomic():  # The blob is stored and referenced under its lock (base.blobs)
+                event.save(update_fields=['image'])
             return Response({"message": "Image uploaded successfully"}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class EventDetail(AuthenticatedAPIView, generics.RetrieveAPIView):
+class EventImageUploadUrl(APIView):
+    """Step 1 of a direct upload: a short-lived signed URL to PUT the image to the object store."""
+
+    @swagger_auto_schema(request_body=ImageUploadUrlSerializer)
+    def post(self, request, event_id):
+        objectcache.events.get_or_404(event_id)
+        serializer = ImageUploadUrlSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        content_type = serializer.validated_data['content_type']
+
+        key = uploads.new_upload_key(event_id)
+        upload_url, expires = uploads.get_object_store().presign_put(
+            key, content_type, serializer.validated_data['size'], uploads.upload_ttl(),
+        )
+        return Response({
+            "upload_url": upload_url,
+            "method": "PUT",
+            "headers": {"Content-Type": content_type},
+            "expires_at": datetime.fromtimestamp(expires, tz=timezone.get_current_timezone()),
+            "upload_token": uploads.make_upload_token(event_id, key, content_type),
+        }, status=status.HTTP_201_CREATED)
+
+class EventImageUploadComplete(APIView):
+    """Step 2 of a direct upload: attach the uploaded object to the event."""
+
+    @swagger_auto_schema(request_body=ImageUploadCompleteSerializer)
+    def post(self, request, event_id):
+        event = objectcache.events.get_or_404(event_id)
+        serializer = ImageUploadCompleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            upload = uploads.read_upload_token(serializer.validated_data['upload_token'])
+        except signing.BadSignature:
+            raise ValidationError({"upload_token": ["Invalid or expired upload token."]})
+        if upload['event'] != event.id:
+            raise ValidationError({"upload_token": ["This upload belongs to another event."]})
+
+        store = uploads.get_object_store()
+        if store.size(upload['key']) is None:
+            raise ValidationError({"upload_token": ["Nothing has been uploaded for this token."]})
+        expected_format, extension = IMAGE_UPLOAD_TYPES[upload['content_type']]
+        from PIL import Image, UnidentifiedImageError  # Only needed here; keeps Pillow out of worker startup
+        with store.open(upload['key']) as file:
+            try:
+                # Only the header is parsed, the pixels are never decoded
+                image_format = Image.open(file).format
+            except (UnidentifiedImageError, Image.DecompressionBombError):
+                image_format = None
+            if image_format != expected_format:
+                store.delete(upload['key'])
+                raise ValidationError({"upload_token": ["The uploaded file is not a valid image."]})
+            file.seek(0)
+            with transaction.atomic():  # The blob is stored and referenced under its lock (base.blobs)
+                event.image = default_storage.save(f'event_images/upload{extension}', File(file))
+                event.save(update_fields=['image'])
+        store.delete(upload['key'])
+        return Response({"message": "Image uploaded successfully", "image": event.image.name}, status=status.HTTP_200_OK)
+
+class EventDetail(EventFieldsMixin, AuthenticatedAPIView, generics.RetrieveAPIView):
     """View to retrieve details of a specific event."""
     queryset = Event.objects.all()
     serializer_class = EventSerializer
 
+    def get_object(self):
+        # From the cache, which holds every column: `?fields=` only trims the serialized response here
+        event = objectcache.events.get_or_404(self.kwargs['pk'])
+        self.check_object_permissions(self.request, event)
+        return event
+
     def get(self, request, *args, **kwargs):
         event_instance = self.get_object()
-        serializer = EventSerializer(event_instance, context={'request': request})
+        viewcounts.record(event_instance.id)  # In memory; written in batches
+        serializer = self.get_serializer(event_instance)
+        return Response(serializer.data)
+
+class EventTypeahead(AuthenticatedAPIView):
+    """View suggesting venues and event titles for what has been typed so far.
+
+    Prefix matches come from this worker's in-memory index (base.typeahead); only when
+    there are none are fuzzy matches looked up in the database.
+    """
+
+    @swagger_auto_schema(query_serializer=TypeaheadQuerySerializer)
+    def get(self, request):
+        params = TypeaheadQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+        return Response({"results": typeahead.suggest(data['q'], data.get('kind'), data['limit'])})
+
+class NearbyEventList(EventFieldsMixin, AuthenticatedAPIView, generics.ListAPIView):
+    """View to list events within `radius` km of `lat`/`lng`, nearest first."""
+    serializer_class = NearbyEventSerializer
+    default_excluded_fields = ('description',)
+    max_results = 1000  # Nearest events a search can page through
+
+    @swagger_auto_schema(query_serializer=NearbyQuerySerializer)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        params = NearbyQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        lat = params.validated_data['lat']
+        lng = params.validated_data['lng']
+        radius = params.validated_data['radius']
+
+        # Index scan over the grid cells covering the circle, narrowed by a bounding box
+        cells = geo.covering_cells(lat, lng, radius)
+        queryset = Event.objects.filter(reduce(operator.or_, (Q(geohash__startswith=cell) for cell in cells)))
+        queryset = self.select_event_fields(queryset)
+        min_lat, max_lat, min_lng, max_lng = geo.bounding_box(lat, lng, radius)
+        queryset = queryset.filter(latitude__gte=min_lat, latitude__lte=max_lat)
+        if min_lng is not None:
+            queryset = queryset.filter(longitude__gte=min_lng, longitude__lte=max_lng)
+
+        # Exact distance of the remaining candidates, sorted and paged by the database
+        queryset = (queryset.annotate(distance_km=geo.haversine_expression(lat, lng))
+                    .filter(distance_km__lte=radius).order_by('distance_km', 'id'))
+        return queryset[:self.max_results]
+
+class SimilarEventList(EventFieldsMixin, AuthenticatedAPIView, generics.GenericAPIView):
+    """View to list the precomputed events most similar to an event."""
+    serializer_class = SimilarEventSerializer
+    default_excluded_fields = ('description',)
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):  # Schema generation: no event in the URL
+            return SimilarEvent.objects.none()
+        # One index lookup on (event, -score) joined to the similar events
+        rows = SimilarEvent.objects.filter(event_id=self.kwargs['pk']).select_related('similar').order_by('-score')
+        return self.select_event_fields(rows, prefix='similar__', extra=('score', 'similar'))
+
+    def get(self, request, pk):
+        events = []
+        for row in self.get_queryset():
+            row.similar.similarity = row.score
+            events.append(row.similar)
+        serializer = self.get_serializer(events, many=True)
         return Response(serializer.data)
 
 class RegisterEvent(AuthenticatedAPIView):
@@ -67,7 +307,7 @@ class RegisterEvent(AuthenticatedAPIView):
         event_id = request.data.get('event_id')
         participant_data = request.data.get('participant')
 
-        event = get_object_or_404(Event, pk=event_id)
+        event = objectcache.events.get_or_404(event_id)
 
         # Check if the event date and time have passed
         event_datetime = make_aware(
@@ -81,8 +321,8 @@ class RegisterEvent(AuthenticatedAPIView):
         participant_serializer = ParticipantSerializer(data=participant_data)
         if participant_serializer.is_valid():
             participant_email = participant_data['email']
-            participant, created = Participant.objects.get_or_create(
-                email=participant_email,
+            participant, created = objectcache.participants.get_or_create(
+                participant_email,
                 defaults=participant_serializer.validated_data
             )
 
@@ -91,14 +331,10 @@ class RegisterEvent(AuthenticatedAPIView):
                 return Response({"error": "Participant is already registered for this event."},
                                 status=status.HTTP_400_BAD_REQUEST)
 
-            # Create registration using RegistrationSerializer
-            registration_data = {'event': event.id, 'participant': participant.id}
-            registration_serializer = RegistrationSerializer(data=registration_data)
-            if registration_serializer.is_valid():
-                registration_serializer.save()
-                return Response(registration_serializer.data, status=status.HTTP_201_CREATED)
-
-            return Response(registration_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            # Event and participant are already resolved, so create the registration directly
+            # (RegistrationSerializer expects nested participant data, not ids)
+            registration = Registration.objects.create(event=event, participant=participant)
+            return Response(RegistrationSerializer(registration).data, status=status.HTTP_201_CREATED)
 
         return Response(participant_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -115,6 +351,159 @@ class ListParticipants(AuthenticatedAPIView, generics.ListAPIView):
         else:
             return Participant.objects.none()
         
+class EventCheckInKey(AuthenticatedAPIView):
+    """View giving staff scanners the key to verify an event's check-in tokens offline."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, pk):
+        event = objectcache.events.get_or_404(pk)
+        return Response({
+            "event": event.id,
+            "algorithm": "HMAC-SHA256",
+            "signature_bytes": checkin.SIGNATURE_BYTES,
+            "key": base64.urlsafe_b64encode(checkin.event_key(event.id)).decode(),
+        })
+
+class CheckInBatch(AuthenticatedAPIView):
+    """View recording a batch of scans uploaded by a staff scanner, in one insert.
+
+    Returns how many check-ins were new (`recorded`) or repeats (`duplicates`), and the
+    positions of scans with a bad token or timestamp (`invalid`) and of tickets cancelled
+    since they were issued (`revoked`). Uploading the same scans again is harmless.
+    """
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(request_body=CheckInBatchSerializer)
+    def post(self, request):
+        serializer = CheckInBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = checkin.record_scans(serializer.validated_data['scans'], serializer.validated_data['scanner'])
+        return Response(result, status=status.HTTP_201_CREATED)
+
+class EventLiveCounts(View):
+    """Server-Sent Events stream of an event's registration, RSVP and booking counts.
+
+    Sends the current counts, then every change as it is committed, with a comment line
+    as heartbeat. The stream stays open under ASGI, which the web process runs (gunicorn
+    with uvicorn workers, see the Procfile). Under WSGI it sends the counts once and lets
+    EventSource reconnect after `retry_ms`.
+    """
+    heartbeat_seconds = 15
+    retry_ms = 5000
+
+    async def get(self, request, pk):
+        if not await Event.objects.filter(pk=pk).aexists():
+            raise Http404("Event not found")
+        if isinstance(request, ASGIRequest):
+            content = self.stream(pk)
+        else:
+            content = [f"retry: {self.retry_ms}\n", live.format_sse(await sync_to_async(live.seat_counts)(pk))]
+        response = StreamingHttpResponse(content, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+        return response
+
+    async def stream(self, event_id):
+        broadcaster = live.get_broadcaster()
+        subscription = broadcaster.subscribe(event_id)  # Before counting, so no change is missed
+        try:
+            yield f"retry: {self.retry_ms}\n"
+            yield live.format_sse(await sync_to_async(live.seat_counts)(event_id))
+            while True:
+                try:
+                    payload = await asyncio.wait_for(subscription.queue.get(), self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield live.format_sse(payload)
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+class RequestMetrics(View):
+    """Per-route latency, SQL query and response size histograms (and other counters) of all workers, for Prometheus.
+
+    Open unless METRICS_TOKEN is set; scrapers then send `Authorization: Token <METRICS_TOKEN>`
+    (Prometheus: `authorization: {type: Token, credentials: ...}`). Not Bearer, which
+    TokenValidationMiddleware reserves for JWTs.
+    """
+
+    def get(self, request):
+        token = getattr(settings, 'METRICS_TOKEN', None)
+        if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Token {token}'):
+            return HttpResponse(status=401, headers={'WWW-Authenticate': 'Token'})
+        body = metrics.render(*metrics.registry.collect())
+        return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+class RequestProfileList(AuthenticatedAPIView, generics.ListAPIView):
+    """View listing the request profiles staff have taken, newest first (see base.profiling)."""
+    permission_classes = [IsAdminUser]
+    serializer_class = RequestProfileSerializer
+
+    def get_queryset(self):
+        return RequestProfile.objects.defer('queries', 'data').select_related('user')
+
+class RequestProfileDetail(AuthenticatedAPIView, generics.RetrieveAPIView):
+    """View of one request profile with the SQL timeline of the request."""
+    permission_classes = [IsAdminUser]
+    serializer_class = RequestProfileDetailSerializer
+
+    def get_queryset(self):
+        return RequestProfile.objects.defer('data').select_related('user')
+
+class RequestProfileDownload(AuthenticatedAPIView):
+    """View sending a request profile's file: pstats data (cprofile) or collapsed stacks (sample)."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, pk):
+        profile = get_object_or_404(RequestProfile.objects.only('profiler', 'data'), pk=pk)
+        if profile.profiler == RequestProfile.SAMPLE:
+            filename, content_type = f'profile-{profile.id}.folded', 'text/plain; charset=utf-8'
+        else:
+            filename, content_type = f'profile-{profile.id}.prof', 'application/octet-stream'
+        return HttpResponse(bytes(profile.data), content_type=content_type,
+                            headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+class CheckInTokensMixin:
+    """Participant ticket lists: check-in tokens go to the ticket owner and staff only.
+
+    The owner is the user signed in with the participant's email address. Anyone else
+    sees the tickets with a null `checkin_token`.
+    """
+
+    def shows_checkin_tokens(self):
+        user = self.request.user
+        if not user.is_authenticated:
+            return False
+        return user.is_staff or Participant.objects.filter(pk=self.kwargs['pk'], email__iexact=user.email).exists()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['show_checkin_tokens'] = self.shows_checkin_tokens()
+        return context
+
+class ParticipantRegistrationList(CheckInTokensMixin, AuthenticatedAPIView, generics.ListAPIView):
+    """View to list a participant's registrations with their events, newest first."""
+    serializer_class = ParticipantRegistrationSerializer
+    pagination_class = TimestampCursorPagination
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):  # Schema generation: no participant in the URL
+            return Registration.objects.none()
+        # Served by the (participant, timestamp) index, events joined in the same query
+        return (Registration.objects.filter(participant_id=self.kwargs['pk'])
+                .select_related('event').defer('event__description'))
+
+class ParticipantBookingList(CheckInTokensMixin, AuthenticatedAPIView, generics.ListAPIView):
+    """View to list a participant's bookings with their events, newest first."""
+    serializer_class = ParticipantBookingSerializer
+    pagination_class = TimestampCursorPagination
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Booking.objects.none()
+        return (Booking.objects.filter(participant_id=self.kwargs['pk'])
+                .select_related('event').defer('event__description'))
+
 class CreateBooking(APIView):
     def post(self, request, *args, **kwargs):
         serializer = BookingSerializer(data=request.data)
@@ -147,8 +536,8 @@ class RSVPEvent(APIView):
             # Save the registration (create or update)
             registration = serializer.save()
 
-            # Log the successful RSVP (optional)
-            logger.info(f"RSVP successful for participant {registration.participant.email} to event {registration.event.id}")
+            # Formatted only if the record is kept, and without loading the participant
+            logger.info("RSVP successful for participant %s to event %s", registration.participant_id, registration.event_id)
 
             return Response({
                 "message": "RSVP successful!",
@@ -179,24 +568,26 @@ class DeleteParticipant(AuthenticatedAPIView, generics.DestroyAPIView):
         participant.delete()
         return Response({"message": "Participant deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
 
-class PastEventList(AuthenticatedAPIView, generics.ListAPIView):
+class PastEventList(EventFieldsMixin, AuthenticatedAPIView, generics.ListAPIView):
     """View to list all past events."""
     serializer_class = EventSerializer
+    default_excluded_fields = ('description',)
 
     def get_queryset(self):
         now = timezone.now()
-        return Event.objects.filter(
+        return self.select_event_fields(Event.objects.all()).filter(
             Q(date__lt=now.date()) | 
             (Q(date=now.date()) & Q(time__lt=now.time()))
         )
 
-class FutureEventList(AuthenticatedAPIView, generics.ListAPIView):
+class FutureEventList(EventFieldsMixin, AuthenticatedAPIView, generics.ListAPIView):
     """View to list all future events."""
     serializer_class = EventSerializer
+    default_excluded_fields = ('description',)
 
     def get_queryset(self):
         now = timezone.now()
-        return Event.objects.filter(
+        return self.select_event_fields(Event.objects.all()).filter(
             Q(date__gt=now.date()) | 
             (Q(date=now.date()) & Q(time__gte=now.time()))
         )
\ No newline at end of file
@@ -13,7 +13,7 @@ from decouple import config  # for env variable handling
 import datetime
 import environ
 import os
-import django_heroku
+import tempfile
 import dj_database_url
 import logging
 from pathlib import Path
@@ -27,6 +27,23 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Media settings
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
+MEDIA_SERVE = True  # base.media.MediaMiddleware serves MEDIA_ROOT itself, also with DEBUG off
+EVENT_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+
+# Direct uploads: clients PUT images to the object store with a signed URL (see base.uploads)
+OBJECT_STORE_BACKEND = 'base.uploads.LocalObjectStore'
+OBJECT_STORE_ROOT = os.environ.get('OBJECT_STORE_ROOT', os.path.join(BASE_DIR, 'object_store'))
+OBJECT_STORE_URL = os.environ.get('OBJECT_STORE_URL', 'http://127.0.0.1:9000')  # manage.py run_object_store
+OBJECT_STORE_UPLOAD_TTL = 15 * 60  # Seconds a signed upload URL stays valid
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'base.media.ContentAddressedStorage',  # One shared blob per distinct upload, cacheable forever
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
 
 # Quick-start development settings - unsuitable for production
 SECRET_KEY = env("SECRET_KEY")
@@ -70,6 +87,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # Trigram lookups of the typeahead fallback
     'corsheaders',
     'authentication',
     'base',
@@ -90,10 +108,14 @@ SWAGGER_SETTINGS = {
     }
 }
 
+# Every entry must be async-capable: under ASGI (see the Procfile) a single sync-only one
+# makes Django run the whole chain, and every request, through sync_to_async
 MIDDLEWARE = [
+    'base.metrics.MetricsMiddleware',  # First, so it times everything below it
     'corsheaders.middleware.CorsMiddleware',  # Place CORS middleware at the top
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'base.staticfiles.StaticFilesMiddleware',  # WhiteNoise, also in an async chain
+    'base.media.MediaMiddleware',  # Streams uploaded media with caching and Range support
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -102,6 +124,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     # Add your custom token validation middleware
     'authentication.middleware.TokenValidationMiddleware',  # Ensure correct path
+    'base.profiling.ProfilingMiddleware',  # After authentication: only staff can ask for a profile
 ]
 
 
@@ -173,11 +196,29 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},
 ]
 
+# Password hashing (see authentication.hashing). Hashes with another cost or hasher are
+# upgraded to the first entry the next time the user logs in.
+PASSWORD_HASHERS = [
+    'authentication.hashers.TunedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASHING_ITERATIONS = int(os.environ.get('PASSWORD_HASHING_ITERATIONS', 870_000))  # PBKDF2 cost
+PASSWORD_HASHING_MODE = os.environ.get('PASSWORD_HASHING_MODE', 'process')  # 'process' pool or 'inline'
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', 2))  # Pool size per web process
+PASSWORD_HASHING_MAX_PENDING = 32  # Queued hashes per web process before logins get a 503
+
 # REST framework settings
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'base.pagination.CustomPageNumberPagination',  # Estimates the count on large tables
     'PAGE_SIZE': 5,
     'NON_FIELD_ERRORS_KEY': 'error',
+    'DEFAULT_RENDERER_CLASSES': (
+        'base.renderers.FastJSONRenderer',  # JSONRenderer's output, encoded with orjson when installed
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
@@ -187,6 +228,48 @@ REST_FRAMEWORK = {
 }
 
 
+# Cross-process notifications (live seat counts): Postgres LISTEN/NOTIFY, or
+# base.notify.InProcessBus for a single process
+NOTIFY_BUS_BACKEND = 'base.notify.PostgresNotifyBus'
+
+# Per-worker caches of events and participants (base.objectcache), invalidated over the notify bus
+OBJECT_CACHE_SIZE = 10_000  # Rows per cache before the least recently used are dropped
+OBJECT_CACHE_TTL = 300  # Seconds a row may be served from memory; 0 turns the caches off
+
+# Venue and title typeahead (base.typeahead), kept in step by the object cache invalidations
+TYPEAHEAD_REBUILD_SECONDS = 3600  # Rebuilt from the database this often, in case a change was missed
+
+# Event view counts (base.viewcounts), kept in memory and written in one batch per interval
+EVENT_VIEWS_FLUSH_SECONDS = 10  # Also the most views a crashed worker can lose
+
+# Delta sync (base.sync); prune old tombstones with `manage.py prune_event_tombstones`
+SYNC_SETTLE_SECONDS = 2  # Changes younger than this wait for the next sync, in case an older one is still committing
+SYNC_TOMBSTONE_RETENTION_DAYS = 30  # Clients that have not synced for longer must start over
+
+# Door check-in tokens (base.checkin); per-event keys are derived from this, SECRET_KEY if unset
+CHECKIN_SIGNING_KEY = os.environ.get('CHECKIN_SIGNING_KEY') or None
+
+# Request metrics (base.metrics), scraped from /metrics/. Every worker process writes its
+# counts to METRICS_DIR, where the worker answering a scrape adds them up.
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'ratiba-metrics'))
+METRICS_FLUSH_SECONDS = 5  # How stale the other workers' counts in a scrape may be
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None  # Scrapers send `Authorization: Token <it>`; open if unset
+
+# On-demand profiles of single requests (base.profiling): staff send `X-Profile: cprofile`
+# or `X-Profile: sample` and find the result at /profiles/<id>/
+PROFILING_ENABLED = True
+PROFILING_RATE_LIMIT = (10, 3600)  # Profiles per staff user per window of that many seconds
+PROFILING_GLOBAL_RATE_LIMIT = (60, 3600)  # Profiles of all staff together
+PROFILING_SAMPLE_INTERVAL = 0.001  # Seconds between stack samples of the sampling profiler
+PROFILING_KEEP = 200  # Older profiles are deleted; keep it above the global limit
+
+# Similar events (base.recommendations); rebuild in bulk with `manage.py build_similar_events`
+SIMILAR_EVENTS_K = 10
+SIMILAR_EVENTS_INCREMENTAL = True  # Queue an event's neighbours for refresh when its title or description changes
+SIMILAR_EVENTS_POLL_SECONDS = 5  # How often `manage.py update_similar_events` checks an empty queue
+SIMILAR_EVENTS_MAX_TERM_EVENTS = 1000  # Words used by more events do not look up candidates on an update
+SIMILAR_EVENTS_MAX_CANDIDATES = 5000  # Events scored per update at most
+
 # Simple JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': datetime.timedelta(minutes=30),
@@ -246,20 +329,47 @@ EMAIL_USE_SSL = False
 EMAIL_HOST_USER = env('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD')
 
-# Logging configuration
+# Logging (base.log): JSON lines, written by a background thread so requests never wait on
+# stdout. LOG_LEVELS takes per-logger levels ("base.views=DEBUG,django.db.backends=INFO"),
+# LOG_SAMPLING the share of INFO records kept for hot loggers (warnings always pass).
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_LEVELS = dict(item.split('=', 1) for item in os.environ.get('LOG_LEVELS', '').split(',') if item)
+LOG_SAMPLING = {
+    'base.views': 0.1,  # One line per RSVP is noise at peak; 1 in 10 shows the flow
+    **{name: float(rate) for name, rate in (
+        item.split('=', 1) for item in os.environ.get('LOG_SAMPLING', '').split(',') if item
+    )},
+}
+LOG_QUEUE_SIZE = 10_000  # Records waiting for the writer thread before new ones are dropped
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'base.log.JsonFormatter'},
+    },
+    'filters': {
+        'sample': {'()': 'base.log.SamplingFilter', 'rates': LOG_SAMPLING},
+    },
     'handlers': {
-        'console': {
-            'level': 'DEBUG',
+        'stdout': {
             'class': 'logging.StreamHandler',
+            'stream': 'ext://sys.stdout',
+            'formatter': 'json',
+        },
+        'queue': {
+            'class': 'base.log.NonBlockingQueueHandler',
+            'handlers': ['stdout'],
+            'queue': {'()': 'queue.Queue', 'maxsize': LOG_QUEUE_SIZE},
+            'listener': 'base.log.QueueListener',
+            'filters': ['sample'],
         },
     },
     'root': {
-        'handlers': ['console'],
-        'level': 'DEBUG',
+        'handlers': ['queue'],
+        'level': LOG_LEVEL,
     },
+    'loggers': {name: {'level': level} for name, level in LOG_LEVELS.items()},
 }
 
 # Additional security settings for production
@@ -270,6 +380,12 @@ LOGGING = {
 #     SESSION_COOKIE_SECURE = True
 #     CSRF_COOKIE_SECURE = True
 
-# Heroku settings
+# Heroku settings. API-only workers (ratiba.settings_api) apply the parts they need
+# themselves: django_heroku imports django.test and adds a second WhiteNoise middleware
 # django_heroku.settings(locals(), databases=False)
-django_heroku.settings(locals())
\ No newline at end of file
+if os.environ.get('DJANGO_SETTINGS_MODULE') != 'ratiba.settings_api':
+    import django_heroku
+    django_heroku.settings(locals(), logging=False)  # Keep LOGGING above
+    # It prepends the sync-only WhiteNoiseMiddleware, which would run the whole chain through
+    # sync_to_async under ASGI; StaticFilesMiddleware above serves the static files already
+    MIDDLEWARE = [middleware for middleware in MIDDLEWARE if middleware != 'whitenoise.middleware.WhiteNoiseMiddleware']
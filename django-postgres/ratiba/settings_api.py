@@ -0,0 +1,55 @@
+"""
+Settings for API-only workers: the JSON endpoints without the admin, the API docs,
+sessions, CSRF, messages or templates.
+
+Run them next to the regular workers with the same code and database, e.g.
+    DJANGO_SETTINGS_MODULE=ratiba.settings_api gunicorn ratiba.asgi:application -k uvicorn_worker.UvicornWorker
+and keep ratiba.settings for the admin, the docs, migrations and collectstatic.
+Measure the difference with `manage.py bench_startup`.
+"""
+import os
+
+import dj_database_url
+
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK
+
+INSTALLED_APPS = [
+    app for app in INSTALLED_APPS
+    if app not in (
+        'django.contrib.admin',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django.contrib.staticfiles',
+        'drf_yasg',
+    )
+]
+
+# JWT authentication happens in DRF (and TokenValidationMiddleware), so the session
+# stack, CSRF and the HTML-oriented middleware have nothing to do here. Static files
+# are served by the regular workers.
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware not in (
+        'base.staticfiles.StaticFilesMiddleware',
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    )
+]
+
+ROOT_URLCONF = 'ratiba.urls_api'
+
+TEMPLATES = []  # Error pages fall back to Django's built-in plain ones
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ('base.renderers.FastJSONRenderer',),  # No browsable API
+}
+
+# What django_heroku.settings() would have applied (ratiba.settings skips it for this profile)
+ALLOWED_HOSTS = ['*']
+if 'DATABASE_URL' in os.environ:
+    DATABASES = {'default': dj_database_url.config(conn_max_age=600, ssl_require=True)}
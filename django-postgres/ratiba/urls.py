@@ -14,27 +14,51 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import functools
+
 from django.contrib import admin
 from django.urls import path, include
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 
 from django.conf import settings
 from django.conf.urls.static import static
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="RATIBA API",
-        default_version='v1',
-        description="Test Ratiba API",
-        terms_of_service="https://www.ourapp.com/policies/terms/",
-        contact=openapi.Contact(email="contact@teleafya.local"),
-        license=openapi.License(name="Test License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+
+@functools.cache
+def get_api_schema_view():
+    # drf_yasg's views and schema generator are imported when the docs are first opened, not at startup
+    from drf_yasg import openapi
+    from drf_yasg.views import get_schema_view
+
+    return get_schema_view(
+        openapi.Info(
+            title="RATIBA API",
+            default_version='v1',
+            description="Test Ratiba API",
+            terms_of_service="https://www.ourapp.com/policies/terms/",
+            contact=openapi.Contact(email="contact@teleafya.local"),
+            license=openapi.License(name="Test License"),
+        ),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+
+
+def docs_view(renderer=None):
+    """A view for the schema (with the `renderer` UI, or bare JSON), built on first use."""
+    @functools.cache
+    def build():
+        schema_view = get_api_schema_view()
+        if renderer is None:
+            return schema_view.without_ui(cache_timeout=0)
+        return schema_view.with_ui(renderer, cache_timeout=0)
+
+    @csrf_exempt
+    def view(request, *args, **kwargs):
+        return build()(request, *args, **kwargs)
+    return view
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -46,17 +70,14 @@ urlpatterns = [
     # path('billing/', include('billing.urls')),
     # path('payment_status/', include('payment_status.urls')),
     # path('income/', include('income.urls')),
-    path('', schema_view.with_ui('swagger',
-                                 cache_timeout=0), name='schema-swagger-ui'),
+    path('', docs_view('swagger'), name='schema-swagger-ui'),
 
-    path('api/api.json/', schema_view.without_ui(cache_timeout=0),
-         name='schema-swagger-ui'),
+    path('api/api.json/', docs_view(), name='schema-swagger-ui'),
     # path('api/schema.json/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
 
-    path('redoc/', schema_view.with_ui('redoc',
-                                       cache_timeout=0), name='schema-redoc'),
+    path('redoc/', docs_view('redoc'), name='schema-redoc'),
 ]
 
-# Serve media files during development
-if settings.DEBUG:  # Only serve media files in debug mode
+# Serve media files during development (base.media.MediaMiddleware handles them when MEDIA_SERVE is on)
+if settings.DEBUG and not settings.MEDIA_SERVE:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
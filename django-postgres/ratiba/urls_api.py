@@ -0,0 +1,10 @@
+"""
+URL configuration for API-only workers (ratiba.settings_api): the JSON endpoints of
+ratiba.urls without the admin and the API docs.
+"""
+from django.urls import path, include
+
+urlpatterns = [
+    path('auth/', include('authentication.urls')),
+    path('', include('base.urls')),
+]